@@ -5,6 +5,7 @@ import FunnelPortsView from './components/FunnelPortsView';
 import DockerContainersView from './components/DockerContainersView';
 import DockerComposeView from './components/DockerComposeView';
 import DockerNetworksView from './components/DockerNetworksView';
+import HostProcessView from './components/HostProcessView';
 import React, { useEffect, useState } from 'react'; // Added useState
 import { useAppContext } from './context/AppContext'; // Import useAppContext
 import logoImage from '../../logo.png'; // Import the logo image
@@ -129,6 +130,7 @@ function App() {
               <Tab>Docker Containers</Tab>
               <Tab>Docker Compose</Tab>
               <Tab>Docker Networks</Tab>
+              <Tab>Host Processes</Tab>
             </TabList>
             <TabPanels>
               <TabPanel>
@@ -156,6 +158,11 @@ function App() {
                   <DockerNetworksView />
                 </ErrorBoundary>
               </TabPanel>
+              <TabPanel>
+                <ErrorBoundary>
+                  <HostProcessView />
+                </ErrorBoundary>
+              </TabPanel>
             </TabPanels>
           </Tabs>
         </VStack>
@@ -16,9 +16,43 @@ export const fetchHealthCheck = async () => {
   }
 };
 
-export const fetchServeStatus = async () => {
+// Registered hosts ({ name, url, local }); check=true adds { reachable, error } from each relay's /health
+export const fetchHosts = async (check = false) => {
   try {
-    const response = await axios.get(`${API_URL}/tailscale/serve`);
+    const response = await axios.get(`${API_URL}/hosts`, { params: check ? { check: true } : {} });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching hosts:', error);
+    throw error;
+  }
+};
+
+// Host processes with listening sockets: { platform, processes: [{ pid, name, cmdline, container, ports }] }
+export const fetchHostProcesses = async (host) => {
+  try {
+    const response = await axios.get(`${API_URL}/host/processes`, { params: host ? { host } : {} });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching host processes:', error);
+    throw error;
+  }
+};
+
+// signal: 'KILL' (default) or 'TERM'; host: the host the process was listed on (default: local)
+export const killHostProcessByPid = async (pid, signal = 'KILL', host) => {
+  try {
+    const response = await axios.post(`${API_URL}/host/processes/${pid}/kill`, { signal }, { params: host ? { host } : {} });
+    return response.data;
+  } catch (error) {
+    console.error('Error killing host process:', error);
+    throw error;
+  }
+};
+
+// host: optional 'all' or comma separated host names; the response is then { items: { host: status }, hosts }
+export const fetchServeStatus = async (host) => {
+  try {
+    const response = await axios.get(`${API_URL}/tailscale/serve`, { params: host ? { host } : {} });
     return response.data;
   } catch (error) {
     console.error('Error fetching Tailscale serve status:', error);
@@ -26,9 +60,9 @@ export const fetchServeStatus = async () => {
   }
 };
 
-export const fetchFunnelStatus = async () => {
+export const fetchFunnelStatus = async (host) => {
   try {
-    const response = await axios.get(`${API_URL}/tailscale/funnel`);
+    const response = await axios.get(`${API_URL}/tailscale/funnel`, { params: host ? { host } : {} });
     return response.data;
   } catch (error) {
     console.error('Error fetching Tailscale funnel status:', error);
@@ -36,9 +70,43 @@ export const fetchFunnelStatus = async () => {
   }
 };
 
-export const fetchDockerContainers = async () => {
+// Reachability of serve/funnel endpoints and selected peers (availability, latency percentiles and histogram per target).
+export const getTailscaleProbes = async (params = {}) => {
+  try {
+    const response = await axios.get(`${API_URL}/tailscale/probes`, { params });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching Tailscale probe results:', error);
+    throw error;
+  }
+};
+
+export const setTailscaleProbePeers = async (peers) => {
   try {
-    const response = await axios.get(`${API_URL}/docker/containers`);
+    const response = await axios.put(`${API_URL}/tailscale/probes/peers`, { peers });
+    return response.data;
+  } catch (error) {
+    console.error('Error saving Tailscale probe peers:', error);
+    throw error;
+  }
+};
+
+// Tailnet nodes, indexed server-side. params: { name, os, online, connection, label, sort, limit, cursor, host }
+export const listTailscalePeers = async (params = {}) => {
+  try {
+    const response = await axios.get(`${API_URL}/tailscale/peers`, { params });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching Tailscale peers:', error);
+    throw error;
+  }
+};
+
+// params: optional server-side filters/paging, e.g. { all: true, project: 'web', sort: '-created', limit: 50, cursor }
+// host: 'all' (or 'a,b') merges every host's containers, tagged with Host, into { items, total, nextCursor, hosts }
+export const fetchDockerContainers = async (params = {}) => {
+  try {
+    const response = await axios.get(`${API_URL}/docker/containers`, { params });
     return response.data;
   } catch (error) {
     console.error('Error fetching Docker containers:', error);
@@ -138,9 +206,21 @@ export const removeDockerComposeApp = async (id) => {
   }
 };
 
-export const dockerComposeUp = async (filePath) => {
+// Per-app state ({ id, name, path, running, total, state }) derived from the backend's container index
+export const getDockerComposeStatus = async () => {
   try {
-    const response = await axios.post(`${API_URL}/docker-compose/up`, { filePath });
+    const response = await axios.get(`${API_URL}/docker-compose/status`);
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching Docker Compose app status:', error);
+    throw error;
+  }
+};
+
+// options: { skipIfUnchanged, onlyChanged } to skip a no-op up or bring up only the drifted services.
+export const dockerComposeUp = async (filePath, options = {}) => {
+  try {
+    const response = await axios.post(`${API_URL}/docker-compose/up`, { filePath, ...options });
     return response.data;
   } catch (error) {
     console.error('Error executing docker-compose up:', error);
@@ -158,6 +238,38 @@ export const dockerComposeDown = async (filePath) => {
   }
 };
 
+// Per-service drift between each compose app's resolved config and its containers (one app with filePath).
+export const getDockerComposeDrift = async (filePath) => {
+  try {
+    const response = await axios.get(`${API_URL}/docker-compose/drift`, { params: filePath ? { filePath } : {} });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching Docker Compose drift:', error);
+    throw error;
+  }
+};
+
+// Last image pre-pull round per compose app (`current` apps start with --pull=missing); startComposePrepull runs one now.
+export const getComposePrepullStatus = async () => {
+  try {
+    const response = await axios.get(`${API_URL}/docker-compose/prepull`);
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching image pre-pull status:', error);
+    throw error;
+  }
+};
+
+export const startComposePrepull = async () => {
+  try {
+    const response = await axios.post(`${API_URL}/docker-compose/prepull`);
+    return response.data;
+  } catch (error) {
+    console.error('Error starting image pre-pull:', error);
+    throw error;
+  }
+};
+
 // Docker Container Management API functions
 export const stopDockerContainer = async (containerId) => {
   try {
@@ -189,10 +301,48 @@ export const restartDockerContainer = async (containerId) => {
   }
 };
 
-export const getDockerContainerLogs = async (containerId, lines = 100) => {
+// Runs stop/kill/restart on many containers at once. `target` is { ids: [...] } or { selector: { project, label, status, name } }.
+// The backend streams one JSON line per container as it finishes; onResult is called for each of them.
+// Resolves with the final summary line ({ done, succeeded, failed, version }).
+export const bulkDockerContainerAction = async (action, target, onResult = () => {}, parallelism) => {
+  try {
+    const response = await fetch(`${API_URL}/docker/containers/bulk`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ action, ...target, parallelism }),
+    });
+    if (!response.ok) {
+      const errorBody = await response.json().catch(() => ({}));
+      throw new Error(errorBody.details || errorBody.error || `Bulk ${action} failed with status ${response.status}`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    let summary = null;
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffered += decoder.decode(value, { stream: true });
+      const lines = buffered.split('\n');
+      buffered = lines.pop();
+      for (const line of lines.filter(l => l.trim())) {
+        const item = JSON.parse(line);
+        if (item.done) summary = item;
+        else onResult(item);
+      }
+    }
+    return summary;
+  } catch (error) {
+    console.error(`Error running bulk ${action} on Docker containers:`, error);
+    throw error;
+  }
+};
+
+// filter: optional { grep, ignoreCase, invert }; matching is done on the host, only the last `lines` matches come back
+export const getDockerContainerLogs = async (containerId, lines = 100, filter = {}) => {
   try {
     const response = await axios.get(`${API_URL}/docker/containers/${containerId}/logs`, {
-      params: { lines }
+      params: { lines, ...filter }
     });
     return response.data;
   } catch (error) {
@@ -212,9 +362,76 @@ export const getDockerContainerStats = async (containerId) => {
 };
 
 // Docker Network Management API functions
-export const listDockerNetworks = async () => {
+// Resource history: { container, resolution, points: [{ t, cpuPercent, memBytes, netRxRate, ... }] }
+// start/end are epoch seconds (default: the last hour); resolution is 10, 60 or 3600 seconds
+export const getDockerContainerStatsHistory = async (containerId, { start, end, resolution } = {}) => {
+  try {
+    const params = Object.fromEntries(Object.entries({ start, end, resolution }).filter(([, v]) => v !== undefined));
+    const response = await axios.get(`${API_URL}/docker/containers/${containerId}/stats/history`, { params });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching Docker container stats history:', error);
+    throw error;
+  }
+};
+
+// Top containers by 'cpu', 'mem', 'netRx', 'netTx', 'blockRead', 'blockWrite' or 'io' (latest samples)
+export const getDockerStatsTop = async (by = 'cpu', limit = 10, host) => {
   try {
-    const response = await axios.get(`${API_URL}/docker/networks`);
+    const response = await axios.get(`${API_URL}/docker/stats/top`, { params: { by, limit, ...(host ? { host } : {}) } });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching top Docker containers:', error);
+    throw error;
+  }
+};
+
+// The logs of several containers interleaved by time. `params`: { ids: 'a,b' | project | label, lines, since, until, grep, ignoreCase, invert }.
+// onLine is called for each { ts, container, name, stream, line } as it streams in; resolves with the summary line.
+export const streamDockerLogs = async (params, onLine = () => {}) => {
+  try {
+    const response = await fetch(`${API_URL}/docker/logs?${new URLSearchParams(params)}`);
+    if (!response.ok) {
+      const errorBody = await response.json().catch(() => ({}));
+      throw new Error(errorBody.details || errorBody.error || `Merged logs failed with status ${response.status}`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    let summary = null;
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffered += decoder.decode(value, { stream: true });
+      const lines = buffered.split('\n');
+      buffered = lines.pop();
+      for (const line of lines.filter(l => l.trim())) {
+        const item = JSON.parse(line);
+        if (item.done) summary = item;
+        else onLine(item);
+      }
+    }
+    return summary;
+  } catch (error) {
+    console.error('Error streaming merged Docker logs:', error);
+    throw error;
+  }
+};
+
+// Latest usage summed per 'project', 'network' or 'host'
+export const getDockerStatsRollup = async (by = 'project', host) => {
+  try {
+    const response = await axios.get(`${API_URL}/docker/stats/rollup`, { params: { by, ...(host ? { host } : {}) } });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching Docker stats rollup:', error);
+    throw error;
+  }
+};
+
+export const listDockerNetworks = async (params = {}) => {
+  try {
+    const response = await axios.get(`${API_URL}/docker/networks`, { params });
     return response.data;
   } catch (error) {
     console.error('Error fetching Docker networks:', error);
@@ -232,6 +449,17 @@ export const getDockerNetworkDetails = async (networkId) => {
   }
 };
 
+// The whole container <-> network graph in one call; `params` may narrow it: { network } or { container }.
+export const getDockerTopology = async (params = {}) => {
+  try {
+    const response = await axios.get(`${API_URL}/docker/topology`, { params });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching Docker network topology:', error);
+    throw error;
+  }
+};
+
 export const getContainerNetworks = async (containerId) => {
   try {
     const response = await axios.get(`${API_URL}/docker/containers/${containerId}/networks`);
@@ -127,7 +127,7 @@ const parsePortsToLinks = (portsStr) => {
 };
 
 const DockerContainersView = () => {
-  const { dockerData, isLoading, error, loadAllData } = useAppContext();
+  const { dockerData, isLoading, error, loadAllData, applyContainerUpdate } = useAppContext();
   const [actionLoading, setActionLoading] = useState(false);
   const [activeContainer, setActiveContainer] = useState(null);
   const [containerLogs, setContainerLogs] = useState({ logs: '', error: '' });
@@ -230,8 +230,9 @@ const DockerContainersView = () => {
   const handleNetworkChange = async (containerId, containerName, networkId, action = 'connect') => {
     setActionLoading(true);
     try {
+      let result = null;
       if (action === 'connect') {
-        await connectContainerToNetwork(containerId, networkId);
+        result = await connectContainerToNetwork(containerId, networkId);
         toast({
           title: 'Network connected',
           description: `Container ${containerName} connected to network`,
@@ -258,7 +259,7 @@ const DockerContainersView = () => {
           return;
         }
         
-        await disconnectContainerFromNetwork(containerId, networkId);
+        result = await disconnectContainerFromNetwork(containerId, networkId);
         toast({
           title: 'Network disconnected',
           description: `Container ${containerName} disconnected from network`,
@@ -268,9 +269,13 @@ const DockerContainersView = () => {
         });
       }
       
-      // Refresh data
-      await loadAllData();
-      await fetchContainerNetworks(containerId);
+      // Patch the container and its networks from the response; reload only if the backend could not re-read them
+      if (result && result.networks && applyContainerUpdate(result, containerId)) {
+        setContainerNetworks(prev => ({ ...prev, [containerId]: result.networks }));
+      } else {
+        await loadAllData();
+        await fetchContainerNetworks(containerId);
+      }
     } catch (error) {
       toast({
         title: `Failed to ${action} network`,
@@ -413,7 +418,7 @@ const DockerContainersView = () => {
   const handleStopContainer = async (containerId, containerName) => {
     setActionLoading(true);
     try {
-      await stopDockerContainer(containerId);
+      const result = await stopDockerContainer(containerId);
       toast({
         title: "Container stopped",
         description: `Container ${containerName} has been stopped`,
@@ -421,7 +426,7 @@ const DockerContainersView = () => {
         duration: 3000,
         isClosable: true,
       });
-      loadAllData(); // Refresh the container list
+      if (!applyContainerUpdate(result, containerId)) loadAllData(); // Refresh the container list
     } catch (error) {
       toast({
         title: "Failed to stop container",
@@ -439,7 +444,7 @@ const DockerContainersView = () => {
   const handleKillContainer = async (containerId, containerName) => {
     setActionLoading(true);
     try {
-      await killDockerContainer(containerId);
+      const result = await killDockerContainer(containerId);
       toast({
         title: "Container killed",
         description: `Container ${containerName} has been forcibly stopped`,
@@ -447,7 +452,7 @@ const DockerContainersView = () => {
         duration: 3000,
         isClosable: true,
       });
-      loadAllData(); // Refresh the container list
+      if (!applyContainerUpdate(result, containerId)) loadAllData(); // Refresh the container list
     } catch (error) {
       toast({
         title: "Failed to kill container",
@@ -465,7 +470,7 @@ const DockerContainersView = () => {
   const handleRestartContainer = async (containerId, containerName) => {
     setActionLoading(true);
     try {
-      await restartDockerContainer(containerId);
+      const result = await restartDockerContainer(containerId);
       toast({
         title: "Container restarted",
         description: `Container ${containerName} has been restarted`,
@@ -473,7 +478,7 @@ const DockerContainersView = () => {
         duration: 3000,
         isClosable: true,
       });
-      loadAllData(); // Refresh the container list
+      if (!applyContainerUpdate(result, containerId)) loadAllData(); // Refresh the container list
     } catch (error) {
       toast({
         title: "Failed to restart container",
@@ -46,7 +46,7 @@ import {
 } from '../api';
 
 const DockerNetworksView = () => {
-  const { networkData, isLoading, error, loadAllData } = useAppContext();
+  const { networkData, isLoading, error, loadAllData, applyNetworkUpdate } = useAppContext();
   const [selectedNetwork, setSelectedNetwork] = useState(null);
   const [networkDetails, setNetworkDetails] = useState(null);
   const [detailsLoading, setDetailsLoading] = useState(false);
@@ -107,7 +107,7 @@ const DockerNetworksView = () => {
     
     setActionLoading(true);
     try {
-      await createDockerNetwork(newNetworkName.trim(), newNetworkDriver);
+      const result = await createDockerNetwork(newNetworkName.trim(), newNetworkDriver);
       toast({
         title: "Network created",
         description: `Network "${newNetworkName}" has been created`,
@@ -118,7 +118,7 @@ const DockerNetworksView = () => {
       onCreateClose();
       setNewNetworkName('');
       setNewNetworkDriver('bridge');
-      loadAllData(); // Refresh the networks list
+      if (!applyNetworkUpdate(result)) loadAllData(); // Refresh the networks list
     } catch (error) {
       toast({
         title: "Failed to create network",
@@ -136,7 +136,7 @@ const DockerNetworksView = () => {
   const handleDeleteNetwork = async (networkId, networkName) => {
     setActionLoading(true);
     try {
-      await removeDockerNetwork(networkId);
+      const result = await removeDockerNetwork(networkId);
       toast({
         title: "Network deleted",
         description: `Network "${networkName}" has been deleted`,
@@ -144,7 +144,7 @@ const DockerNetworksView = () => {
         duration: 3000,
         isClosable: true,
       });
-      loadAllData(); // Refresh the networks list
+      if (!applyNetworkUpdate(result, networkId, true)) loadAllData(); // Refresh the networks list
     } catch (error) {
       toast({
         title: "Failed to delete network",
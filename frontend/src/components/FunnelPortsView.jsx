@@ -38,7 +38,7 @@ import { useAppContext } from '../context/AppContext';
 import { addFunnelPort, removeFunnelPort } from '../api';
 
 const FunnelPortsView = () => {
-  const { funnelData, isLoading, loadAllData } = useAppContext();
+  const { funnelData, isLoading, loadAllData, setFunnelData } = useAppContext();
   const [isSubmitting, setIsSubmitting] = useState(false);
   const toast = useToast();
   const { isOpen, onOpen, onClose } = useDisclosure();
@@ -155,8 +155,13 @@ const FunnelPortsView = () => {
     
     try {
       setIsSubmitting(true);
-      await addFunnelPort(newPort, newProtocol);
-      await loadAllData();
+      const result = await addFunnelPort(newPort, newProtocol);
+      // The response carries the new funnel status; only reload everything if it could not be re-read
+      if (result && result.funnel !== undefined) {
+        setFunnelData(result.funnel);
+      } else {
+        await loadAllData();
+      }
       
       toast({
         title: "Port funneled",
@@ -189,8 +194,13 @@ const FunnelPortsView = () => {
     
     try {
       setIsSubmitting(true);
-      await removeFunnelPort(portToRemove, protocolToRemove);
-      await loadAllData();
+      const result = await removeFunnelPort(portToRemove, protocolToRemove);
+      // The response carries the new funnel status; only reload everything if it could not be re-read
+      if (result && result.funnel !== undefined) {
+        setFunnelData(result.funnel);
+      } else {
+        await loadAllData();
+      }
       
       toast({
         title: "Funnel removed",
@@ -81,9 +81,18 @@ const HostProcessView = () => {
             </Thead>
             <Tbody>
               {hostProcesses.map((proc) => (
-                <Tr key={proc.pid}>
-                  <Td>{proc.pid}</Td>
-                  <Td>{proc.name}</Td>
+                <Tr key={proc.pid ?? `${proc.ports[0].protocol}:${proc.ports[0].port}`}>
+                  <Td>{proc.pid ?? '-'}</Td>
+                  <Td>
+                    <Tooltip label={proc.cmdline || ''} isDisabled={!proc.cmdline}>
+                      <Text as="span">{proc.name}</Text>
+                    </Tooltip>
+                    {proc.container && (
+                      <Tag size="sm" colorScheme="purple" ml={2}>
+                        {proc.container.name || proc.container.id}
+                      </Tag>
+                    )}
+                  </Td>
                   <Td>
                     {proc.ports && proc.ports.length > 0 ? (
                       <VStack align="start" spacing={0}>
@@ -103,7 +112,7 @@ const HostProcessView = () => {
                         aria-label={`Kill ${proc.name}`}
                         onClick={() => openKillConfirmation(proc)}
                         size="sm"
-                        isDisabled={isKilling && selectedProcess?.pid === proc.pid}
+                        isDisabled={proc.pid === null || (isKilling && selectedProcess?.pid === proc.pid)}
                       />
                     </Tooltip>
                   </Td>
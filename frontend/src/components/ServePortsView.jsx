@@ -43,7 +43,7 @@ import { useAppContext } from '../context/AppContext';
 import { addServePort, removeServePort } from '../api';
 
 const ServePortsView = () => {
-  const { serveData, isLoading, loadAllData } = useAppContext();
+  const { serveData, isLoading, loadAllData, setServeData } = useAppContext();
   const [isSubmitting, setIsSubmitting] = useState(false);
   const toast = useToast();
   const { isOpen, onOpen, onClose } = useDisclosure();
@@ -119,8 +119,13 @@ const ServePortsView = () => {
     
     try {
       setIsSubmitting(true);
-      await addServePort(newPort, "Custom Service", newLocalUrl);
-      await loadAllData();
+      const result = await addServePort(newPort, "Custom Service", newLocalUrl);
+      // The response carries the new serve status; only reload everything if it could not be re-read
+      if (result && result.serve !== undefined) {
+        setServeData(result.serve);
+      } else {
+        await loadAllData();
+      }
       
       toast({
         title: "Port added",
@@ -153,8 +158,13 @@ const ServePortsView = () => {
     
     try {
       setIsSubmitting(true);
-      await removeServePort(portToRemove);
-      await loadAllData();
+      const result = await removeServePort(portToRemove);
+      // The response carries the new serve status; only reload everything if it could not be re-read
+      if (result && result.serve !== undefined) {
+        setServeData(result.serve);
+      } else {
+        await loadAllData();
+      }
       
       toast({
         title: "Port removed",
@@ -5,6 +5,7 @@ import {
   fetchDockerContainers,
   getDockerComposeApps,
   listDockerNetworks,
+  fetchHostProcesses,
 } from '../api';
 
 // Create context with a default value to prevent null context errors
@@ -14,6 +15,8 @@ const defaultContextValue = {
   dockerData: [],
   dockerComposeApps: [],
   networkData: [],
+  hostProcesses: [],
+  hostOsInfo: null,
   isLoading: false,
   error: null,
   lastUpdated: null,
@@ -23,8 +26,13 @@ const defaultContextValue = {
   setDockerData: () => console.warn("Default setDockerData called - context not initialized"),
   setDockerComposeApps: () => console.warn("Default setDockerComposeApps called - context not initialized"),
   setNetworkData: () => console.warn("Default setNetworkData called - context not initialized"),
+  applyContainerUpdate: () => console.warn("Default applyContainerUpdate called - context not initialized"),
+  applyNetworkUpdate: () => console.warn("Default applyNetworkUpdate called - context not initialized"),
 };
 
+// Container states shown by the default (non all=true) container list, mirroring plain `docker ps`.
+const LISTED_CONTAINER_STATES = ['running', 'paused', 'restarting'];
+
 const AppContext = createContext(defaultContextValue);
 
 export const useAppContext = () => useContext(AppContext);
@@ -36,6 +44,8 @@ export const AppProvider = ({ children }) => {
   const [dockerData, setDockerData] = useState([]);
   const [dockerComposeApps, setDockerComposeApps] = useState([]);
   const [networkData, setNetworkData] = useState([]);
+  const [hostProcesses, setHostProcesses] = useState([]);
+  const [hostOsInfo, setHostOsInfo] = useState(null);
   
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState(null);
@@ -46,7 +56,7 @@ export const AppProvider = ({ children }) => {
     setIsLoading(true);
     setError(null);
     try {
-      const [serve, funnel, docker, composeApps, networks] = await Promise.all([
+      const [serve, funnel, docker, composeApps, networks, processes] = await Promise.all([
         fetchServeStatus().catch(err => {
           console.error("Error fetching serve status:", err);
           return [];
@@ -66,6 +76,10 @@ export const AppProvider = ({ children }) => {
         listDockerNetworks().catch(err => {
           console.error("Error fetching docker networks:", err);
           return [];
+        }),
+        fetchHostProcesses().catch(err => {
+          console.error("Error fetching host processes:", err);
+          return { platform: null, processes: [] };
         })
       ]);
       console.log("Data fetched successfully:", { serve, funnel, docker, composeApps, networks });
@@ -74,6 +88,8 @@ export const AppProvider = ({ children }) => {
       setDockerData(docker);
       setDockerComposeApps(composeApps);
       setNetworkData(networks);
+      setHostProcesses(processes.processes || []);
+      setHostOsInfo({ platform: processes.platform });
       setLastUpdated(new Date().toLocaleString());
     } catch (err) {
       console.error("Error loading all data in root Promise.all:", err);
@@ -83,17 +99,50 @@ export const AppProvider = ({ children }) => {
       setDockerData([]);
       setDockerComposeApps([]);
       setNetworkData([]);
+      setHostProcesses([]);
     } finally {
       setIsLoading(false);
     }
   }, []);
 
+  // Mutation routes return the affected resource's fresh state, so patch it in place instead of
+  // re-running loadAllData. Returns false when the response had no state and a reload is needed.
+  const applyContainerUpdate = useCallback((result, containerId) => {
+    if (!result || !('container' in result)) return false;
+    const updated = result.container;
+    setDockerData(prev => {
+      const rest = prev.filter(c => c.ID !== (updated ? updated.ID : containerId));
+      if (!updated || !LISTED_CONTAINER_STATES.includes((updated.State || '').toLowerCase())) {
+        return rest;
+      }
+      const index = prev.findIndex(c => c.ID === updated.ID);
+      if (index === -1) return [...rest, updated];
+      const next = [...prev];
+      next[index] = updated;
+      return next;
+    });
+    setLastUpdated(new Date().toLocaleString());
+    return true;
+  }, []);
+
+  const applyNetworkUpdate = useCallback((result, networkId, removed = false) => {
+    if (!result || !('version' in result) || (!removed && !result.network)) return false;
+    setNetworkData(prev => {
+      const rest = prev.filter(n => n.ID !== (removed ? networkId : result.network.ID) && n.Name !== networkId);
+      return removed ? rest : [...rest, result.network];
+    });
+    setLastUpdated(new Date().toLocaleString());
+    return true;
+  }, []);
+
   const value = {
     serveData,
     funnelData,
     dockerData,
     dockerComposeApps,
     networkData,
+    hostProcesses,
+    hostOsInfo,
     isLoading,
     error,
     lastUpdated,
@@ -103,6 +152,8 @@ export const AppProvider = ({ children }) => {
     setDockerData,
     setDockerComposeApps,
     setNetworkData,
+    applyContainerUpdate,
+    applyNetworkUpdate,
   };
   
   console.log("AppProvider returning with value:", value);
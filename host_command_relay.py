@@ -10,11 +10,30 @@ It listens on a specified port for command requests.
 import subprocess
 import json
 import os
+import hmac
+import ipaddress
 import logging
 import shutil # For shutil.which as a fallback
+import threading
+import itertools
+import zlib
+import signal
+import sys
+import time
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from werkzeug.serving import make_server
+
+import relay_launcher
+import relay_sockets
+
+# The wire format is shared with the backend, which is the only part shipped in the Docker image.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_backend"))
+import relay_wire
+import relay_projection
+import tracing
+import profiling
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -23,14 +42,85 @@ app = Flask(__name__)
 CORS(app)  # Enable CORS for all origins
 
 PORT = int(os.environ.get("PORT", 7655))
+# Optional: also listen on this unix socket (backend on the host, or socket bind-mounted into the container),
+# which skips TCP and Docker's loopback NAT. The backend then uses HOST_RELAY_URL=unix://<path>.
+UNIX_SOCKET = os.environ.get("RELAY_UNIX_SOCKET")
+# Framed responses smaller than this are not worth compressing.
+COMPRESS_MIN_SIZE = int(os.environ.get("RELAY_COMPRESS_MIN_SIZE", 4096))
+# Fast level: command output (JSON, logs) compresses well even at 1, and the relay should not be CPU bound.
+COMPRESS_LEVEL = int(os.environ.get("RELAY_COMPRESS_LEVEL", 1))
+# Saturation, reported as 'load' on /health: this many commands running at once, or a 1-minute load average above
+# RELAY_LOADAVG_LIMIT per CPU. While saturated, reads (X-Relay-Priority: read) are refused with 503 and Retry-After;
+# mutations always run.
+CPU_COUNT = os.cpu_count() or 1
+RELAY_CAPACITY = int(os.environ.get("RELAY_CAPACITY", CPU_COUNT * 4))
+RELAY_LOADAVG_LIMIT = float(os.environ.get("RELAY_LOADAVG_LIMIT", 2.0))
+RELAY_RETRY_AFTER = int(os.environ.get("RELAY_RETRY_AFTER", 2))
+
+# Shared secret (also set for the backend, which sends it as X-Relay-Token). When set, every endpoint that runs
+# something on the host or reads its processes refuses requests without it. Recommended whenever the relay's port
+# is reachable from other machines: it listens on 0.0.0.0.
+RELAY_TOKEN = os.environ.get("RELAY_TOKEN", "")
+PROTECTED_ENDPOINTS = {"execute_command", "list_listening_processes", "kill_process"}
+# Without a token, processes can only be killed by clients on these networks: loopback and the private ranges
+# Docker bridge networks use (the backend container reaches the relay through host.docker.internal).
+RELAY_KILL_ALLOWED_NETWORKS = [
+    ipaddress.ip_network(network.strip())
+    for network in os.environ.get("RELAY_KILL_ALLOWED_NETWORKS", "127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16").split(",")
+    if network.strip()
+]
+
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+# Opt-in (PROFILING_TOKEN) sampling and per-request cProfile capture; see python_backend/profiling.py.
+PROFILE_DIR = os.environ.get("RELAY_PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "profiles"))
+profiler = profiling.Profiler(PROFILE_DIR, "relay")
+profiler.init_app(app, "/profile")
 
 @app.before_request
 def log_request_info():
     logging.info(f"{request.method} {request.url}")
 
+@app.before_request
+def require_relay_token():
+    if not RELAY_TOKEN or request.endpoint not in PROTECTED_ENDPOINTS:
+        return None
+    provided = request.headers.get("X-Relay-Token", "")
+    if not hmac.compare_digest(provided.encode("utf-8"), RELAY_TOKEN.encode("utf-8")):
+        logging.warning(f"Refused {request.method} {request.path} from {request.remote_addr}: missing or invalid X-Relay-Token")
+        return jsonify({"error": "A valid X-Relay-Token is required"}), 401
+    return None
+
+def _may_kill_processes():
+    """With RELAY_TOKEN the token was checked already; without it, only clients on RELAY_KILL_ALLOWED_NETWORKS."""
+    if RELAY_TOKEN or not request.remote_addr: # No address: the unix socket, guarded by its file permissions
+        return True
+    try:
+        address = ipaddress.ip_address(request.remote_addr.split("%")[0])
+    except ValueError:
+        return False
+    address = getattr(address, "ipv4_mapped", None) or address
+    return any(address in network for network in RELAY_KILL_ALLOWED_NETWORKS)
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "ok"}), 200
+    return jsonify({"status": "ok", "load": relay_load()}), 200
+
+def relay_load():
+    try:
+        load_average = os.getloadavg()[0]
+    except (AttributeError, OSError): # Windows
+        load_average = None
+    saturated = _in_flight >= RELAY_CAPACITY or (load_average is not None and load_average > CPU_COUNT * RELAY_LOADAVG_LIMIT)
+    return {
+        "inFlight": _in_flight,
+        "capacity": RELAY_CAPACITY,
+        "loadAverage": load_average,
+        "cpus": CPU_COUNT,
+        "saturated": saturated,
+        "retryAfter": RELAY_RETRY_AFTER,
+    }
 
 @app.route('/test', methods=['GET'])
 def test_endpoint():
@@ -47,14 +137,58 @@ def test_endpoint():
         "hostname": hostname
     }), 200
 
+socket_inventory = relay_sockets.SocketInventory()
+
+@app.route('/processes', methods=['GET'])
+def list_listening_processes():
+    """Listening sockets with their owning processes and containers, read from /proc (see relay_sockets.py)."""
+    if not socket_inventory.supported():
+        return jsonify({"error": "Listing listening sockets needs /proc (Linux)", "platform": sys.platform}), 501
+    started = time.perf_counter()
+    listeners = socket_inventory.listeners()
+    return jsonify({
+        "platform": sys.platform,
+        "listeners": listeners,
+        "elapsedMs": round((time.perf_counter() - started) * 1000, 2),
+    }), 200
+
+@app.route('/processes/<int:pid>/kill', methods=['POST'])
+def kill_process(pid):
+    if not _may_kill_processes():
+        logging.warning(f"Refused to signal PID {pid} for {request.remote_addr}: not on RELAY_KILL_ALLOWED_NETWORKS")
+        return jsonify({"error": "Killing processes from this address requires RELAY_TOKEN to be set"}), 403
+    data = request.get_json(silent=True) or {}
+    signal_name = str(data.get("signal", "KILL")).upper()
+    if signal_name not in ("KILL", "TERM"):
+        return jsonify({"error": "signal must be KILL or TERM"}), 400
+    if pid <= 1 or pid == os.getpid():
+        return jsonify({"error": f"Refusing to kill PID {pid}"}), 400
+    # Windows has no SIGKILL; os.kill() terminates the process for any other signal there.
+    signal_number = getattr(signal, f"SIG{signal_name}", signal.SIGTERM)
+    try:
+        os.kill(pid, signal_number)
+    except ProcessLookupError:
+        return jsonify({"error": f"No process with PID {pid}"}), 404
+    except PermissionError as e:
+        return jsonify({"error": f"Not allowed to signal PID {pid}: {e}"}), 403
+    logging.warning(f"Sent SIG{signal_name} to PID {pid}")
+    return jsonify({"success": True, "message": f"Sent SIG{signal_name} to PID {pid}"}), 200
+
 @app.route('/execute', methods=['POST'])
 def execute_command():
+    received_at, received_counter = time.time(), time.perf_counter()
     data = request.get_json()
     if not data or 'command' not in data:
         logging.error("Command is required but not provided.")
         return jsonify({"error": "Command is required"}), 400
 
     command_to_execute = data['command']
+    projection = data.get('projection') # Optional: filter/select the output here instead of in the backend
+    if projection is not None:
+        try:
+            relay_projection.validate(projection)
+        except relay_projection.InvalidProjectionError as e:
+            return jsonify({"error": f"Invalid projection: {e}"}), 400
     
     # Determine the actual executable path
     final_command_parts = []
@@ -105,42 +239,163 @@ def execute_command():
     
     logging.info(f"Final command for subprocess: {command_to_execute}")
 
-    try:
-        process = subprocess.run(
-            command_to_execute, # Use the (potentially modified) full string
-            shell=True, # Essential for commands like 'cd ... && ...'
-            capture_output=True,
-            text=True,
-            check=False # Don't raise exception for non-zero exit codes automatically
-        )
-
-        stdout = process.stdout
-        stderr = process.stderr
-        return_code = process.returncode
-
-        if return_code != 0:
-            logging.error(f"Error executing command '{command_to_execute}'. Code: {return_code}")
-            logging.error(f"Stderr: {stderr.strip()}")
-            logging.info(f"Stdout: {stdout.strip()}") # Log stdout even on error
-            return jsonify({
-                "error": f"Command failed with exit code {return_code}",
-                "stderr": stderr.strip(),
-                "stdout": stdout.strip(),
-                "code": return_code
-            }), 500
-        
-        logging.info(f"Command '{command_to_execute}' executed successfully.")
-        if stderr: # Log stderr even if command is successful, as it might contain warnings
-             logging.warn(f"Stderr from successful command '{command_to_execute}': {stderr.strip()}")
-
-        return jsonify({
-            "stdout": stdout.strip(),
-            "stderr": stderr.strip() # Ensure stderr is always a string
-        }), 200
+    # Callers that do not send a priority (test-relay.js, older backends) are never shed.
+    if request.headers.get("X-Relay-Priority") == "read":
+        load = relay_load()
+        if load["saturated"]:
+            logging.warning(f"Relay saturated ({load['inFlight']}/{load['capacity']} running, load {load['loadAverage']}), "
+                            f"refusing read: {command_to_execute}")
+            response = jsonify({"error": "Relay is saturated, retry later", "load": load})
+            response.headers["Retry-After"] = str(RELAY_RETRY_AFTER)
+            return response, 503
+
+    # The backend asks for the framed binary envelope; older callers (and test-relay.js) get JSON.
+    framed = request.accept_mimetypes.best_match(["application/json", relay_wire.MEDIA_TYPE]) == relay_wire.MEDIA_TYPE
+    # A traced caller gets this command's spans back in the response, to merge into its trace.
+    trace_id = request.headers.get(tracing.TRACE_ID_HEADER)
+    trace = tracing.Trace(f"relay: {command_to_execute}", trace_id, process_name="relay") if trace_id else None
 
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight += 1
+    try:
+        # posix_spawn-based; still goes through /bin/sh for commands like 'cd ... && ...'
+        captured = relay_launcher.run_captured(command_to_execute) # Use the (potentially modified) full string
     except Exception as e:
         logging.exception(f"Exception while executing command '{command_to_execute}':")
         return jsonify({"error": "Internal server error during command execution", "message": str(e)}), 500
+    finally:
+        with _in_flight_lock:
+            _in_flight -= 1
+
+    return_code = captured.returncode
+    if return_code != 0:
+        logging.error(f"Error executing command '{command_to_execute}'. Code: {return_code}")
+        logging.error(f"Stderr: {_log_preview(captured.stderr)}")
+        logging.info(f"Stdout: {_log_preview(captured.stdout)}") # Log stdout even on error
+    else:
+        logging.info(f"Command '{command_to_execute}' executed successfully ({captured.stdout_total} bytes of output).")
+        if captured.stderr_total: # Log stderr even if command is successful, as it might contain warnings
+            logging.warning(f"Stderr from successful command '{command_to_execute}': {_log_preview(captured.stderr)}")
+    if captured.truncated:
+        logging.warning(f"Output of '{command_to_execute}' truncated to {relay_launcher.MAX_OUTPUT_BYTES} bytes per stream "
+                        f"(stdout {captured.stdout_total}, stderr {captured.stderr_total} bytes produced)")
+
+    projection_error = None
+    if projection is not None and return_code == 0:
+        projected_at, projected_counter = time.time(), time.perf_counter()
+        try:
+            _apply_projection(captured, projection)
+        except ValueError as e: # e.g. a JSON path applied to output that is not JSON
+            logging.error(f"Could not apply projection to the output of '{command_to_execute}': {e}")
+            projection_error = f"Could not apply projection: {e}"
+        if trace:
+            trace.add("relay.project", projected_at, time.perf_counter() - projected_counter, "relay")
+
+    spans = None
+    if trace:
+        for name, (started, duration) in captured.timings.items():
+            trace.add(f"relay.{name}", started, duration, "relay", {"command": command_to_execute} if name == "exec" else None)
+        trace.add("relay.execute", received_at, time.perf_counter() - received_counter, "relay",
+                  {"code": return_code, "stdoutBytes": captured.stdout_total})
+        spans = trace.export_events()
+
+    if framed:
+        return _framed_response(captured, projected=projection is not None, error=projection_error, spans=spans)
+
+    try:
+        stdout = captured.read_text(captured.stdout)
+        stderr = captured.read_text(captured.stderr)
+    finally:
+        captured.close()
+    result = {"stdout": stdout.strip(), "stderr": stderr.strip()} # Ensure stderr is always a string
+    if captured.truncated:
+        result["truncated"] = True
+    if projection is not None:
+        result["projected"] = True
+    if spans:
+        result["spans"] = spans
+    if projection_error:
+        result["error"] = projection_error
+        return jsonify(result), 500
+    if return_code != 0:
+        result.update({"error": f"Command failed with exit code {return_code}", "code": return_code})
+        return jsonify(result), 500
+    return jsonify(result), 200
+
+def _log_preview(stream, limit=2000):
+    stream.seek(0)
+    data = stream.read(limit + 1)
+    text = data[:limit].decode("utf-8", errors="replace").strip()
+    return f"{text} ..." if len(data) > limit else text
+
+def _apply_projection(captured, projection):
+    """Replaces the captured streams named in the projection with their projected output."""
+    for name in relay_projection.validate(projection)["streams"]:
+        source = getattr(captured, name)
+        source.seek(0)
+        projected = captured.new_stream()
+        size = 0
+        for chunk in relay_projection.apply((line.decode("utf-8", errors="replace") for line in source), projection):
+            data = chunk.encode("utf-8")
+            projected.write(data)
+            size += len(data)
+        captured.replace(name, projected, size)
+
+def _framed_response(captured, projected=False, error=None, spans=None):
+    """
+    Streams a command's result as relay_wire frames: a JSON header, then raw stdout and stderr chunks.
+    Bodies past COMPRESS_MIN_SIZE are gzip-compressed on the fly when the caller accepts it.
+    A failed command (or projection) is answered with 500, like the JSON envelope, with the error in the header.
+    """
+    header = {
+        "code": captured.returncode,
+        "stdoutBytes": captured.stdout_size,
+        "stderrBytes": captured.stderr_size,
+        "stdoutTotal": captured.stdout_total,
+        "stderrTotal": captured.stderr_total,
+        "truncated": captured.truncated,
+    }
+    if captured.returncode != 0:
+        header["error"] = f"Command failed with exit code {captured.returncode}"
+    elif error:
+        header["error"] = error
+    if projected:
+        header["projected"] = True
+    if spans:
+        header["spans"] = spans
+    compress = (request.accept_encodings["gzip"] > 0 and
+                captured.stdout_size + captured.stderr_size >= COMPRESS_MIN_SIZE)
+
+    def generate():
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31) if compress else None # wbits 31: gzip container
+        try:
+            frames = itertools.chain(
+                [relay_wire.encode_header(header)],
+                relay_wire.iter_stream_frames(relay_wire.FRAME_STDOUT, captured.stdout),
+                relay_wire.iter_stream_frames(relay_wire.FRAME_STDERR, captured.stderr),
+            )
+            for frame in frames:
+                chunk = compressor.compress(frame) if compressor else frame
+                if chunk:
+                    yield chunk
+            if compressor:
+                yield compressor.flush()
+        finally:
+            captured.close()
+
+    response = Response(generate(), status=500 if header.get("error") else 200, mimetype=relay_wire.MEDIA_TYPE)
+    if compress:
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept, Accept-Encoding"
+    return response
+
+def serve_unix_socket(path):
+    """Serves the relay on a unix socket from a background thread, next to the TCP listener."""
+    server = make_server(f"unix://{path}", 0, app, threaded=True) # Removes a leftover socket file first
+    os.chmod(path, 0o660) # Owner and group only; root in the container can always connect
+    threading.Thread(target=server.serve_forever, name="relay-unix-socket", daemon=True).start()
+    logging.info(f"Host command relay also listening on unix socket {path} (HOST_RELAY_URL=unix://{path})")
 
 @app.errorhandler(Exception)
 def handle_generic_error(e):
@@ -155,4 +410,10 @@ if __name__ == '__main__':
     current_path = os.environ.get('PATH', 'PATH environment variable not found.')
     logging.info(f"Relay process PATH: {current_path}")
     
+    if not RELAY_TOKEN:
+        logging.warning("RELAY_TOKEN is not set: any client that can reach port "
+                        f"{PORT} can run commands on this host. Set it for the relay and the backend to require it.")
+
+    if UNIX_SOCKET:
+        serve_unix_socket(UNIX_SOCKET)
     app.run(host='0.0.0.0', port=PORT)
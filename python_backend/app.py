@@ -1,19 +1,42 @@
 import os
+import re
+import atexit
 import json
+import time
 import logging
 import uuid # For generating IDs for compose apps
 from pathlib import Path # For path manipulations
-from flask import Flask, jsonify, request, send_from_directory, send_file # Added send_from_directory and send_file
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Flask, Response, g, has_request_context, jsonify, request
 from flask_cors import CORS
 
 # Assuming host_caller.py is in the same directory or PYTHONPATH is set up
 from host_caller import exec_host_command
+import docker_index
+import http_cache
+import state_cache
+import shared_state
+import warm_start
+import relay_projection
+import hosts
+import tracing
+import profiling
+import stats_history
+import log_merge
+import topology
+import image_prepull
+import compose_fingerprint
+import tailscale_peers
+import prober
+from host_caller import check_relay, call_relay
+import host_caller
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 app = Flask(__name__)
 CORS(app) # Enable CORS for all origins; configure as needed for production
+http_cache.init_app(app) # ETag/304 and gzip/br negotiation for JSON API responses
 
 # --- Configuration for Docker Compose apps (to be expanded) ---
 DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(__file__), '../data'))
@@ -44,12 +67,204 @@ else:
     except Exception as e:
         logging.error(f"Error creating empty Docker Compose apps file: {e}")
 
+# Every gunicorn worker holds its own copy of the list; compose routes reload it whenever another worker
+# has rewritten the file (tracked by mtime), so workers no longer drift apart.
+docker_compose_apps_mtime = os.path.getmtime(COMPOSE_CONFIG_FILE) if os.path.exists(COMPOSE_CONFIG_FILE) else 0
+
+# Every API request is traced (see tracing.py); requests slower than TRACE_SAVE_MS, or called with ?trace=true,
+# are saved under DATA_DIR/traces as Chrome trace JSON, listed by GET /api/traces.
+TRACE_SAVE_MS = float(os.environ.get('TRACE_SAVE_MS', 1000))
+trace_store = tracing.TraceStore(os.path.join(DATA_DIR, 'traces'), keep=int(os.environ.get('TRACE_KEEP', 200)),
+                                 max_age=float(os.environ.get('TRACE_MAX_AGE', 7 * 24 * 3600)) or None)
+# Opt-in (PROFILING_TOKEN) sampling and per-request cProfile capture; see profiling.py.
+profiler = profiling.Profiler(os.path.join(DATA_DIR, 'profiles'), 'backend')
+profiler.init_app(app, '/api/profile')
+
+@app.before_request
+def _start_trace():
+    if not request.path.startswith('/api/') or request.path.startswith('/api/traces'):
+        return
+    g.trace, g.trace_token = tracing.start(f"{request.method} {request.full_path.rstrip('?')}",
+                                           request.headers.get(tracing.TRACE_ID_HEADER))
+    g.trace_counter = time.perf_counter()
+
+@app.after_request
+def _add_trace_header(response):
+    if g.get('trace') is not None:
+        response.headers[tracing.TRACE_ID_HEADER] = g.trace.trace_id
+        g.trace_status = response.status_code
+    return response
+
+@app.teardown_request
+def _finish_trace(error=None):
+    trace = g.get('trace')
+    if trace is None:
+        return
+    duration = time.perf_counter() - g.trace_counter
+    trace.add("request", trace.started_at, duration, "request", {"status": g.get('trace_status', 500)})
+    tracing.finish(g.trace_token)
+    if duration * 1000 >= TRACE_SAVE_MS or request.args.get('trace', '').lower() == 'true':
+        trace_store.save(trace)
+
+@app.before_request
+def _reload_docker_compose_apps_if_changed():
+    global docker_compose_apps, docker_compose_apps_mtime
+    if not request.path.startswith('/api/docker-compose'):
+        return
+    try:
+        mtime = os.path.getmtime(COMPOSE_CONFIG_FILE)
+        if mtime == docker_compose_apps_mtime:
+            return
+        with open(COMPOSE_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            docker_compose_apps = json.load(f)
+        docker_compose_apps_mtime = mtime
+        logging.info(f"Reloaded {len(docker_compose_apps)} Docker Compose apps changed by another worker")
+    except (OSError, ValueError) as e:
+        logging.error(f"Error reloading Docker Compose apps: {e}")
+
 
 # --- API Endpoints ---
 
+def _mark_stale(stale):
+    """Flags the current response as served from a snapshot restored at boot (see warm_start)."""
+    if stale:
+        g.stale_data = True
+
+@app.after_request
+def _add_stale_header(response):
+    if g.get('stale_data'):
+        response.headers['X-Data-Stale'] = 'true'
+    return response
+
+def _record_relay_busy(error):
+    """host_caller hook: remembers that a relay call made for this request was shed (see _answer_relay_busy)."""
+    if has_request_context():
+        g.relay_busy = error
+
+host_caller.on_relay_busy = _record_relay_busy
+
+@app.after_request
+def _answer_relay_busy(response):
+    """
+    A route that failed because its relay read was shed answers 429 (read rate limit) or 503 (relay saturated)
+    with Retry-After, instead of the generic 500 its ValueError handler produced, so clients back off.
+    Routes that served cached data despite the shed call are left alone.
+    """
+    error = g.get('relay_busy')
+    if error is None or response.status_code < 500:
+        return response
+    busy_response = jsonify({"error": "Host relay is busy, retry later", "details": str(error)})
+    busy_response.status_code = error.status
+    busy_response.headers['Retry-After'] = str(error.retry_after)
+    return busy_response
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "UP", "message": "Python backend is running"}), 200
+    return jsonify({
+        "status": "UP", "message": "Python backend is running",
+        "worker": os.getpid(), "leader": shared_state.is_leader(),
+    }), 200
+
+@app.route('/api/traces', methods=['GET'])
+def list_traces_route():
+    """Lists saved traces, newest first."""
+    return jsonify(trace_store.list()), 200
+
+@app.route('/api/traces/<trace_id>', methods=['GET'])
+def get_trace_route(trace_id):
+    """Returns a saved trace as Chrome trace JSON (load it in chrome://tracing or https://ui.perfetto.dev)."""
+    try:
+        document = trace_store.load(trace_id)
+    except KeyError:
+        return jsonify({"error": f"No saved trace '{trace_id}'"}), 404
+    response = jsonify(document)
+    response.headers['Content-Disposition'] = f'attachment; filename="trace-{trace_id}.json"'
+    return response, 200
+
+# --- Host Endpoints ---
+
+# Relays TailBrain can read from besides the local one; see hosts.py. Read routes take ?host=all or ?host=a,b.
+HOSTS_FILE = os.path.join(DATA_DIR, 'hosts.json')
+host_registry = hosts.HostRegistry(HOSTS_FILE)
+
+@app.route('/api/hosts', methods=['GET'])
+def list_hosts_route():
+    """Lists the registered hosts. With check=true, each relay's /health is called (concurrently)."""
+    registered = host_registry.hosts()
+    result = [{"name": name, "url": url, "local": name == hosts.LOCAL_HOST_NAME} for name, url in registered.items()]
+    if request.args.get('check', '').lower() == 'true':
+        health, errors = host_registry.fan_out(
+            list(registered), lambda name: check_relay(registered[name], timeout=hosts.HOST_FANOUT_TIMEOUT)
+        )
+        for entry in result:
+            entry["reachable"] = entry["name"] in health
+            if entry["name"] in errors:
+                entry["error"] = errors[entry["name"]]
+    return jsonify(result), 200
+
+@app.route('/api/host/processes', methods=['GET'])
+def list_host_processes_route():
+    """
+    Host processes with listening sockets, from the relay's /proc-based inventory, grouped by process.
+    Processes inside containers carry the container's ID and name.
+    """
+    try:
+        inventory = call_relay('GET', '/processes', relay_url=host_registry.relay_url_for(request.args.get('host')))
+    except hosts.UnknownHostError as e:
+        return jsonify({"error": str(e)}), 400
+    except ValueError as e:
+        logging.error(f"ValueError listing host processes: {e}")
+        return jsonify({"error": "Failed to list host processes", "details": str(e)}), 500
+    except Exception as e:
+        logging.exception("Unexpected error listing host processes:")
+        return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
+
+    try:
+        containers = docker_index.container_index.snapshot()
+    except ValueError as e:
+        logging.warning(f"Listing host processes without container names: {e}")
+        containers = None
+    processes = {}
+    for listener in inventory.get('listeners', []):
+        pid = listener['pid']
+        key = pid if pid is not None else f"inode-{listener['inode']}"
+        process = processes.get(key)
+        if process is None:
+            container = None
+            if listener['containerId']:
+                record = containers.resolve(listener['containerId']) if containers else None
+                container = {"id": listener['containerId'], "name": record.get('Names') if record else None}
+            process = processes[key] = {
+                "pid": pid, "name": listener['name'] or "(unknown owner)", "cmdline": listener['cmdline'],
+                "uid": listener['uid'], "container": container, "ports": [],
+            }
+        process['ports'].append({"protocol": listener['protocol'], "address": listener['address'], "port": listener['port']})
+    return jsonify({
+        "platform": inventory.get('platform'),
+        "processes": sorted(processes.values(), key=lambda p: min(port['port'] for port in p['ports'])),
+        "elapsedMs": inventory.get('elapsedMs'),
+    }), 200
+
+@app.route('/api/host/processes/<int:pid>/kill', methods=['POST'])
+def kill_host_process_route(pid):
+    """
+    Signals a host process (SIGKILL by default, or {"signal": "TERM"}) through the relay of the host it was
+    listed on (?host=, as for the list route; the local host by default).
+    """
+    req_data = request.get_json(silent=True) or {}
+    try:
+        result = call_relay('POST', f'/processes/{pid}/kill', payload={"signal": req_data.get('signal', 'KILL')},
+                            relay_url=host_registry.relay_url_for(request.args.get('host')),
+                            priority=host_caller.PRIORITY_MUTATION)
+        return jsonify(result), 200
+    except hosts.UnknownHostError as e:
+        return jsonify({"error": str(e)}), 400
+    except ValueError as e:
+        logging.error(f"ValueError killing host process {pid}: {e}")
+        return jsonify({"error": f"Failed to kill process {pid}", "details": str(e)}), 500
+    except Exception as e:
+        logging.exception(f"Unexpected error killing host process {pid}:")
+        return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
 
 # --- Tailscale Endpoints ---
 
@@ -116,14 +331,65 @@ def _parse_tailscale_serve_output(stdout_str):
         })
     return parsed_services
 
+def _parse_tailscale_funnel_output(stdout_str):
+    return json.loads(stdout_str)
+
+# Parsed serve/funnel status, cached for STATE_CACHE_TTL seconds and versioned so mutations can return the new state.
+serve_status_cache = state_cache.CachedCommand(
+    'tailscale-serve', 'tailscale serve status', _parse_tailscale_serve_output
+)
+funnel_status_cache = state_cache.CachedCommand(
+    'tailscale-funnel', 'tailscale funnel status --json', _parse_tailscale_funnel_output
+)
+
+def _tailscale_state_payload(cache, key):
+    """
+    Re-reads a tailscale status right after a mutation so the response can carry it.
+    Returns {key: <new state>, 'version': n}, or {} if the re-read failed (clients then fall back to a reload).
+    """
+    try:
+        value = cache.get(force_refresh=True)
+        return {key: value, "version": cache.version}
+    except ValueError as e:
+        cache.invalidate()
+        logging.warning(f"Could not re-read {cache.name} after mutation: {e}")
+        return {}
+
+def _cached_command_hosts(cache):
+    """
+    Reads a CachedCommand on several hosts at once (?host=all or ?host=a,b).
+    Returns {items: {host: value}, hosts: {host: {ok, version, refreshedAt, stale} or {ok: false, error}}}.
+    """
+    host_names = host_registry.resolve(request.args.get('host'))
+    force_refresh = request.args.get('refresh', '').lower() == 'true'
+
+    def fetch(host_name):
+        host_cache = host_registry.cache_for(host_name, cache)
+        return host_cache, host_cache.get(force_refresh=force_refresh)
+
+    results, errors = host_registry.fan_out(host_names, fetch)
+    statuses = {name: {"ok": False, "error": error} for name, error in errors.items()}
+    for host_name, (host_cache, _) in results.items():
+        statuses[host_name] = {"ok": True, "version": host_cache.version,
+                               "refreshedAt": host_cache.refreshed_at, "stale": host_cache.stale}
+    _mark_stale(any(host_cache.stale for host_cache, _ in results.values()))
+    return {
+        "items": {name: results[name][1] for name in host_names if name in results},
+        "hosts": {name: statuses[name] for name in host_names},
+    }
+
 @app.route('/api/tailscale/serve', methods=['GET'])
 def get_tailscale_serve_status_route():
     try:
-        result = exec_host_command('tailscale serve status')
         # Note: 'tailscale serve status' might not have a --json flag yet.
         # Parsing its plain text output can be brittle.
-        parsed_data = _parse_tailscale_serve_output(result['stdout'])
+        if request.args.get('host'):
+            return jsonify(_cached_command_hosts(serve_status_cache)), 200
+        parsed_data = serve_status_cache.get(force_refresh=request.args.get('refresh', '').lower() == 'true')
+        _mark_stale(serve_status_cache.stale)
         return jsonify(parsed_data), 200
+    except hosts.UnknownHostError as e:
+        return jsonify({"error": "Invalid query parameters", "details": str(e)}), 400
     except ValueError as e:
         logging.error(f"Error getting Tailscale serve status: {e}")
         return jsonify({"error": "Failed to get Tailscale serve status", "details": str(e)}), 500
@@ -135,16 +401,18 @@ def get_tailscale_serve_status_route():
 def get_tailscale_funnel_status_route():
     try:
         # 'tailscale funnel status --json' is the preferred command if available and working.
-        result = exec_host_command('tailscale funnel status --json')
-        try:
-            # Assuming stdout contains valid JSON string
-            funnel_data = json.loads(result['stdout']) 
-            return jsonify(funnel_data), 200
-        except json.JSONDecodeError as je:
-            logging.error(f"Failed to parse JSON from tailscale funnel status: {je}")
-            logging.debug(f"Funnel status stdout: {result['stdout']}")
-            # Fallback or error if JSON parsing fails
-            return jsonify({"error": "Failed to parse JSON output for funnel status", "raw_output": result['stdout']}), 500
+        if request.args.get('host'):
+            return jsonify(_cached_command_hosts(funnel_status_cache)), 200
+        funnel_data = funnel_status_cache.get(force_refresh=request.args.get('refresh', '').lower() == 'true')
+        _mark_stale(funnel_status_cache.stale)
+        return jsonify(funnel_data), 200
+    except hosts.UnknownHostError as e:
+        return jsonify({"error": "Invalid query parameters", "details": str(e)}), 400
+    except json.JSONDecodeError as je:
+        logging.error(f"Failed to parse JSON from tailscale funnel status: {je}")
+        logging.debug(f"Funnel status stdout: {je.doc}")
+        # Fallback or error if JSON parsing fails
+        return jsonify({"error": "Failed to parse JSON output for funnel status", "raw_output": je.doc}), 500
     except ValueError as e: # Error from exec_host_command
         logging.error(f"Error getting Tailscale funnel status: {e}")
         return jsonify({"error": "Failed to get Tailscale funnel status", "details": str(e)}), 500
@@ -167,7 +435,10 @@ def add_tailscale_serve_port_route():
     command = f"tailscale serve add :{port} {local_url}"
     try:
         result = exec_host_command(command)
-        return jsonify({"success": True, "message": "Port added successfully", "output": result['stdout']}), 200
+        return jsonify({
+            "success": True, "message": "Port added successfully", "output": result['stdout'],
+            **_tailscale_state_payload(serve_status_cache, 'serve'),
+        }), 200
     except ValueError as e:
         logging.error(f"Error adding Tailscale serve port: {e}")
         return jsonify({"error": "Failed to add Tailscale serve port", "details": str(e)}), 500
@@ -188,7 +459,10 @@ def add_tailscale_funnel_port_route():
     command = f"tailscale funnel {port} {protocol}"
     try:
         result = exec_host_command(command)
-        return jsonify({"success": True, "message": "Port funneled successfully", "output": result['stdout']}), 200
+        return jsonify({
+            "success": True, "message": "Port funneled successfully", "output": result['stdout'],
+            **_tailscale_state_payload(funnel_status_cache, 'funnel'),
+        }), 200
     except ValueError as e:
         logging.error(f"Error adding Tailscale funnel port: {e}")
         return jsonify({"error": "Failed to add Tailscale funnel port", "details": str(e)}), 500
@@ -205,7 +479,10 @@ def remove_tailscale_serve_port_route(port_str):
     command = f"tailscale serve remove :{port_str}"
     try:
         result = exec_host_command(command)
-        return jsonify({"success": True, "message": "Port removed successfully", "output": result['stdout']}), 200
+        return jsonify({
+            "success": True, "message": "Port removed successfully", "output": result['stdout'],
+            **_tailscale_state_payload(serve_status_cache, 'serve'),
+        }), 200
     except ValueError as e:
         logging.error(f"Error removing Tailscale serve port: {e}")
         return jsonify({"error": "Failed to remove Tailscale serve port", "details": str(e)}), 500
@@ -235,7 +512,10 @@ def remove_tailscale_funnel_port_route(port_str):
         
     try:
         result = exec_host_command(command)
-        return jsonify({"success": True, "message": "Port funnel removed successfully", "output": result['stdout']}), 200
+        return jsonify({
+            "success": True, "message": "Port funnel removed successfully", "output": result['stdout'],
+            **_tailscale_state_payload(funnel_status_cache, 'funnel'),
+        }), 200
     except ValueError as e:
         logging.error(f"Error removing Tailscale funnel port: {e}")
         return jsonify({"error": "Failed to remove Tailscale funnel port", "details": str(e)}), 500
@@ -243,36 +523,201 @@ def remove_tailscale_funnel_port_route(port_str):
         logging.exception("Unexpected error in /api/tailscale/funnel (DELETE):")
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
 
+def _probe_targets():
+    """The serve/funnel endpoints to probe, from the cached status (an unreadable status just contributes none)."""
+    targets = []
+    for cache, to_targets in ((serve_status_cache, prober.targets_from_serve), (funnel_status_cache, prober.targets_from_funnel)):
+        try:
+            targets += to_targets(cache.get())
+        except ValueError as e:
+            logging.warning(f"Not probing {cache.name} targets: {e}")
+    return targets
+
+service_prober = prober.Prober(_probe_targets, exec_host_command, os.path.join(DATA_DIR, 'probe-peers.json'))
+
+@app.route('/api/tailscale/probes', methods=['GET'])
+def get_tailscale_probes_route():
+    """
+    Reachability of the serve/funnel endpoints and selected peers from the last probing rounds: per target
+    {id, kind (http, tcp, ping), address, source, up, lastLatencyMs, lastDetail, availability, p50Ms, p95Ms, histogram}.
+    ?source=serve|funnel|peer filters; ?refresh=true has the leader probe now and waits for its result.
+    """
+    summary = service_prober.refresh() if request.args.get('refresh', '').lower() == 'true' else service_prober.summary()
+    if summary is None:
+        return jsonify({"checkedAt": None, "durationMs": None, "targets": [], "peers": service_prober.peers()}), 200
+    sources = _split_multi_arg('source')
+    targets = [target for target in summary['targets'] if not sources or target['source'] in sources]
+    return jsonify({**summary, "targets": targets, "peers": service_prober.peers()}), 200
+
+@app.route('/api/tailscale/probes', methods=['POST'])
+def start_tailscale_probes_route():
+    if not service_prober.request_round():
+        return jsonify({"error": "A probing round is already running in this worker"}), 409
+    return jsonify({"success": True, "message": "Probing round started"}), 202
+
+@app.route('/api/tailscale/probes/peers', methods=['PUT'])
+def set_tailscale_probe_peers_route():
+    """Body: {"peers": ["nas", "100.64.0.2"]}, the peers to `tailscale ping` in each round."""
+    peers = (request.get_json() or {}).get('peers')
+    if not isinstance(peers, list):
+        return jsonify({"error": "peers must be a list of hostnames or Tailscale IPs"}), 400
+    try:
+        service_prober.set_peers(peers)
+    except ValueError as e:
+        return jsonify({"error": "Invalid peers", "details": str(e)}), 400
+    except OSError as e:
+        logging.error(f"Error saving probe peers: {e}")
+        return jsonify({"error": "Failed to save probe peers", "details": str(e)}), 500
+    return jsonify({"success": True, "peers": peers}), 200
+
+@app.route('/api/tailscale/peers', methods=['GET'])
+def list_tailscale_peers_route():
+    """
+    The tailnet's nodes: {id, hostname, dnsName, ips, os, online, lastSeen, connection, relay, curAddr, user, tags, ...}.
+    Same query parameters as /api/docker/containers: name (hostname, MagicDNS name or IP substring), label=tag:x,
+    os / online / connection (direct, relay, idle, offline, self) as facets, sort (name, os, online, lastSeen),
+    limit/cursor paging, refresh=true and host=.
+    """
+    try:
+        return jsonify(_query_index(tailscale_peers.peer_index, ('os', 'online', 'connection'))), 200
+    except (docker_index.InvalidQueryError, hosts.UnknownHostError) as e:
+        return jsonify({"error": "Invalid query parameters", "details": str(e)}), 400
+    except ValueError as e: # Includes a status that is not JSON
+        logging.error(f"Error listing Tailscale peers: {e}")
+        return jsonify({"error": "Failed to list Tailscale peers", "details": str(e)}), 500
+    except Exception as e:
+        logging.exception("Unexpected error listing Tailscale peers:")
+        return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
+
+@app.route('/api/tailscale/peers/<peer>', methods=['GET'])
+def get_tailscale_peer_route(peer):
+    """One node, by ID, ID prefix, hostname, MagicDNS name or Tailscale IP."""
+    try:
+        record = tailscale_peers.peer_index.snapshot().resolve(peer)
+    except ValueError as e:
+        logging.error(f"Error reading Tailscale peer {peer}: {e}")
+        return jsonify({"error": "Failed to list Tailscale peers", "details": str(e)}), 500
+    if record is None:
+        return jsonify({"error": f"Tailscale peer '{peer}' not found"}), 404
+    return jsonify(record), 200
+
 # --- Docker Endpoints ---
 
-def _parse_docker_ps_output(stdout_str):
-    """Parses the JSON line-formatted output of 'docker ps --format "{{json .}}"'."""
-    # Ensure it's placed after Tailscale endpoints and before the get_docker_containers_route or adjust if it's a general utility
-    if not stdout_str or not stdout_str.strip():
-        return []
-    lines = stdout_str.strip().split('\n')
-    containers = []
-    for line in lines:
-        if line.strip():
-            try:
-                containers.append(json.loads(line))
-            except json.JSONDecodeError as e:
-                logging.error(f"Failed to parse Docker ps JSON line: {line} - Error: {e}")
-    return containers
+def _split_multi_arg(name):
+    """Reads a query parameter that may be repeated and/or comma separated (?status=running,exited&status=paused)."""
+    values = []
+    for raw in request.args.getlist(name):
+        values.extend(v.strip() for v in raw.split(',') if v.strip())
+    return values
+
+def _query_index(index, facet_params, default_facets=None):
+    """
+    Answers a list request from an in-memory docker index.
+    Supported query parameters: name, label (repeatable, 'key' or 'key=value'), one parameter per facet
+    (comma separated values), sort (prefix with '-' for descending), limit, cursor and refresh=true.
+    Without limit/cursor the matching records are returned as a plain array (the original response shape);
+    with them a page object {items, total, nextCursor, version, refreshedAt, stale} is returned.
+    Data restored from the boot snapshot is flagged with an 'X-Data-Stale: true' header (and 'stale' in pages).
+    With host=all (or host=a,b) the registered hosts are queried together, see _query_hosts().
+    Raises docker_index.InvalidQueryError / hosts.UnknownHostError for invalid parameters and ValueError for relay failures.
+    """
+    sort = request.args.get('sort', 'name')
+    descending = sort.startswith('-')
+    sort = sort.lstrip('-')
+    if sort not in index.sort_fields:
+        raise docker_index.InvalidQueryError(f"Invalid sort field '{sort}'. Valid fields: {', '.join(index.sort_fields)}")
+
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    paged = limit is not None or cursor is not None
+    if paged:
+        try:
+            limit = int(limit) if limit is not None else docker_index.DEFAULT_PAGE_LIMIT
+        except ValueError:
+            raise docker_index.InvalidQueryError(f"Invalid limit '{limit}'")
+        limit = max(1, min(limit, docker_index.MAX_PAGE_LIMIT))
+    if cursor is not None:
+        docker_index.decode_cursor(cursor) # Up front: with host= the per-host queries would report it as a host error
+
+    facets = dict(default_facets or {})
+    for facet in facet_params:
+        values = [v.lower() for v in _split_multi_arg(facet)] if facet != 'project' else _split_multi_arg(facet)
+        if values:
+            facets[facet] = values
+
+    query = dict(
+        name=request.args.get('name'),
+        facets=facets,
+        labels=request.args.getlist('label'),
+        sort=sort,
+        descending=descending,
+        cursor=cursor,
+        limit=limit if paged else None,
+    )
+    force_refresh = request.args.get('refresh', '').lower() == 'true'
+    if request.args.get('host'):
+        return _query_hosts(index, query, force_refresh)
+
+    snapshot = index.snapshot(force_refresh=force_refresh)
+    page = snapshot.query(**query)
+    _mark_stale(snapshot.stale)
+    page['stale'] = snapshot.stale
+    return page if paged else page['items']
+
+def _query_hosts(index, query, force_refresh):
+    """
+    Answers a list request (?host=all or ?host=a,b) from several hosts' indexes at once.
+    Each host is queried concurrently with the same filters; the results are merged in sort order,
+    tagged with a 'Host' field, and returned as {items, total, nextCursor, hosts}, where 'hosts' reports
+    per host either {ok: true, total, version, refreshedAt, stale} or {ok: false, error}.
+    Cursors are sort keys, so they page through the merged list the same way they do for one host.
+    """
+    host_names = host_registry.resolve(request.args.get('host'))
+
+    def fetch(host_name):
+        host_index = host_registry.cache_for(host_name, index)
+        snapshot = host_index.snapshot(force_refresh=force_refresh)
+        return host_index, snapshot, snapshot.query(**query)
+
+    results, errors = host_registry.fan_out(host_names, fetch)
+    merged = []
+    for host_name, (host_index, _, page) in results.items():
+        merged.extend((host_index.sort_key(record, query['sort']), host_name, record) for record in page['items'])
+    merged.sort(key=lambda entry: entry[0], reverse=query['descending'])
+
+    limit = query['limit']
+    next_cursor = None
+    if limit is not None and (len(merged) > limit or any(page['nextCursor'] for _, _, page in results.values())):
+        merged = merged[:limit]
+        if merged:
+            next_cursor = docker_index.encode_cursor(list(merged[-1][0]))
+
+    statuses = {name: {"ok": False, "error": error} for name, error in errors.items()}
+    for host_name, (_, snapshot, page) in results.items():
+        statuses[host_name] = {"ok": True, "total": page['total'], "version": snapshot.version,
+                               "refreshedAt": snapshot.refreshed_at, "stale": snapshot.stale}
+    _mark_stale(any(snapshot.stale for _, snapshot, _ in results.values()))
+    return {
+        "items": [{**record, "Host": host_name} for _, host_name, record in merged],
+        "total": sum(page['total'] for _, _, page in results.values()),
+        "nextCursor": next_cursor,
+        "hosts": {name: statuses[name] for name in host_names},
+    }
+
+# What plain `docker ps` (without -a) shows.
+DEFAULT_CONTAINER_STATES = ['running', 'paused', 'restarting']
 
 @app.route('/api/docker/containers', methods=['GET'])
 def get_docker_containers_route():
     try:
-        result = exec_host_command('docker ps --format "{{json .}}"')
-        # result is {"stdout": "...", "stderr": "..."}
-        
-        # The original Node.js commandExecutor.js would check for errors from execHostCommand.
-        # Our Python exec_host_command raises ValueError on relay/HTTP errors.
-        # If the command itself failed (e.g., docker command error), host_command_relay.py returns 500,
-        # which exec_host_command also turns into a ValueError.
-        
-        containers = _parse_docker_ps_output(result['stdout'])
+        # Filtering, sorting and paging all run against the in-memory index; the relay is only
+        # called when the index is older than DOCKER_INDEX_TTL (or refresh=true is passed).
+        show_all = request.args.get('all', '').lower() == 'true'
+        default_facets = {} if show_all or request.args.get('status') else {'status': DEFAULT_CONTAINER_STATES}
+        containers = _query_index(docker_index.container_index, ('status', 'project'), default_facets)
         return jsonify(containers), 200
+    except (docker_index.InvalidQueryError, hosts.UnknownHostError) as e:
+        return jsonify({"error": "Invalid query parameters", "details": str(e)}), 400
     except ValueError as e: # Catch errors from exec_host_command (relay/HTTP issues or command failure via relay)
         logging.error(f"Error getting Docker containers: {e}")
         return jsonify({"error": "Failed to get Docker containers", "details": str(e)}), 500
@@ -284,14 +729,18 @@ def get_docker_containers_route():
 
 # Helper to save docker-compose apps to file
 def _save_docker_compose_apps():
-    global docker_compose_apps # Ensure we're modifying the global list
+    global docker_compose_apps, docker_compose_apps_mtime # Ensure we're modifying the global list
     try:
         # Ensure DATA_DIR exists before writing
         data_dir_path = Path(DATA_DIR)
         data_dir_path.mkdir(parents=True, exist_ok=True)
         
-        with open(COMPOSE_CONFIG_FILE, 'w', encoding='utf-8') as f:
+        # Write-then-rename so other workers never read a half-written file
+        tmp_file = f"{COMPOSE_CONFIG_FILE}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
             json.dump(docker_compose_apps, f, indent=2)
+        os.replace(tmp_file, COMPOSE_CONFIG_FILE)
+        docker_compose_apps_mtime = os.path.getmtime(COMPOSE_CONFIG_FILE)
         logging.info(f"Saved {len(docker_compose_apps)} Docker Compose apps to {COMPOSE_CONFIG_FILE}")
         return True
     except Exception as e:
@@ -302,6 +751,102 @@ def _save_docker_compose_apps():
 def get_docker_compose_apps_route():
     return jsonify(docker_compose_apps)
 
+def _compose_app_members(snapshot):
+    """
+    Maps each registered compose app's path to the IDs of its containers in the container index.
+    Containers are matched on the compose config file label, falling back to the default project name
+    (the compose file's directory name).
+    """
+    by_config_file = {}
+    by_project = {}
+    for record_id, meta in snapshot.meta.items():
+        labels = meta['labels']
+        for config_file in labels.get('com.docker.compose.project.config_files', '').split(','):
+            if config_file:
+                by_config_file.setdefault(config_file, []).append(record_id)
+        if labels.get('com.docker.compose.project'):
+            by_project.setdefault(labels['com.docker.compose.project'], []).append(record_id)
+
+    return {app_item['path']: by_config_file.get(app_item['path']) or by_project.get(Path(app_item['path']).parent.name.lower(), [])
+            for app_item in docker_compose_apps}
+
+def _compose_app_statuses(snapshot):
+    """Derives each registered compose app's state from the container index."""
+    members = _compose_app_members(snapshot)
+    statuses = []
+    for app_item in docker_compose_apps:
+        member_ids = members[app_item['path']]
+        running = sum(1 for rid in member_ids if snapshot.meta[rid]['facets']['status'] == 'running')
+        statuses.append({
+            "id": app_item['id'],
+            "name": app_item['name'],
+            "path": app_item['path'],
+            "running": running,
+            "total": len(member_ids),
+            "state": "stopped" if running == 0 else ("running" if running == len(member_ids) else "partial"),
+        })
+    return statuses
+
+@app.route('/api/docker-compose/status', methods=['GET'])
+def get_docker_compose_status_route():
+    try:
+        snapshot = docker_index.container_index.snapshot()
+        _mark_stale(snapshot.stale)
+        return jsonify(_compose_app_statuses(snapshot)), 200
+    except ValueError as e:
+        logging.error(f"Error getting Docker Compose app status: {e}")
+        return jsonify({"error": "Failed to get Docker Compose app status", "details": str(e)}), 500
+    except Exception as e:
+        logging.exception("Unexpected error in /api/docker-compose/status:")
+        return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
+
+def _compose_app_drift(app_item, snapshot):
+    """
+    Compares a registered app's resolved compose config with its containers (see compose_fingerprint.py).
+    Raises:
+        ValueError: If the relay call fails (e.g. the compose file does not parse).
+    """
+    member_ids = _compose_app_members(snapshot)[app_item['path']]
+    result = exec_host_command(compose_fingerprint.drift_command(app_item['path'], member_ids), priority=host_caller.PRIORITY_READ)
+    desired, running_images = compose_fingerprint.parse_drift_output(result['stdout'])
+    members = [(rid, snapshot.by_id[rid], snapshot.meta[rid]['labels'], snapshot.meta[rid]['facets']['status'])
+               for rid in member_ids]
+    prepull_state = prepuller.state()
+    desired_images = {image: entry['imageId'] for image, entry in prepull_state['images'].items() if entry.get('imageId')}
+    built = set(prepull_state['apps'].get(app_item['id'], {}).get('built') or [])
+    drift = compose_fingerprint.service_drift(desired, members, running_images, desired_images, built)
+    return {"id": app_item['id'], "name": app_item['name'], "path": app_item['path'], **drift}
+
+@app.route('/api/docker-compose/drift', methods=['GET'])
+def get_docker_compose_drift_route():
+    """
+    Per-service drift of the registered compose apps (or of the one at ?filePath=): each service is 'inSync',
+    'drifted' (reasons: config, image, imageUnknown, stopped), 'missing' or 'orphaned'; 'changed' lists what `up` would need to touch.
+    The apps are checked in parallel, one relay call each.
+    """
+    file_path = request.args.get('filePath')
+    apps = [app_item for app_item in docker_compose_apps if not file_path or app_item['path'] == file_path]
+    if file_path and not apps:
+        return jsonify({"error": "Docker Compose app not found"}), 404
+    try:
+        snapshot = docker_index.container_index.snapshot(force_refresh=request.args.get('refresh', '').lower() == 'true')
+    except ValueError as e:
+        logging.error(f"Error listing containers for compose drift: {e}")
+        return jsonify({"error": "Failed to list containers", "details": str(e)}), 500
+    reports = []
+    with ThreadPoolExecutor(max_workers=max(1, min(BULK_ACTION_PARALLELISM, len(apps)))) as executor:
+        futures = {executor.submit(_compose_app_drift, app_item, snapshot): app_item for app_item in apps}
+        for future in as_completed(futures):
+            app_item = futures[future]
+            try:
+                reports.append(future.result())
+            except ValueError as e:
+                logging.warning(f"Could not check drift of compose app {app_item['name']}: {e}")
+                reports.append({"id": app_item['id'], "name": app_item['name'], "path": app_item['path'], "error": str(e)})
+    order = {app_item['id']: index for index, app_item in enumerate(apps)}
+    reports.sort(key=lambda report: order[report['id']])
+    return jsonify(reports[0] if file_path else reports), 200
+
 @app.route('/api/docker-compose/apps', methods=['POST'])
 def add_docker_compose_app_route():
     global docker_compose_apps
@@ -398,6 +943,28 @@ def docker_compose_up_route():
          logging.warning(f"Compose up called for an unconfigured path: {file_path_str}. Using default up command.")
 
 
+    # Images pre-pulled recently (see image_prepull.py), and not pushed again since, need not be pulled while the user waits.
+    pre_pulled = bool(app_config) and '--pull=always' in custom_up_command and prepuller.is_current(app_config['id'])
+    if pre_pulled:
+        custom_up_command = custom_up_command.replace('--pull=always', '--pull=missing')
+
+    # skipIfUnchanged: do nothing when every service already runs its current config and image.
+    # onlyChanged: bring up only the drifted or missing services.
+    skip_if_unchanged = bool(req_data.get('skipIfUnchanged'))
+    only_changed = bool(req_data.get('onlyChanged'))
+    drift = None
+    if app_config and (skip_if_unchanged or only_changed):
+        try:
+            drift = _compose_app_drift(app_config, docker_index.container_index.snapshot(force_refresh=True))
+        except ValueError as e: # Deploy anyway, in full
+            logging.warning(f"Could not check drift of {file_path_str}, running a full up: {e}")
+        if drift is not None and drift['inSync']:
+            logging.info(f"Compose app {app_config['name']} is in sync (fingerprint {drift['fingerprint']}), skipping up")
+            return jsonify({"success": True, "skipped": True, "message": "Docker Compose app is already up to date",
+                            "output": "", "drift": drift}), 200
+        if drift is not None and only_changed and drift['changed']:
+            custom_up_command = f"{custom_up_command} {' '.join(drift['changed'])}"
+
     compose_file_path = Path(file_path_str)
     work_dir = str(compose_file_path.parent.resolve())
     file_name = compose_file_path.name
@@ -409,7 +976,9 @@ def docker_compose_up_route():
     
     try:
         result = exec_host_command(command)
-        return jsonify({"success": True, "message": "Docker Compose up executed successfully", "output": result['stdout']}), 200
+        docker_index.container_index.invalidate() # Containers were (re)created; the next read re-lists them
+        return jsonify({"success": True, "message": "Docker Compose up executed successfully", "output": result['stdout'],
+                        "prePulled": pre_pulled, "skipped": False, "drift": drift}), 200
     except ValueError as e:
         logging.error(f"Error executing docker-compose up for {file_name} in {work_dir}: {e}")
         return jsonify({"error": "Failed to execute docker-compose up", "details": str(e)}), 500
@@ -417,6 +986,27 @@ def docker_compose_up_route():
         logging.exception(f"Unexpected error in docker-compose up for {file_name}:")
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
 
+prepuller = image_prepull.PrePuller(os.path.join(DATA_DIR, 'image-prepull.json'), COMPOSE_CONFIG_FILE, exec_host_command)
+
+@app.route('/api/docker-compose/prepull', methods=['GET'])
+def get_compose_prepull_status_route():
+    """
+    The last pre-pull round: per-app image lists and per-image IDs, digests and pull times, plus each app's `current`
+    flag (pulled recently; the registry itself is only asked when the app is brought up).
+    """
+    state = prepuller.state()
+    apps = [{"id": app_item['id'], "name": app_item['name'], "current": prepuller.is_current(app_item['id'], check_registry=False),
+             **state['apps'].get(app_item['id'], {"images": [], "built": [], "checkedAt": None, "error": None})}
+            for app_item in docker_compose_apps]
+    return jsonify({"apps": apps, "images": state['images'], "startedAt": state['startedAt'], "finishedAt": state['finishedAt'],
+                    "running": prepuller.is_running(), "interval": image_prepull.PREPULL_INTERVAL}), 200
+
+@app.route('/api/docker-compose/prepull', methods=['POST'])
+def start_compose_prepull_route():
+    if not prepuller.request_round():
+        return jsonify({"error": "A pre-pull round is already running in this worker"}), 409
+    return jsonify({"success": True, "message": "Pre-pull round requested"}), 202
+
 @app.route('/api/docker-compose/down', methods=['POST'])
 def docker_compose_down_route():
     req_data = request.get_json()
@@ -431,6 +1021,8 @@ def docker_compose_down_route():
     command = f"cd \"{work_dir}\" && docker-compose -f \"{file_name}\" down"
     try:
         result = exec_host_command(command)
+        docker_index.container_index.invalidate()
+        docker_index.network_index.invalidate()
         return jsonify({"success": True, "message": "Docker Compose down executed successfully", "output": result['stdout']}), 200
     except ValueError as e:
         logging.error(f"Error executing docker-compose down for {file_name} in {work_dir}: {e}")
@@ -440,6 +1032,60 @@ def docker_compose_down_route():
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
 
 # --- Individual Docker Container Management Endpoints (copied from previous step for context) ---
+
+# Printed between the two parts of the combined re-read command below; plain `echo` works in sh and cmd alike.
+_STATE_SEPARATOR = '---tailbrain-state---'
+
+def _container_state_payload(container_id):
+    """
+    Re-reads one container right after a mutation (its `docker ps` record and network attachments, in a
+    single relay call; the inspect part fails for a container that no longer exists, which is then
+    re-read with the listing alone), patches it into the container index and returns the fields to merge into the response:
+    {'container': <docker ps record or None if it no longer exists>, 'networks': {...}, 'version': <index version>}.
+    Returns {} if the re-read failed; the index is then invalidated and clients fall back to a reload.
+    """
+    snapshot = docker_index.container_index.peek()
+    record = snapshot.resolve(container_id) if snapshot else None
+    if record:
+        ps_filter = f"id={record['ID']}"
+    elif re.fullmatch(r'[0-9a-f]+', container_id):
+        ps_filter = f"id={container_id}"
+    else:
+        ps_filter = f"name=^/{container_id}$"
+    ps_command = f"docker ps -a --filter \"{ps_filter}\" --format \"{{{{json .}}}}\""
+    command = (
+        f"{ps_command} && echo {_STATE_SEPARATOR}"
+        f" && docker container inspect --format \"{{{{json .NetworkSettings.Networks}}}}\" {container_id}"
+    )
+    try:
+        try:
+            result = exec_host_command(command)
+        except host_caller.RelayBusyError:
+            raise
+        except ValueError:
+            # The inspect fails once the container is gone (e.g. a --rm container that was stopped);
+            # the listing alone then tells whether it still exists.
+            result = exec_host_command(ps_command)
+        ps_output, separator, networks_output = result['stdout'].partition(_STATE_SEPARATOR)
+        records = docker_index.parse_json_lines(ps_output)
+        networks_output = networks_output.strip()
+        networks = json.loads(networks_output) if networks_output and networks_output != 'null' else {}
+    except ValueError as e: # Includes JSONDecodeError
+        logging.warning(f"Could not re-read container {container_id} after mutation: {e}")
+        docker_index.container_index.invalidate()
+        return {}
+
+    if records:
+        version = docker_index.container_index.upsert(records[0])
+        if separator:
+            topology.topology_index.update_container(records[0]['ID'], records[0].get('Names'), networks)
+        else: # Listed, but the inspect failed anyway: its attachments are unknown
+            topology.topology_index.invalidate()
+        return {"container": records[0], "networks": networks, "version": version}
+    version = docker_index.container_index.remove(container_id)
+    topology.topology_index.remove_container(container_id)
+    return {"container": None, "networks": {}, "version": version}
+
 @app.route('/api/docker/containers/<container_id>/stop', methods=['POST'])
 def stop_docker_container_route(container_id):
     if not container_id:
@@ -447,7 +1093,10 @@ def stop_docker_container_route(container_id):
     command = f"docker stop {container_id}"
     try:
         result = exec_host_command(command)
-        return jsonify({"success": True, "message": "Container stopped successfully", "output": result['stdout']}), 200
+        return jsonify({
+            "success": True, "message": "Container stopped successfully", "output": result['stdout'],
+            **_container_state_payload(container_id),
+        }), 200
     except ValueError as e:
         logging.error(f"Error stopping container {container_id}: {e}")
         return jsonify({"error": f"Failed to stop container {container_id}", "details": str(e)}), 500
@@ -462,7 +1111,10 @@ def kill_docker_container_route(container_id):
     command = f"docker kill {container_id}"
     try:
         result = exec_host_command(command)
-        return jsonify({"success": True, "message": "Container killed successfully", "output": result['stdout']}), 200
+        return jsonify({
+            "success": True, "message": "Container killed successfully", "output": result['stdout'],
+            **_container_state_payload(container_id),
+        }), 200
     except ValueError as e:
         logging.error(f"Error killing container {container_id}: {e}")
         return jsonify({"error": f"Failed to kill container {container_id}", "details": str(e)}), 500
@@ -477,7 +1129,10 @@ def restart_docker_container_route(container_id):
     command = f"docker restart {container_id}"
     try:
         result = exec_host_command(command)
-        return jsonify({"success": True, "message": "Container restarted successfully", "output": result['stdout']}), 200
+        return jsonify({
+            "success": True, "message": "Container restarted successfully", "output": result['stdout'],
+            **_container_state_payload(container_id),
+        }), 200
     except ValueError as e:
         logging.error(f"Error restarting container {container_id}: {e}")
         return jsonify({"error": f"Failed to restart container {container_id}", "details": str(e)}), 500
@@ -485,15 +1140,150 @@ def restart_docker_container_route(container_id):
         logging.exception(f"Unexpected error restarting container {container_id}:")
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
 
+# --- Bulk Container Lifecycle Endpoint ---
+
+BULK_CONTAINER_ACTIONS = ('stop', 'kill', 'restart')
+BULK_ACTION_PARALLELISM = int(os.environ.get('BULK_ACTION_PARALLELISM', 8))
+BULK_ACTION_MAX_PARALLELISM = 32
+
+def _resolve_bulk_targets(req_data, default_states=DEFAULT_CONTAINER_STATES):
+    """
+    Turns a bulk request's 'ids' list or 'selector' ({project, label, status, name}) into a list of
+    (container_id, name) pairs, using the container index for selectors and for ID/name lookups.
+    A selector without 'status' only matches `default_states` (all states when None); by default what plain
+    `docker ps` shows (running, paused, restarting), so `stop` by label does not also target the stopped
+    containers; pass e.g. "status": ["exited"] for those.
+    Only containers found in the index are returned, so nothing from the request reaches the command line.
+    Raises:
+        docker_index.InvalidQueryError: If neither ids nor a usable selector was given, or an ID is unknown.
+    """
+    ids = req_data.get('ids') or []
+    selector = req_data.get('selector') or {}
+    if ids and not isinstance(ids, list):
+        raise docker_index.InvalidQueryError("'ids' must be a list of container IDs or names")
+    if not isinstance(selector, dict):
+        raise docker_index.InvalidQueryError("'selector' must be an object with project, label, status or name")
+    if not ids and not any(selector.get(k) for k in ('project', 'label', 'status', 'name')):
+        raise docker_index.InvalidQueryError("Either 'ids' or a 'selector' with project, label, status or name is required")
+
+    snapshot = docker_index.container_index.snapshot()
+    if ids:
+        wanted = list(dict.fromkeys(str(i) for i in ids)) # Dedupe, keep order
+        if any(snapshot.resolve(container_id) is None for container_id in wanted):
+            snapshot = docker_index.container_index.snapshot(force_refresh=True) # Maybe created since the last listing
+        unknown = [container_id for container_id in wanted if snapshot.resolve(container_id) is None]
+        if unknown:
+            raise docker_index.InvalidQueryError(f"Unknown or ambiguous containers: {', '.join(unknown)}")
+        records = [snapshot.resolve(container_id) for container_id in wanted]
+        return list(dict.fromkeys((record['ID'], record.get('Names', '')) for record in records))
+
+    def as_list(value):
+        return value if isinstance(value, list) else [value]
+
+    facets = {'status': default_states} if default_states else {}
+    if selector.get('project'):
+        facets['project'] = as_list(selector['project'])
+    if selector.get('status'):
+        facets['status'] = [str(s).lower() for s in as_list(selector['status'])]
+    page = snapshot.query(
+        name=selector.get('name'),
+        facets=facets,
+        labels=as_list(selector['label']) if selector.get('label') else [],
+    )
+    return [(record['ID'], record.get('Names', '')) for record in page['items']]
+
+def _run_container_action(action, container_id, name):
+    started = time.monotonic()
+    try:
+        result = exec_host_command(f"docker {action} {container_id}")
+        outcome = {"success": True, "output": result['stdout']}
+    except Exception as e: # Report every container, whatever went wrong with it
+        logging.error(f"Bulk {action} failed for container {container_id}: {e}")
+        outcome = {"success": False, "error": str(e)}
+    return {"id": container_id, "name": name, "action": action,
+            "elapsedMs": round((time.monotonic() - started) * 1000), **outcome}
+
+@app.route('/api/docker/containers/bulk', methods=['POST'])
+def bulk_docker_container_action_route():
+    """
+    Runs stop/kill/restart on many containers with bounded parallelism: one relay call per container, up to
+    "parallelism" at a time, so each container's result is reported (and streamed) on its own.
+    Body: {"action": "stop", "ids": [...]} or {"action": "stop", "selector": {"project": "web", "label": "k=v"}},
+    optionally "parallelism" (default BULK_ACTION_PARALLELISM).
+    Streams newline-delimited JSON: one object per container as it finishes, then a summary object
+    {"done": true, "succeeded", "failed", "version"} carrying the refreshed container index version.
+    """
+    req_data = request.get_json() or {}
+    action = req_data.get('action')
+    if action not in BULK_CONTAINER_ACTIONS:
+        return jsonify({"error": f"action must be one of: {', '.join(BULK_CONTAINER_ACTIONS)}"}), 400
+    try:
+        parallelism = int(req_data.get('parallelism') or BULK_ACTION_PARALLELISM)
+    except (TypeError, ValueError):
+        return jsonify({"error": "parallelism must be an integer"}), 400
+    parallelism = max(1, min(parallelism, BULK_ACTION_MAX_PARALLELISM))
+
+    try:
+        targets = _resolve_bulk_targets(req_data)
+    except docker_index.InvalidQueryError as e:
+        return jsonify({"error": "Invalid bulk request", "details": str(e)}), 400
+    except ValueError as e:
+        logging.error(f"Error resolving bulk {action} targets: {e}")
+        return jsonify({"error": "Failed to resolve target containers", "details": str(e)}), 500
+    logging.info(f"Bulk {action} of {len(targets)} containers with parallelism {parallelism}")
+
+    def generate():
+        succeeded = failed = 0
+        with ThreadPoolExecutor(max_workers=parallelism) as executor:
+            futures = [executor.submit(_run_container_action, action, cid, name) for cid, name in targets]
+            for future in as_completed(futures):
+                outcome = future.result()
+                if outcome['success']:
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield json.dumps(outcome) + '\n'
+        # One re-list covers every container touched above.
+        try:
+            version = docker_index.container_index.snapshot(force_refresh=True).version
+        except ValueError as e:
+            logging.warning(f"Could not refresh container index after bulk {action}: {e}")
+            docker_index.container_index.invalidate()
+            version = None
+        yield json.dumps({"done": True, "action": action, "succeeded": succeeded, "failed": failed, "version": version}) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+# With a grep filter, how far back the relay scans the container's log for matches.
+LOG_GREP_SCAN_LINES = int(os.environ.get('LOG_GREP_SCAN_LINES', 10000))
+# The container networks view only needs these per-network fields.
+CONTAINER_NETWORKS_PROJECTION = {"json": "*.{NetworkID,IPAddress,GlobalIPv6Address,Gateway,MacAddress,Aliases}"}
+
 @app.route('/api/docker/containers/<container_id>/logs', methods=['GET'])
 def get_docker_container_logs_route(container_id):
     if not container_id:
         return jsonify({"error": "Container ID is required"}), 400
     
     lines = request.args.get('lines', '100') # Default to 100 lines
+    grep = request.args.get('grep')
     command = f"docker logs --tail={lines} {container_id}"
+    projection = None
+    if grep:
+        # Filtered on the host: scan the last LOG_GREP_SCAN_LINES lines, send back only the last `lines` matches.
+        try:
+            projection = {
+                "grep": grep,
+                "ignoreCase": request.args.get('ignoreCase', '').lower() == 'true',
+                "invert": request.args.get('invert', '').lower() == 'true',
+                "tail": int(lines),
+                "streams": ["stdout", "stderr"], # docker logs replays the container's stderr on stderr
+            }
+            relay_projection.validate(projection)
+        except ValueError as e: # Includes InvalidProjectionError and a non-numeric 'lines'
+            return jsonify({"error": "Invalid log filter", "details": str(e)}), 400
+        command = f"docker logs --tail={LOG_GREP_SCAN_LINES} {container_id}"
     try:
-        result = exec_host_command(command)
+        result = exec_host_command(command, projection=projection)
         # The result from exec_host_command contains 'stdout' and 'stderr'
         # The original Node.js version returned { success: true, logs: stdout, error: stderr }
         return jsonify({"success": True, "logs": result['stdout'], "error_output": result['stderr']}), 200
@@ -504,6 +1294,86 @@ def get_docker_container_logs_route(container_id):
         logging.exception(f"Unexpected error getting logs for container {container_id}:")
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
 
+# Upper bound on the containers one merged log request reads, and how many are read at once.
+LOG_MERGE_MAX_CONTAINERS = int(os.environ.get('LOG_MERGE_MAX_CONTAINERS', 50))
+LOG_MERGE_PARALLELISM = int(os.environ.get('LOG_MERGE_PARALLELISM', 4))
+
+def _fetch_timestamped_logs(container_id, name, lines, projection, since, until):
+    """Reads one container's log with timestamps. Returns its stdout and stderr entry sources for log_merge."""
+    bounds = (f" --since {since}" if since else '') + (f" --until {until}" if until else '')
+    tail = LOG_GREP_SCAN_LINES if projection else lines
+    result = exec_host_command(f"docker logs --timestamps --tail={tail}{bounds} {container_id}", projection=projection)
+    return [log_merge.split_lines(result['stdout'], container_id, name, 'stdout'),
+            log_merge.split_lines(result['stderr'], container_id, name, 'stderr')]
+
+@app.route('/api/docker/logs', methods=['GET'])
+def get_docker_merged_logs_route():
+    """
+    The logs of several containers interleaved in time order.
+    Query: ids=a,b (IDs or names) or project=... / label=k=v (repeatable) to pick the containers, in any state
+    (a crashed container's log is usually the one worth reading); lines (default 100, the most recent lines overall and per container), since / until (anything
+    `docker logs` accepts: RFC3339, Unix time, '10m'), grep / ignoreCase / invert to filter on the host.
+    Streams newline-delimited JSON: one {"ts", "container", "name", "stream", "line"} object per line,
+    oldest first, then a summary {"done": true, "containers", "lines", "errors": {container: message}}.
+    """
+    ids = [i for i in request.args.get('ids', '').split(',') if i]
+    selector = {"project": request.args.getlist('project'), "label": request.args.getlist('label')}
+    since, until = request.args.get('since'), request.args.get('until')
+    grep = request.args.get('grep')
+    try:
+        lines = int(request.args.get('lines', 100))
+        if lines < 1:
+            raise ValueError("lines must be positive")
+        for bound in (since, until):
+            if bound:
+                log_merge.validate_time_bound(bound)
+        projection = None
+        if grep:
+            # Only matching lines cross the relay; the timestamp prefix is part of what the pattern sees.
+            projection = {
+                "grep": grep,
+                "ignoreCase": request.args.get('ignoreCase', '').lower() == 'true',
+                "invert": request.args.get('invert', '').lower() == 'true',
+                "tail": lines,
+                "streams": ["stdout", "stderr"],
+            }
+            relay_projection.validate(projection)
+    except ValueError as e: # Includes InvalidProjectionError and InvalidTimeBoundError
+        return jsonify({"error": "Invalid log request", "details": str(e)}), 400
+
+    try:
+        targets = _resolve_bulk_targets({"ids": ids, "selector": selector}, default_states=None)
+    except docker_index.InvalidQueryError as e:
+        return jsonify({"error": "Invalid log request", "details": str(e)}), 400
+    except ValueError as e:
+        logging.error(f"Error resolving containers for merged logs: {e}")
+        return jsonify({"error": "Failed to resolve containers", "details": str(e)}), 500
+    if len(targets) > LOG_MERGE_MAX_CONTAINERS:
+        return jsonify({"error": f"Too many containers ({len(targets)}); at most {LOG_MERGE_MAX_CONTAINERS} can be merged"}), 400
+
+    # All logs are read before streaming starts: the first line out depends on the oldest line of every container.
+    sources, errors = [], {}
+    with ThreadPoolExecutor(max_workers=max(1, min(LOG_MERGE_PARALLELISM, len(targets)))) as executor:
+        futures = {executor.submit(_fetch_timestamped_logs, cid, name, lines, projection, since, until): (cid, name)
+                   for cid, name in targets}
+        for future in as_completed(futures):
+            cid, name = futures[future]
+            try:
+                sources.extend(future.result())
+            except ValueError as e:
+                logging.warning(f"Could not read logs of container {name or cid}: {e}")
+                errors[name or cid] = str(e)
+    logging.info(f"Merging logs of {len(targets) - len(errors)}/{len(targets)} containers")
+
+    def generate():
+        count = 0
+        for entry in log_merge.merge(sources, limit=lines):
+            count += 1
+            yield json.dumps(entry) + '\n'
+        yield json.dumps({"done": True, "containers": len(targets), "lines": count, "errors": errors}) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
 @app.route('/api/docker/containers/<container_id>/stats', methods=['GET'])
 def get_docker_container_stats_route(container_id):
     if not container_id:
@@ -516,7 +1386,7 @@ def get_docker_container_stats_route(container_id):
         # stdout from 'docker stats ... --format "{{json .}}"' should be a single JSON line
         try:
             stats_data = json.loads(result['stdout'].strip()) if result['stdout'].strip() else {}
-            return jsonify({"success": True, "stats": stats_data}), 200
+            return jsonify({"success": True, "stats": stats_data, "metrics": stats_history.parse_stats(stats_data)}), 200
         except json.JSONDecodeError as je:
             logging.error(f"Failed to parse JSON from docker stats for {container_id}: {je}")
             logging.debug(f"Docker stats stdout: {result['stdout']}")
@@ -528,19 +1398,140 @@ def get_docker_container_stats_route(container_id):
         logging.exception(f"Unexpected error getting stats for container {container_id}:")
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
 
+# Sampled by the leader every STATS_INTERVAL seconds; see stats_history.py.
+stats_store = stats_history.StatsStore(os.path.join(DATA_DIR, 'stats'))
+stats_collector = stats_history.StatsCollector(stats_store, exec_host_command)
+# Other hosts are not sampled in the background; their latest stats are read on demand (no rates). So is this one
+# before the leader's first round: only the leader samples into the ring files.
+remote_stats_cache = state_cache.CachedCommand(
+    'docker-stats', stats_history.STATS_COMMAND, stats_history.parse_stats_output, ttl=stats_history.STATS_INTERVAL
+)
+
+def _latest_stats_rows(host_name):
+    """
+    One row per running container of a host: its latest sample joined with name, project and networks.
+    Returns:
+        tuple: (rows, time the samples were taken).
+    """
+    latest = stats_collector.latest() if host_name == hosts.LOCAL_HOST_NAME else None
+    if latest is not None:
+        samples, sampled_at = latest['containers'], latest['sampledAt']
+    else:
+        cache = host_registry.cache_for(host_name, remote_stats_cache)
+        samples = stats_history.add_rates(dict(cache.get()), None, 0)
+        sampled_at = cache.refreshed_at
+    snapshot = host_registry.cache_for(host_name, docker_index.container_index).snapshot()
+    rows = []
+    for container_id, sample in samples.items():
+        record = snapshot.by_id.get(container_id) or snapshot.resolve(container_id) or {}
+        meta = snapshot.meta.get(record.get('ID'), {"facets": {}})
+        rows.append({
+            **sample,
+            "id": container_id,
+            "name": record.get('Names') or sample.get('name'),
+            "host": host_name,
+            "project": meta['facets'].get('project'),
+            "networks": [n for n in (record.get('Networks') or '').split(',') if n],
+        })
+    return rows, sampled_at
+
+def _stats_rows_for_request():
+    """
+    Rows for the hosts selected by ?host= (default: the local host).
+    Returns:
+        tuple: (rows, when the oldest of the hosts' samples was taken or None, {host: error}).
+    """
+    host_names = host_registry.resolve(request.args.get('host', hosts.LOCAL_HOST_NAME))
+    if host_names == [hosts.LOCAL_HOST_NAME]:
+        return (*_latest_stats_rows(hosts.LOCAL_HOST_NAME), {})
+    results, errors = host_registry.fan_out(host_names, _latest_stats_rows)
+    sampled_at = min((results[name][1] for name in results), default=None)
+    return [row for name in host_names for row in results.get(name, ([], None))[0]], sampled_at, errors
+
+@app.route('/api/docker/stats/top', methods=['GET'])
+def get_docker_stats_top_route():
+    """
+    The `limit` (default 10) containers using the most `by`: cpu, mem, netRx, netTx, blockRead, blockWrite or io.
+    `sampledAt` is when the (oldest host's) samples were taken.
+    """
+    by = request.args.get('by', 'cpu')
+    if by not in stats_history.RANK_FIELDS:
+        return jsonify({"error": f"by must be one of {', '.join(stats_history.RANK_FIELDS)}"}), 400
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    try:
+        rows, sampled_at, errors = _stats_rows_for_request()
+        return jsonify({"by": by, "items": stats_history.top(rows, by, max(1, limit)), "total": len(rows),
+                        "sampledAt": sampled_at, "errors": errors}), 200
+    except hosts.UnknownHostError as e:
+        return jsonify({"error": str(e)}), 400
+    except ValueError as e:
+        logging.error(f"ValueError ranking container stats: {e}")
+        return jsonify({"error": "Failed to read container stats", "details": str(e)}), 500
+    except Exception as e:
+        logging.exception("Unexpected error ranking container stats:")
+        return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
+
+@app.route('/api/docker/stats/rollup', methods=['GET'])
+def get_docker_stats_rollup_route():
+    """Latest resource usage summed per compose `project` (default), `network` or `host`."""
+    group_keys = {
+        'project': lambda row: [row['project'] or '(none)'],
+        'network': lambda row: row['networks'] or ['(none)'],
+        'host': lambda row: [row['host']],
+    }.get(request.args.get('by', 'project'))
+    if group_keys is None:
+        return jsonify({"error": "by must be one of project, network, host"}), 400
+    try:
+        rows, sampled_at, errors = _stats_rows_for_request()
+        return jsonify({"by": request.args.get('by', 'project'), "items": stats_history.rollup(rows, group_keys),
+                        "sampledAt": sampled_at, "errors": errors}), 200
+    except hosts.UnknownHostError as e:
+        return jsonify({"error": str(e)}), 400
+    except ValueError as e:
+        logging.error(f"ValueError rolling up container stats: {e}")
+        return jsonify({"error": "Failed to read container stats", "details": str(e)}), 500
+    except Exception as e:
+        logging.exception("Unexpected error rolling up container stats:")
+        return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
+
+@app.route('/api/docker/containers/<container_id>/stats/history', methods=['GET'])
+def get_docker_container_stats_history_route(container_id):
+    """
+    Resource history of a container (ID, ID prefix or name) between `start` and `end` (epoch seconds; default the
+    last hour). `resolution` (10, 60 or 3600 seconds) picks a tier; by default the finest one covering `start`.
+    """
+    try:
+        end = float(request.args.get('end', time.time()))
+        start = float(request.args.get('start', end - 3600))
+        resolution = int(request.args['resolution']) if 'resolution' in request.args else None
+    except ValueError:
+        return jsonify({"error": "start, end and resolution must be numbers"}), 400
+    if start > end:
+        return jsonify({"error": "start must not be after end"}), 400
+    try:
+        record = docker_index.container_index.snapshot().resolve(container_id)
+        history = stats_store.query(record['ID'] if record else container_id, start, end, resolution)
+        return jsonify({"container": record['ID'] if record else container_id, "start": start, "end": end, **history}), 200
+    except ValueError as e: # Invalid ID or resolution; the index refresh failing
+        logging.error(f"Error reading stats history for container {container_id}: {e}")
+        return jsonify({"error": f"Failed to read stats history for container {container_id}", "details": str(e)}), 400
+    except Exception as e:
+        logging.exception(f"Unexpected error reading stats history for container {container_id}:")
+        return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
+
 # --- Docker Network Management Endpoints ---
 
 @app.route('/api/docker/networks', methods=['GET'])
 def list_docker_networks_route():
-    command = 'docker network ls --format "{{json .}}"'
     try:
-        result = exec_host_command(command)
-        lines = result['stdout'].strip().split('\n')
-        networks = [json.loads(line) for line in lines if line.strip()]
+        # Same query parameters as /api/docker/containers, with driver/scope/project as the facets.
+        networks = _query_index(docker_index.network_index, ('driver', 'scope', 'project'))
         return jsonify(networks), 200
-    except json.JSONDecodeError as je:
-        logging.error(f"Failed to parse JSON from docker network ls: {je}")
-        return jsonify({"error": "Failed to parse Docker network list output", "raw_output": result.get('stdout', '')}), 500
+    except (docker_index.InvalidQueryError, hosts.UnknownHostError) as e:
+        return jsonify({"error": "Invalid query parameters", "details": str(e)}), 400
     except ValueError as e:
         logging.error(f"Error listing Docker networks: {e}")
         return jsonify({"error": "Failed to list Docker networks", "details": str(e)}), 500
@@ -548,6 +1539,25 @@ def list_docker_networks_route():
         logging.exception("Unexpected error listing Docker networks:")
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
 
+@app.route('/api/docker/topology', methods=['GET'])
+def get_docker_topology_route():
+    """
+    The container <-> network graph: {'networks', 'containers', 'edges' (network, container, ipv4, ipv6, mac, aliases),
+    'version', 'refreshedAt'}. ?network= or ?container= (ID, ID prefix or name) narrows it to that node's neighbourhood;
+    ?refresh=true rebuilds it first.
+    """
+    try:
+        graph = topology.topology_index.graph(force_refresh=request.args.get('refresh', '').lower() == 'true')
+        return jsonify(graph.view(network=request.args.get('network'), container=request.args.get('container'))), 200
+    except topology.UnknownNodeError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        logging.error(f"Error building Docker network topology: {e}")
+        return jsonify({"error": "Failed to build Docker network topology", "details": str(e)}), 500
+    except Exception as e:
+        logging.exception("Unexpected error building Docker network topology:")
+        return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
+
 @app.route('/api/docker/networks/<network_id>', methods=['GET'])
 def inspect_docker_network_route(network_id):
     if not network_id:
@@ -579,7 +1589,8 @@ def get_container_networks_route(container_id):
     # Need to be careful with f-string and docker format braces
     command = f"docker container inspect --format \"{{{{json .NetworkSettings.Networks}}}}\" {container_id}"
     try:
-        result = exec_host_command(command)
+        # The relay drops everything but the fields the UI shows (IPAM config, driver opts, links...)
+        result = exec_host_command(command, projection=CONTAINER_NETWORKS_PROJECTION)
         stdout_trimmed = result['stdout'].strip()
         if not stdout_trimmed or stdout_trimmed == 'null':
             logging.info(f"No network data returned for container {container_id}")
@@ -606,7 +1617,10 @@ def connect_container_to_network_route(container_id, network_id):
     command = f"docker network connect {network_id} {container_id}"
     try:
         result = exec_host_command(command)
-        return jsonify({"success": True, "message": f"Container {container_id} connected to network {network_id} successfully", "output": result['stdout']}), 200
+        return jsonify({
+            "success": True, "message": f"Container {container_id} connected to network {network_id} successfully",
+            "output": result['stdout'], **_container_state_payload(container_id),
+        }), 200
     except ValueError as e:
         logging.error(f"Error connecting container {container_id} to network {network_id}: {e}")
         return jsonify({"error": "Failed to connect container to network", "details": str(e)}), 500
@@ -621,7 +1635,10 @@ def disconnect_container_from_network_route(container_id, network_id):
     command = f"docker network disconnect {network_id} {container_id}"
     try:
         result = exec_host_command(command)
-        return jsonify({"success": True, "message": f"Container {container_id} disconnected from network {network_id} successfully", "output": result['stdout']}), 200
+        return jsonify({
+            "success": True, "message": f"Container {container_id} disconnected from network {network_id} successfully",
+            "output": result['stdout'], **_container_state_payload(container_id),
+        }), 200
     except ValueError as e:
         logging.error(f"Error disconnecting container {container_id} from network {network_id}: {e}")
         return jsonify({"error": "Failed to disconnect container from network", "details": str(e)}), 500
@@ -629,6 +1646,20 @@ def disconnect_container_from_network_route(container_id, network_id):
         logging.exception(f"Unexpected error disconnecting container {container_id} from network {network_id}:")
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
 
+def _network_state_payload(network_id):
+    """Reads a just-created network's `docker network ls` record into the network index. Returns {'network', 'version'} or {}."""
+    try:
+        result = exec_host_command(f"docker network ls --filter \"id={network_id}\" --format \"{{{{json .}}}}\"")
+        records = docker_index.parse_json_lines(result['stdout'])
+    except ValueError as e:
+        logging.warning(f"Could not re-read network {network_id} after creation: {e}")
+        docker_index.network_index.invalidate()
+        return {}
+    if not records:
+        return {}
+    topology.topology_index.add_network(records[0])
+    return {"network": records[0], "version": docker_index.network_index.upsert(records[0])}
+
 @app.route('/api/docker/networks', methods=['POST'])
 def create_docker_network_route():
     req_data = request.get_json()
@@ -645,7 +1676,11 @@ def create_docker_network_route():
     try:
         result = exec_host_command(command)
         # 'docker network create' outputs the network ID on success
-        return jsonify({"success": True, "message": f"Network {name} created successfully", "networkId": result['stdout'].strip()}), 201
+        network_id = result['stdout'].strip()
+        return jsonify({
+            "success": True, "message": f"Network {name} created successfully", "networkId": network_id,
+            **_network_state_payload(network_id),
+        }), 201
     except ValueError as e:
         logging.error(f"Error creating Docker network {name}: {e}")
         return jsonify({"error": "Failed to create Docker network", "details": str(e)}), 500
@@ -660,7 +1695,11 @@ def remove_docker_network_route(network_id):
     command = f"docker network rm {network_id}"
     try:
         result = exec_host_command(command)
-        return jsonify({"success": True, "message": f"Network {network_id} removed successfully", "output": result['stdout']}), 200
+        topology.topology_index.remove_network(network_id)
+        return jsonify({
+            "success": True, "message": f"Network {network_id} removed successfully", "output": result['stdout'],
+            "version": docker_index.network_index.remove(network_id),
+        }), 200
     except ValueError as e:
         logging.error(f"Error removing Docker network {network_id}: {e}")
         return jsonify({"error": "Failed to remove Docker network", "details": str(e)}), 500
@@ -668,6 +1707,42 @@ def remove_docker_network_route(network_id):
         logging.exception(f"Unexpected error removing Docker network {network_id}:")
         return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
 
+# --- Background refresh (leader worker only) ---
+# The leader keeps the shared snapshots fresh, so reads in every worker are served without a relay call.
+shared_state.register_leader_task('containers', lambda: docker_index.container_index.snapshot(force_refresh=True))
+shared_state.register_leader_task('networks', lambda: docker_index.network_index.snapshot(force_refresh=True))
+shared_state.register_leader_task('tailscale-serve', lambda: serve_status_cache.get(force_refresh=True))
+shared_state.register_leader_task('tailscale-funnel', lambda: funnel_status_cache.get(force_refresh=True))
+# History is recorded whether or not anyone is looking, like the probes and pre-pulls below: it feeds 7-day trends.
+shared_state.register_leader_task('stats-history', stats_collector.collect_in_background, interval=stats_history.STATS_INTERVAL,
+                                  when_idle=True)
+# Registered even when background probing is disabled, to run the rounds requested through the API.
+shared_state.register_leader_task(prober.LEADER_TASK, service_prober.run_in_background, interval=prober.PROBE_INTERVAL,
+                                  when_idle=True, scheduled=prober.PROBE_INTERVAL > 0)
+shared_state.register_leader_task(image_prepull.LEADER_TASK, prepuller.run_in_background, interval=image_prepull.PREPULL_INTERVAL,
+                                  when_idle=True, scheduled=image_prepull.PREPULL_INTERVAL > 0)
+
+# --- Warm start ---
+# The leader persists the last known state to DATA_DIR; every worker restores it on boot and serves it,
+# flagged stale, until the first refresh completes. Compose app status is derived from the container index,
+# so it is warm as well.
+state_snapshot = warm_start.SnapshotFile(os.path.join(DATA_DIR, 'state-snapshot.json.gz'), {
+    'containers': docker_index.container_index,
+    'networks': docker_index.network_index,
+    'tailscale-serve': serve_status_cache,
+    'tailscale-funnel': funnel_status_cache,
+    'tailscale-peers': tailscale_peers.peer_index,
+})
+state_snapshot.restore()
+shared_state.register_leader_task('state-snapshot', state_snapshot.save, interval=warm_start.SNAPSHOT_INTERVAL)
+
+@atexit.register
+def _save_state_snapshot_on_shutdown():
+    if shared_state.is_leader():
+        state_snapshot.save()
+
+shared_state.start(DATA_DIR)
+
 # --- Static file serving for production ---
 # This assumes that the frontend has been built and its static files are in ../frontend/dist
 # The Dockerfile will need to ensure this path is correct relative to where app.py is run.
@@ -694,11 +1769,13 @@ if IS_PRODUCTION:
             f"Frontend distribution path {FRONTEND_DIST_PATH} does not exist. "
             "Static file serving will likely fail. Ensure frontend is built and path is correct."
         )
+    # .gz/.br siblings are written once per build (Dockerfile / npm run build), see http_cache.precompress_static.
 
     # Serve files from the root of FRONTEND_DIST_PATH (e.g., /assets/*)
+    # Vite's hashed build output: served precompressed when possible and cached forever by browsers.
     @app.route('/assets/<path:filename>')
     def serve_assets(filename):
-        return send_from_directory(Path(FRONTEND_DIST_PATH) / 'assets', filename)
+        return http_cache.send_static_file(Path(FRONTEND_DIST_PATH) / 'assets', filename, immutable=True)
 
     # Serve other static files like vite.svg, index.html from the root of FRONTEND_DIST_PATH
     # This route needs to be more specific or come after the SPA catch-all if it's too greedy.
@@ -708,7 +1785,7 @@ if IS_PRODUCTION:
         # Only serve specific files or files with common static extensions from root
         known_static_files = ['favicon.ico', 'robots.txt', 'manifest.json', 'vite.svg'] # Add more as needed
         if filename in known_static_files or filename.endswith(('.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.webmanifest')):
-            return send_from_directory(FRONTEND_DIST_PATH, filename)
+            return http_cache.send_static_file(FRONTEND_DIST_PATH, filename)
         # If it's not a recognized static file, it should be handled by the SPA catch-all.
         # This specific /<path:filename> might be too greedy if not careful.
         # The SPA catch-all below is usually better.
@@ -716,7 +1793,7 @@ if IS_PRODUCTION:
         # This route can be refined or removed if SPA catch-all is sufficient.
         # Let's make it serve index.html specifically if requested directly.
         if filename == 'index.html':
-             return send_from_directory(FRONTEND_DIST_PATH, 'index.html')
+             return http_cache.send_static_file(FRONTEND_DIST_PATH, 'index.html')
         # Fall through to SPA handler for other paths
         return serve_spa(filename)
 
@@ -735,7 +1812,8 @@ if IS_PRODUCTION:
         logging.debug(f"SPA catch-all route triggered for path: {path}. Serving index.html.")
         index_html_path = Path(FRONTEND_DIST_PATH) / 'index.html'
         if index_html_path.exists():
-            return send_file(index_html_path)
+            # index.html is not content-hashed, so it is always revalidated (cheap thanks to its ETag).
+            return http_cache.send_static_file(FRONTEND_DIST_PATH, 'index.html')
         else:
             logging.error(f"index.html not found at {index_html_path}")
             return jsonify({"error": "Frontend entry point not found. Please build the frontend."}), 404
@@ -0,0 +1,96 @@
+import re
+import hashlib
+
+from image_prepull import compose_command
+
+# Desired-state fingerprints for compose apps, so `up` can be skipped (or narrowed) when nothing changed.
+# The desired side of each service is the hash compose itself computes over the fully resolved service config
+# (`config --hash`: compose file, interpolated .env values, env_file contents, image reference...), plus the image
+# ID the pre-pull scheduler last resolved for its image (image_prepull.py). The running side is the config hash
+# compose labels every container with, and the image ID the container runs. Hashing the resolved config rather
+# than the raw files means comment or formatting edits are not reported as drift. An image the pre-pull state knows
+# nothing about (pre-pull disabled, or not yet run for the app) may have a newer version: it is reported as
+# 'imageUnknown' drift rather than assumed current. Services built on the host are covered by their config hash alone.
+_SECTION_SEPARATOR = '---tailbrain-fingerprint---'
+_SERVICE_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+SERVICE_LABEL = 'com.docker.compose.service'
+CONFIG_HASH_LABEL = 'com.docker.compose.config-hash'
+
+
+def drift_command(compose_path, container_ids):
+    """One relay call: the desired per-service config hashes, then the image ID of every container of the app."""
+    command = compose_command(compose_path, 'config --hash "*"')
+    if container_ids:
+        command += f" && echo {_SECTION_SEPARATOR} && docker inspect --format \"{{{{.Id}}}} {{{{.Image}}}}\" {' '.join(container_ids)}"
+    return command
+
+
+def parse_drift_output(stdout):
+    """
+    Returns:
+        tuple: ({service: desired config hash}, {12-character container id: image id}).
+    """
+    hashes_output, _, images_output = stdout.partition(_SECTION_SEPARATOR)
+    desired = {}
+    for line in hashes_output.splitlines():
+        service, _, config_hash = line.strip().partition(' ')
+        if service and config_hash:
+            desired[service] = config_hash.strip()
+    running_images = {}
+    for line in images_output.splitlines():
+        container_id, _, image_id = line.strip().partition(' ')
+        if container_id and image_id:
+            running_images[container_id[:12]] = image_id.strip()
+    return desired, running_images
+
+
+def service_drift(desired, members, running_images, desired_images, built=()):
+    """
+    Compares an app's desired services with its containers.
+    Args:
+        desired (dict): {service: config hash} from `config --hash`.
+        members (list): (container id, docker ps record, parsed labels, status) of the app's containers.
+        running_images (dict): {container id: image id the container runs}.
+        desired_images (dict): {image reference: image id last pulled}, from the pre-pull state.
+        built (iterable): Services whose image is built on the host rather than pulled (no image check).
+    Returns:
+        dict: {'fingerprint', 'inSync', 'changed' (services to bring up), 'services': [{service, state, reasons, containers}]}
+              where state is 'inSync', 'drifted' (reasons: config, image, imageUnknown, stopped), 'missing' or 'orphaned'.
+    """
+    by_service = {}
+    for container_id, record, labels, status in members:
+        by_service.setdefault(labels.get(SERVICE_LABEL), []).append((container_id, record, labels, status))
+
+    services, changed, fingerprint_parts = [], [], []
+    for service in sorted(set(desired) | {s for s in by_service if s}):
+        containers = by_service.get(service, [])
+        reasons = []
+        if service not in desired:
+            state = 'orphaned' # Still running, but no longer in the compose file; `up --remove-orphans` removes it
+        elif not containers:
+            state, reasons = 'missing', ['no container']
+        else:
+            for container_id, record, labels, status in containers:
+                if labels.get(CONFIG_HASH_LABEL) != desired[service] and 'config' not in reasons:
+                    reasons.append('config')
+                if service not in built:
+                    wanted_image = desired_images.get(record.get('Image'))
+                    if wanted_image is None and 'imageUnknown' not in reasons:
+                        reasons.append('imageUnknown')
+                    elif wanted_image and running_images.get(container_id) not in (None, wanted_image) and 'image' not in reasons:
+                        reasons.append('image')
+                if status != 'running' and 'stopped' not in reasons:
+                    reasons.append('stopped')
+            state = 'drifted' if reasons else 'inSync'
+        if state in ('missing', 'drifted') and _SERVICE_PATTERN.match(service):
+            changed.append(service)
+        images = sorted({desired_images.get(record.get('Image')) or record.get('Image') or '' for _, record, _, _ in containers})
+        fingerprint_parts.append(f"{service}={desired.get(service, '')}@{','.join(images)}")
+        services.append({"service": service, "state": state, "reasons": reasons,
+                         "containers": [container_id for container_id, _, _, _ in containers]})
+    return {
+        "fingerprint": hashlib.sha256('\n'.join(fingerprint_parts).encode('utf-8')).hexdigest()[:16],
+        "inSync": not any(entry['state'] in ('missing', 'drifted') for entry in services),
+        "changed": changed,
+        "services": services,
+    }
@@ -0,0 +1,432 @@
+import os
+import re
+import json
+import time
+import base64
+import logging
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+from host_caller import exec_host_command, RelayBusyError
+import shared_state
+import tracing
+
+# How long a refreshed index is served before the next read triggers another `docker ps` / `docker network ls`.
+DOCKER_INDEX_TTL = float(os.environ.get('DOCKER_INDEX_TTL', 5))
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+# docker's CreatedAt: '2024-01-15 10:30:45 +0100 CET', with fractional seconds in `docker network ls`.
+_CREATED_AT_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?:\.(\d+))? ([+-]\d{4})')
+
+
+def parse_json_lines(stdout_str):
+    """Parses JSON line-formatted output such as 'docker ps --format "{{json .}}"'."""
+    if not stdout_str or not stdout_str.strip():
+        return []
+    records = []
+    for line in stdout_str.strip().split('\n'):
+        if line.strip():
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                logging.error(f"Failed to parse JSON line: {line} - Error: {e}")
+    return records
+
+
+def parse_labels(labels_str):
+    """
+    Parses the comma separated 'Labels' field of docker's CLI JSON output into a dict.
+    Label values may themselves contain commas, so pieces without '=' are glued back onto the previous value.
+    """
+    labels = {}
+    if not labels_str:
+        return labels
+    if isinstance(labels_str, dict):
+        return dict(labels_str)
+    last_key = None
+    for piece in labels_str.split(','):
+        if '=' in piece:
+            key, value = piece.split('=', 1)
+            labels[key] = value
+            last_key = key
+        elif last_key is not None:
+            labels[last_key] += ',' + piece
+    return labels
+
+
+class InvalidQueryError(ValueError):
+    """Raised for list query parameters the index cannot answer (bad cursor, sort field or limit)."""
+
+
+def encode_cursor(sort_key):
+    return base64.urlsafe_b64encode(json.dumps(sort_key).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decodes an opaque page cursor. Raises InvalidQueryError for anything that is not a cursor we handed out."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_key = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception as e:
+        raise InvalidQueryError(f"Invalid cursor: {cursor}") from e
+    # Sort keys are (field value, id) string pairs (see IndexSnapshot.sorted_keys); anything else cannot be bisected.
+    if not isinstance(sort_key, list) or len(sort_key) != 2 or not all(isinstance(part, str) for part in sort_key):
+        raise InvalidQueryError(f"Invalid cursor: {cursor}")
+    return tuple(sort_key)
+
+
+def created_sort_key(created_at):
+    """
+    Turns docker's CreatedAt display string into a UTC timestamp that sorts chronologically as a string
+    ('2024-01-15T09:30:45.000000Z'). The display string itself carries the daemon's local offset, so it does not.
+    Values that do not parse are returned unchanged.
+    """
+    match = _CREATED_AT_PATTERN.match(created_at or '')
+    if not match:
+        return created_at
+    seconds, fraction, offset = match.groups()
+    try:
+        created = datetime.strptime(f"{seconds} {offset}", '%Y-%m-%d %H:%M:%S %z')
+    except ValueError:
+        return created_at
+    created = created.replace(microsecond=int((fraction or '0')[:6].ljust(6, '0')))
+    return created.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class IndexSnapshot:
+    """
+    An immutable view of one refresh of a resource list.
+    Holds the raw records (as returned by the docker CLI) plus the lookup structures used to answer queries:
+    inverted maps for the exact-match filters and lazily built sorted key lists for keyset pagination.
+    """
+
+    def __init__(self, records, describe, version, refreshed_at, stale=False):
+        self.records = records
+        self.version = version
+        self.refreshed_at = refreshed_at
+        self.stale = stale # True for a snapshot restored from disk at boot that has not been re-listed yet
+        self.by_id = {}
+        self.meta = {}
+        self.by_facet = {}
+        self.by_label = {}
+        self._sorted = {}
+        self._sort_lock = threading.Lock()
+
+        for record in records:
+            meta = describe(record)
+            record_id = meta['id']
+            self.by_id[record_id] = record
+            self.meta[record_id] = meta
+            for facet, value in meta['facets'].items():
+                if value:
+                    self.by_facet.setdefault(facet, {}).setdefault(value, set()).add(record_id)
+            for key, value in meta['labels'].items():
+                self.by_label.setdefault(key, set()).add(record_id)
+                self.by_label.setdefault(f"{key}={value}", set()).add(record_id)
+
+    def resolve(self, record_id):
+        """Looks a record up by full ID, unambiguous ID prefix or name."""
+        if record_id in self.by_id:
+            return self.by_id[record_id]
+        wanted = record_id.lower()
+        matches = [rid for rid, meta in self.meta.items()
+                   if rid.startswith(record_id) or wanted in meta['names'].split(',')]
+        return self.by_id[matches[0]] if len(matches) == 1 else None
+
+    def sorted_keys(self, field):
+        """Returns (keys, ids) sorted ascending by (field value, id), built once per snapshot and field."""
+        with self._sort_lock:
+            if field not in self._sorted:
+                pairs = sorted(((str(self.meta[rid]['sort'].get(field) or ''), rid), rid) for rid in self.by_id)
+                self._sorted[field] = ([p[0] for p in pairs], [p[1] for p in pairs])
+            return self._sorted[field]
+
+    def candidate_ids(self, facets=None, labels=None):
+        """Intersects the inverted maps for the exact-match filters. Returns None when no such filter was given."""
+        candidates = None
+        for facet, accepted in (facets or {}).items():
+            values = self.by_facet.get(facet, {})
+            ids = set().union(*(values.get(v, set()) for v in accepted))
+            candidates = ids if candidates is None else candidates & ids
+        for label in labels or []:
+            ids = self.by_label.get(label, set())
+            candidates = set(ids) if candidates is None else candidates & ids
+        return candidates
+
+    def query(self, name=None, facets=None, labels=None, sort='name', descending=False, cursor=None, limit=None):
+        """
+        Filters, sorts and pages the snapshot.
+        Args:
+            name (str): Case-insensitive substring matched against the resource name(s).
+            facets (dict): Exact-match filters, facet name -> list of accepted values
+                (e.g. {'status': ['running'], 'project': ['web']}).
+            labels (list): Label filters, either 'key' or 'key=value'. All must match.
+            sort (str): Sort field; must be one of the fields the resource describes.
+            descending (bool): Reverse the sort order.
+            cursor (str): Opaque cursor from a previous page's 'nextCursor'.
+            limit (int): Page size. None returns every match.
+        Returns:
+            dict: {'items', 'total', 'nextCursor', 'version', 'refreshedAt'}
+        """
+        candidates = self.candidate_ids(facets=facets, labels=labels)
+        name_filter = name.lower() if name else None
+
+        def matches(rid):
+            if candidates is not None and rid not in candidates:
+                return False
+            if name_filter and name_filter not in self.meta[rid]['names']:
+                return False
+            return True
+
+        keys, ids = self.sorted_keys(sort)
+        if descending:
+            end = bisect_left(keys, decode_cursor(cursor)) if cursor else len(keys)
+            positions = range(end - 1, -1, -1)
+        else:
+            start = bisect_right(keys, decode_cursor(cursor)) if cursor else 0
+            positions = range(start, len(keys))
+
+        items = []
+        next_cursor = None
+        last_key = None
+        for pos in positions:
+            rid = ids[pos]
+            if not matches(rid):
+                continue
+            if limit is not None and len(items) == limit:
+                # There is at least one more match, so hand out a cursor pointing just past this page.
+                next_cursor = encode_cursor(list(last_key))
+                break
+            items.append(self.by_id[rid])
+            last_key = keys[pos]
+
+        total = sum(1 for rid in (candidates if candidates is not None else self.by_id) if matches(rid))
+        return {
+            "items": items,
+            "total": total,
+            "nextCursor": next_cursor,
+            "version": self.version,
+            "refreshedAt": self.refreshed_at,
+        }
+
+
+class ResourceIndex:
+    """
+    Caches one listing command (docker, or `tailscale status`) in memory and answers queries against it.
+    The listing is re-run at most once per DOCKER_INDEX_TTL seconds, no matter how many pages are requested.
+    When shared_state is running, every refresh is published for the other workers, and a fresh snapshot
+    published by another worker (normally the leader's background refresh) is adopted instead of re-listing.
+    """
+
+    def __init__(self, name, command, describe, sort_fields, ttl=DOCKER_INDEX_TTL, relay_url=None, parse=parse_json_lines):
+        self.name = name
+        self.command = command
+        self.parse = parse # Command output -> list of records
+        self.relay_url = relay_url # None: the default relay (HOST_RELAY_URL)
+        self.describe = describe
+        self.sort_fields = sort_fields
+        self.ttl = ttl
+        self._snapshot = None
+        self._stale = False
+        self._invalidated_at = 0
+        self._lock = threading.Lock()
+        self._background_refresh = None
+
+    def snapshot(self, force_refresh=False):
+        """
+        Returns the current snapshot, refreshing it first if it is older than the TTL (or if forced).
+        A snapshot restored at boot (see seed()) is returned as-is, flagged stale, while a background
+        refresh replaces it, so the first requests after a restart do not wait on the relay.
+        When the relay sheds the refresh (RelayBusyError), the previous snapshot is returned instead.
+        """
+        shared_state.record_activity()
+        if not force_refresh and self._is_fresh():
+            return self._snapshot
+        if not force_refresh and self._snapshot is not None and self._snapshot.stale:
+            self._refresh_in_background()
+            return self._snapshot
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock.
+            if not force_refresh and self._is_fresh():
+                return self._snapshot
+            try:
+                return self.refresh()
+            except RelayBusyError as e:
+                if force_refresh or self._snapshot is None:
+                    raise
+                logging.warning(f"Serving the previous {self.name} snapshot, relay is busy: {e}")
+                return self._snapshot
+
+    def _is_fresh(self):
+        if shared_state.store is not None:
+            return self._adopt_shared()
+        current = self._snapshot
+        return current is not None and not self._stale and time.time() - current.refreshed_at < self.ttl
+
+    def _adopt_shared(self):
+        """Switches to the snapshot published in the shared store if that one is fresh. Returns whether it was."""
+        payload, refreshed_at = shared_state.store.load(self.name)
+        if payload is None or time.time() - refreshed_at >= self.ttl:
+            return False
+        if self._stale and refreshed_at <= self._invalidated_at:
+            return False # Invalidated here, and nobody has re-listed since
+        self._stale = False
+        current = self._snapshot
+        if current is not None and current.version == payload['version']:
+            current.refreshed_at = refreshed_at # Same content, just re-confirmed by whoever refreshed it
+            current.stale = False
+        else:
+            self._snapshot = IndexSnapshot(payload['records'], self.describe, payload['version'], refreshed_at)
+        return True
+
+    def for_host(self, host_name, relay_url):
+        """Returns an empty index for the same listing on another host's relay (see hosts.py)."""
+        return ResourceIndex(f"{self.name}@{host_name}", self.command, self.describe, self.sort_fields, self.ttl, relay_url,
+                             self.parse)
+
+    def sort_key(self, record, field):
+        """The (value, id) key query() orders records by, for merging results from several indexes."""
+        meta = self.describe(record)
+        return (str(meta['sort'].get(field) or ''), meta['id'])
+
+    def refresh(self):
+        result = exec_host_command(self.command, relay_url=self.relay_url)
+        with tracing.span("parse", index=self.name):
+            return self.replace(self.parse(result['stdout']))
+
+    def _refresh_in_background(self):
+        if self._background_refresh is not None and self._background_refresh.is_alive():
+            return
+
+        def run():
+            try:
+                self.snapshot(force_refresh=True)
+            except ValueError as e:
+                logging.warning(f"Background refresh of the {self.name} index failed: {e}")
+
+        self._background_refresh = threading.Thread(target=run, name=f"refresh-{self.name}", daemon=True)
+        self._background_refresh.start()
+
+    def export(self):
+        """Returns the current snapshot in warm_start's persisted form, or None if nothing was listed yet."""
+        current = self._snapshot
+        if current is None:
+            return None
+        return {"version": current.version, "refreshedAt": current.refreshed_at, "data": current.records}
+
+    def seed(self, data, version, refreshed_at):
+        """Installs a snapshot restored from disk, unless something fresher was already loaded."""
+        if self._snapshot is None:
+            self._snapshot = IndexSnapshot(data, self.describe, version, refreshed_at, stale=True)
+
+    def replace(self, records, refreshed_at=None):
+        """Swaps in a new record list. The version only moves when the content actually changed."""
+        current = self._snapshot
+        version = current.version if current else 0
+        if shared_state.store is not None:
+            # Keep versions monotonic across workers.
+            payload, _ = shared_state.store.load(self.name)
+            version = max(version, payload['version'] if payload else 0)
+        if current is None or current.records != records:
+            version += 1
+        self._snapshot = IndexSnapshot(records, self.describe, version, refreshed_at or time.time())
+        if refreshed_at is None:
+            self._stale = False
+        if shared_state.store is not None:
+            shared_state.store.publish(self.name, {"version": version, "records": records}, self._snapshot.refreshed_at)
+        logging.debug(f"{self.name} index refreshed: {len(records)} records, version {version}")
+        return self._snapshot
+
+    def peek(self):
+        """Returns the current snapshot without refreshing it (None before the first refresh)."""
+        return self._snapshot
+
+    def upsert(self, record):
+        """
+        Replaces (or adds) one record, e.g. with a container's state re-read right after a mutation.
+        The rest of the snapshot keeps its original refresh time, so the TTL is not extended.
+        Returns:
+            int or None: The new index version, or None if nothing has been indexed yet.
+        """
+        record_id = self.describe(record)['id']
+        with self._lock:
+            current = self._snapshot
+            if current is None:
+                return None # The first read will list everything anyway
+            records = list(current.records)
+            if record_id in current.by_id:
+                records[records.index(current.by_id[record_id])] = record
+            else:
+                records.append(record)
+            return self.replace(records, refreshed_at=current.refreshed_at).version
+
+    def remove(self, record_id):
+        """Drops one record (by ID, ID prefix or name). Returns the new index version, or None if it was not indexed."""
+        with self._lock:
+            current = self._snapshot
+            record = current.resolve(record_id) if current else None
+            if record is None:
+                return None
+            records = [r for r in current.records if r is not record]
+            return self.replace(records, refreshed_at=current.refreshed_at).version
+
+    def invalidate(self):
+        """Forces the next read (in any worker) to re-run the listing command (e.g. after a mutation)."""
+        self._stale = True
+        self._invalidated_at = time.time()
+        if shared_state.store is not None:
+            shared_state.store.invalidate(self.name)
+
+
+def _describe_container(record):
+    labels = parse_labels(record.get('Labels'))
+    names = record.get('Names') or ''
+    return {
+        "id": record.get('ID', ''),
+        "names": names.lower(),
+        "labels": labels,
+        "facets": {
+            "status": (record.get('State') or '').lower(),
+            "project": labels.get('com.docker.compose.project'),
+        },
+        "sort": {
+            "name": names.lower(),
+            "image": record.get('Image'),
+            "status": record.get('State'),
+            "created": created_sort_key(record.get('CreatedAt')),
+            "project": labels.get('com.docker.compose.project'),
+        },
+    }
+
+
+def _describe_network(record):
+    labels = parse_labels(record.get('Labels'))
+    name = record.get('Name') or ''
+    return {
+        "id": record.get('ID', ''),
+        "names": name.lower(),
+        "labels": labels,
+        "facets": {
+            "driver": (record.get('Driver') or '').lower(),
+            "scope": (record.get('Scope') or '').lower(),
+            "project": labels.get('com.docker.compose.project'),
+        },
+        "sort": {
+            "name": name.lower(),
+            "driver": record.get('Driver'),
+            "scope": record.get('Scope'),
+            "created": created_sort_key(record.get('CreatedAt')),
+        },
+    }
+
+
+# `-a` so one listing answers both the default (running only) view and `all=true`.
+container_index = ResourceIndex(
+    'containers', 'docker ps -a --format "{{json .}}"', _describe_container,
+    sort_fields=('name', 'image', 'status', 'created', 'project'),
+)
+network_index = ResourceIndex(
+    'networks', 'docker network ls --format "{{json .}}"', _describe_network,
+    sort_fields=('name', 'driver', 'scope', 'created'),
+)
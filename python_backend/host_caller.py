@@ -1,56 +1,327 @@
 import os
-import requests
+import time
+import socket
 import logging
+import threading
+import json
+import math
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+
+import relay_wire
+import relay_projection
+import tracing
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# http(s)://host:port, or unix:///path/to/relay.sock when the relay listens on a unix socket (RELAY_UNIX_SOCKET)
 HOST_RELAY_URL = os.environ.get('HOST_RELAY_URL', 'http://host.docker.internal:7655')
+# Keep-alive connections kept per relay; bulk actions run up to 32 relay calls at once.
+RELAY_POOL_SIZE = int(os.environ.get('RELAY_POOL_SIZE', 32))
+# Output kept per stream (stdout/stderr) of one command; the relay applies its own cap (RELAY_MAX_OUTPUT_BYTES) too.
+HOST_OUTPUT_MAX_BYTES = int(os.environ.get('HOST_OUTPUT_MAX_BYTES', 32 * 1024 * 1024))
+# Shared secret sent to relays started with RELAY_TOKEN, which then refuse commands without it.
+RELAY_TOKEN = os.environ.get('RELAY_TOKEN', '')
+# Prefer the framed binary envelope, but still understand the JSON one from an older relay.
+RELAY_ACCEPT = f"{relay_wire.MEDIA_TYPE}, application/json;q=0.5"
+
+# Admission control, per worker and relay. Reads (listings, inspects, logs, status) are sheddable: they wait at most
+# READ_ADMISSION_TIMEOUT for a slot, are rate limited by a token bucket, and are refused outright while the relay
+# reports itself saturated. Mutations are never shed; RELAY_MUTATION_RESERVED_SLOTS slots are kept free for them.
+# Background work (image pre-pulls, which can run for many minutes) is neither shed nor counted against the slots:
+# its callers bound their own concurrency, and it must not hold interactive requests up while it runs.
+RELAY_MAX_CONCURRENCY = int(os.environ.get('RELAY_MAX_CONCURRENCY', 8))
+RELAY_MUTATION_RESERVED_SLOTS = int(os.environ.get('RELAY_MUTATION_RESERVED_SLOTS', 2))
+READ_ADMISSION_TIMEOUT = float(os.environ.get('READ_ADMISSION_TIMEOUT', 1))
+READ_RATE_LIMIT = float(os.environ.get('READ_RATE_LIMIT', 20)) # Reads per second, sustained
+READ_BURST = int(os.environ.get('READ_BURST', 40))
+RELAY_LOAD_CHECK_INTERVAL = float(os.environ.get('RELAY_LOAD_CHECK_INTERVAL', 2)) # How often /health's load is re-read
+PRIORITY_READ = 'read'
+PRIORITY_MUTATION = 'mutation'
+PRIORITY_BACKGROUND = 'background'
+READ_COMMAND_PREFIXES = (
+    'docker ps', 'docker inspect', 'docker container inspect', 'docker network ls', 'docker network inspect',
+    'docker logs', 'docker stats', 'docker images', 'docker image inspect', 'docker image ls', 'docker version',
+    'tailscale status', 'tailscale serve status', 'tailscale funnel status', 'tailscale version', 'echo ',
+    'docker buildx imagetools inspect',
+)
+# Read-only commands these prefixes cannot recognise (e.g. `cd "<dir>" && docker-compose ... config`) pass
+# priority=PRIORITY_READ explicitly; everything else is classified as a mutation.
+
+# Set by the app: called with the RelayBusyError whenever a call is shed, so the request can be answered with 429/503.
+on_relay_busy = None
+
+
+class RelayBusyError(ValueError):
+    """
+    A read was shed because the relay (or this worker's share of it) is saturated.
+    status is 429 when the read rate limit was hit and 503 when the relay has no capacity left.
+    """
+
+    def __init__(self, message, retry_after=1, status=503):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+        self.status = status
+
+
+def classify_command(command_string):
+    return PRIORITY_READ if command_string.lstrip().startswith(READ_COMMAND_PREFIXES) else PRIORITY_MUTATION
+
+
+class _Admission:
+    """Concurrency slots, a read token bucket and the relay's last reported load, for one relay."""
+
+    def __init__(self, relay_url):
+        self.relay_url = relay_url
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._tokens = float(READ_BURST)
+        self._tokens_at = time.monotonic()
+        self._relay_load = None
+        self._load_checked_at = 0
+        self._load_check_running = False
+
+    def acquire(self, priority):
+        if priority == PRIORITY_BACKGROUND:
+            return
+        if priority == PRIORITY_MUTATION:
+            with self._cond:
+                while self.in_flight >= RELAY_MAX_CONCURRENCY:
+                    self._cond.wait()
+                self.in_flight += 1
+            return
+
+        self._check_relay_load()
+        deadline = time.monotonic() + READ_ADMISSION_TIMEOUT
+        read_slots = max(1, RELAY_MAX_CONCURRENCY - RELAY_MUTATION_RESERVED_SLOTS)
+        with self._cond:
+            self._take_token()
+            while self.in_flight >= read_slots:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._tokens = min(READ_BURST, self._tokens + 1) # Shed: the read never reached the relay
+                    raise RelayBusyError(f"All {read_slots} read slots for relay {self.relay_url} are busy", READ_ADMISSION_TIMEOUT)
+                self._cond.wait(remaining)
+            self.in_flight += 1
+
+    def release(self, priority):
+        if priority == PRIORITY_BACKGROUND:
+            return
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def _take_token(self):
+        now = time.monotonic()
+        self._tokens = min(READ_BURST, self._tokens + (now - self._tokens_at) * READ_RATE_LIMIT)
+        self._tokens_at = now
+        if self._tokens < 1:
+            raise RelayBusyError(f"Read rate limit for relay {self.relay_url} exceeded",
+                                 (1 - self._tokens) / READ_RATE_LIMIT, status=429)
+        self._tokens -= 1
+
+    def _check_relay_load(self):
+        """Re-reads the relay's reported load every RELAY_LOAD_CHECK_INTERVAL (one caller does it, the others use the last value)."""
+        with self._cond:
+            due = time.monotonic() - self._load_checked_at >= RELAY_LOAD_CHECK_INTERVAL and not self._load_check_running
+            if due:
+                self._load_check_running = True
+        if due:
+            try:
+                self._relay_load = check_relay(self.relay_url, timeout=0.5).get('load')
+            except ValueError:
+                self._relay_load = None # Unreachable: let the call itself report that
+            finally:
+                self._load_checked_at = time.monotonic()
+                self._load_check_running = False
+        load = self._relay_load
+        if load and load.get('saturated'):
+            raise RelayBusyError(
+                f"Relay {self.relay_url} is saturated ({load.get('inFlight')}/{load.get('capacity')} commands running)",
+                load.get('retryAfter', 1),
+            )
+
+
+_admissions = {}
+
+
+class _UnixSocketConnection(HTTPConnection):
+    def __init__(self, *args, socket_path=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.socket_path = socket_path
+
+    def _new_conn(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout if isinstance(self.timeout, (int, float)) else None)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+
+class _UnixSocketConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _UnixSocketConnection
+
+
+class _UnixSocketAdapter(HTTPAdapter):
+    """requests adapter that sends every request over one pool of keep-alive unix socket connections."""
+
+    def __init__(self, socket_path):
+        super().__init__()
+        self._pool = _UnixSocketConnectionPool('localhost', maxsize=RELAY_POOL_SIZE, block=False, socket_path=socket_path)
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        return self._pool
+
+    def get_connection(self, url, proxies=None): # requests < 2.32
+        return self._pool
+
+    def close(self):
+        self._pool.close()
+        super().close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _relay_client(relay_url):
+    """
+    Returns (session, base_url) for a relay URL. Sessions are created once per URL and reused,
+    so calls go over pooled keep-alive connections instead of a new TCP handshake each time.
+    """
+    client = _clients.get(relay_url)
+    if client is not None:
+        return client
+    with _clients_lock:
+        if relay_url not in _clients:
+            session = requests.Session()
+            if relay_url.startswith('unix://'):
+                session.trust_env = False # Proxy settings do not apply to a local socket
+                session.headers['Accept-Encoding'] = 'identity' # Compressing costs more than copying locally
+                session.mount('http+unix://', _UnixSocketAdapter(relay_url[len('unix://'):]))
+                base_url = 'http+unix://relay'
+            else:
+                session.mount(relay_url, HTTPAdapter(pool_connections=1, pool_maxsize=RELAY_POOL_SIZE))
+                base_url = relay_url.rstrip('/')
+            _clients[relay_url] = (session, base_url)
+        return _clients[relay_url]
+
+
+def _admission_for(relay_url):
+    admission = _admissions.get(relay_url)
+    if admission is None:
+        with _clients_lock:
+            admission = _admissions.setdefault(relay_url, _Admission(relay_url))
+    return admission
+
+
+def _auth_headers():
+    return {"X-Relay-Token": RELAY_TOKEN} if RELAY_TOKEN else {}
+
+
+def _shed(error):
+    logging.warning(f"Shedding host command: {error}")
+    if on_relay_busy is not None:
+        on_relay_busy(error)
+    raise error
+
 
-def exec_host_command(command_string):
+def exec_host_command(command_string, relay_url=None, projection=None, timeout=60, priority=None):
     """
     Executes a command on the host system via the host-command-relay service.
     Args:
         command_string (str): The command to execute.
+        relay_url (str, optional): Relay to use instead of HOST_RELAY_URL.
+        projection (dict, optional): relay_projection spec (JSON path, grep, head/tail) for the relay to apply
+                                     to the output before sending it.
+        timeout (float): Seconds to wait for the relay.
+        priority (str, optional): PRIORITY_READ (sheddable), PRIORITY_MUTATION or PRIORITY_BACKGROUND (unthrottled);
+                                  derived from the command when omitted.
     Returns:
-        dict: A dictionary containing 'stdout' and 'stderr' from the command execution.
+        dict: A dictionary containing 'stdout' and 'stderr' from the command execution
+              (plus 'truncated': True if the output exceeded the size limits).
     Raises:
         requests.exceptions.RequestException: If the request to the relay fails.
+        RelayBusyError: If a read was shed because the relay is saturated (a ValueError).
         ValueError: If the relay returns an unexpected error or response format.
     """
     logging.info(f"Executing host command via relay: {command_string}")
     
+    relay_url = relay_url or HOST_RELAY_URL
+    priority = priority or classify_command(command_string)
+    admission = _admission_for(relay_url)
     try:
-        response = requests.post(
-            f"{HOST_RELAY_URL}/execute",
-            json={"command": command_string},
-            timeout=60  # Set a timeout for the request (e.g., 60 seconds)
+        with tracing.span("relay.queue", "relay-client", priority=priority):
+            admission.acquire(priority)
+    except RelayBusyError as e:
+        _shed(e)
+    try:
+        with tracing.span("relay.call", "relay-client", command=command_string, relay=relay_url):
+            response_data, stdout, stderr = _post_command(relay_url, command_string, projection, timeout, priority)
+    finally:
+        admission.release(priority)
+
+    # A failed command comes back as a 500 either way: the JSON envelope raises above (HTTPError -> ValueError),
+    # the framed one is read in full (stderr included) and raises the same ValueError here.
+    if response_data.get("error"):
+        logging.error(
+            f"Error from host command '{command_string}': {response_data.get('error')}\n"
+            f"Stderr: {stderr}\n"
+            f"Code: {response_data.get('code')}"
         )
-        response.raise_for_status()  # Raise an HTTPError for bad responses (4XX or 5XX)
+        raise ValueError(f"Relay returned HTTP error: {response_data['error']} - {stderr}")
 
-        response_data = response.json()
-        
-        stdout = response_data.get("stdout", "")
-        stderr = response_data.get("stderr", "")
-        
-        if response_data.get("error"): # Check if the relay reported a command execution error
-            logging.error(
-                f"Error from host command '{command_string}': {response_data.get('error')}\n"
-                f"Stderr: {stderr}\n"
-                f"Stdout: {stdout}\n"
-                f"Code: {response_data.get('code')}"
+    if projection is not None and not response_data.get("projected"):
+        # Relay without projection support: same result, just without the transfer savings.
+        try:
+            projected = {name: relay_projection.apply_text(text, projection).strip()
+                         for name, text in (("stdout", stdout), ("stderr", stderr))
+                         if name in relay_projection.validate(projection)["streams"]}
+        except ValueError as e:
+            raise ValueError(f"Could not apply projection to the output of '{command_string}': {e}") from e
+        stdout, stderr = projected.get("stdout", stdout), projected.get("stderr", stderr)
+
+    if stderr:
+        logging.warning(f"Stderr from host command '{command_string}': {stderr}")
+
+    result = {"stdout": stdout, "stderr": stderr}
+    if response_data.get("truncated"):
+        logging.warning(f"Output of host command '{command_string}' was truncated "
+                        f"({response_data.get('stdoutTotal', 'unknown')} bytes of stdout produced)")
+        result["truncated"] = True
+    return result
+
+
+def _post_command(relay_url, command_string, projection, timeout, priority):
+    """Sends one command to the relay. Returns (response_data, stdout, stderr)."""
+    session, base_url = _relay_client(relay_url)
+    try:
+        with tracing.span("relay.http", "relay-client"): # Until the response headers arrive
+            response = session.post(
+                f"{base_url}/execute",
+                json={"command": command_string, **({"projection": projection} if projection is not None else {})},
+                headers={"Accept": RELAY_ACCEPT, "X-Relay-Priority": priority, **_auth_headers(), **tracing.headers()},
+                stream=True,
+                timeout=timeout
             )
-            # We still return stdout/stderr as the original Node.js version did,
-            # but the caller in the new Python backend should check for an error indication.
-            # For simplicity, we'll let the relay's 500 status (if command failed) be caught by raise_for_status.
-            # If the relay returns 200 but with an error payload (as per host_command_relay.py logic for command failure),
-            # this part is less critical as the relay itself would have returned 500.
-            # However, the current host_command_relay.py returns 500 if command fails.
-
-        if stderr:
-            logging.warning(f"Stderr from host command '{command_string}': {stderr}")
-            
-        return {"stdout": stdout, "stderr": stderr}
+        busy = response.status_code == 503 and response.headers.get("Retry-After")
+        if busy:
+            response.close()
+        elif response.headers.get("Content-Type", "").startswith(relay_wire.MEDIA_TYPE):
+            with tracing.span("relay.read", "relay-client"):
+                response_data, stdout, stderr = _read_framed_response(response)
+        else: # JSON envelope, from a relay that predates the framed format
+            response.raise_for_status()  # Raise an HTTPError for bad responses (4XX or 5XX)
+            with tracing.span("relay.read", "relay-client"):
+                response_data = response.json()
+            stdout = response_data.get("stdout", "")
+            stderr = response_data.get("stderr", "")
 
     except requests.exceptions.HTTPError as http_err:
         logging.error(f"HTTP error occurred while calling relay for command '{command_string}': {http_err} - Response: {http_err.response.text}")
@@ -64,10 +335,158 @@ def exec_host_command(command_string):
         logging.error(f"Request error occurred while calling relay for command '{command_string}': {req_err}")
         raise ValueError(f"Failed to connect to relay: {req_err}") from req_err
     except ValueError as json_err: # Includes JSONDecodeError if response is not valid JSON
-        logging.error(f"Error decoding JSON response from relay for command '{command_string}': {json_err}")
-        raise ValueError(f"Invalid JSON response from relay: {json_err}") from json_err
+        logging.error(f"Error decoding response from relay for command '{command_string}': {json_err}")
+        raise ValueError(f"Invalid response from relay: {json_err}") from json_err
+
+    if busy: # The relay itself refused a read because it is saturated
+        _shed(RelayBusyError(f"Relay {relay_url} is saturated", float(busy) if busy.isdigit() else 1))
+    tracing.merge(response_data.pop("spans", None))
+    return response_data, stdout, stderr
+
+
+def check_relay(relay_url, timeout=5):
+    """
+    Calls a relay's /health endpoint.
+    Returns:
+        dict: The relay's health document.
+    Raises:
+        ValueError: If the relay cannot be reached or is unhealthy.
+    """
+    session, base_url = _relay_client(relay_url)
+    try:
+        response = session.get(f"{base_url}/health", timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        raise ValueError(f"Relay {relay_url} is not reachable: {e}") from e
+    except ValueError as e:
+        raise ValueError(f"Invalid health response from relay {relay_url}: {e}") from e
+
+
+def call_relay(method, path, relay_url=None, payload=None, timeout=10, priority=PRIORITY_READ):
+    """
+    Calls one of the relay's JSON endpoints other than /execute (e.g. /processes), through the same admission
+    control and tracing as host commands.
+    Args:
+        method (str): HTTP method.
+        path (str): Endpoint path, e.g. '/processes'.
+        relay_url (str, optional): Relay to use instead of HOST_RELAY_URL.
+        payload (dict, optional): JSON body.
+        timeout (float): Seconds to wait for the relay.
+        priority (str): PRIORITY_READ (sheddable) or PRIORITY_MUTATION.
+    Returns:
+        The decoded JSON response.
+    Raises:
+        RelayBusyError: If a read was shed because the relay is saturated (a ValueError).
+        ValueError: If the relay cannot be reached or answers with an error.
+    """
+    relay_url = relay_url or HOST_RELAY_URL
+    admission = _admission_for(relay_url)
+    try:
+        with tracing.span("relay.queue", "relay-client", priority=priority):
+            admission.acquire(priority)
+    except RelayBusyError as e:
+        _shed(e)
+    session, base_url = _relay_client(relay_url)
+    try:
+        with tracing.span("relay.call", "relay-client", path=path, relay=relay_url):
+            response = session.request(method, f"{base_url}{path}", json=payload, timeout=timeout,
+                                        headers={"X-Relay-Priority": priority, **_auth_headers(), **tracing.headers()})
+        if response.status_code == 503 and response.headers.get("Retry-After", "").isdigit():
+            _shed(RelayBusyError(f"Relay {relay_url} is saturated", float(response.headers["Retry-After"])))
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        if not response.ok:
+            detail = data.get("error") if isinstance(data, dict) else response.text[:200]
+            raise ValueError(f"Relay returned HTTP error: {response.status_code} - {detail}")
+        if data is None:
+            raise ValueError(f"Invalid response from relay for {method} {path}")
+        return data
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Request error occurred while calling relay {method} {path}: {e}")
+        raise ValueError(f"Failed to connect to relay: {e}") from e
+    finally:
+        admission.release(priority)
+
+
+def _read_framed_response(response):
+    """
+    Reads a relay_wire framed response chunk by chunk, keeping at most HOST_OUTPUT_MAX_BYTES per stream.
+    Returns:
+        tuple: (header dict, stdout str, stderr str). header['truncated'] is set if anything was dropped.
+    Raises:
+        ValueError: If the stream is malformed or incomplete.
+    """
+    header = None
+    buffers = {relay_wire.FRAME_STDOUT: bytearray(), relay_wire.FRAME_STDERR: bytearray()}
+    received = {relay_wire.FRAME_STDOUT: 0, relay_wire.FRAME_STDERR: 0}
+    decoder = relay_wire.FrameDecoder()
+    try:
+        for chunk in response.iter_content(relay_wire.CHUNK_SIZE): # Transparently gunzipped
+            for kind, payload in decoder.feed(chunk):
+                if kind == relay_wire.FRAME_HEADER:
+                    header = json.loads(payload)
+                    continue
+                buffer = buffers[kind]
+                room = HOST_OUTPUT_MAX_BYTES - len(buffer)
+                if room > 0:
+                    buffer += payload[:room]
+                received[kind] += len(payload)
+        decoder.close()
+    except requests.exceptions.RequestException:
+        response.close()
+        raise
+    if header is None:
+        raise ValueError("Relay response has no header frame")
+    if (received[relay_wire.FRAME_STDOUT], received[relay_wire.FRAME_STDERR]) != (header["stdoutBytes"], header["stderrBytes"]):
+        raise ValueError("Relay response ended before all output was received")
+    if any(received[kind] > len(buffers[kind]) for kind in buffers):
+        header["truncated"] = True
+
+    def decode(data):
+        return data.decode("utf-8", errors="replace").replace("\r\n", "\n").strip()
+
+    return header, decode(buffers[relay_wire.FRAME_STDOUT]), decode(buffers[relay_wire.FRAME_STDERR])
+
+
+def benchmark_relay(relay_urls, command="echo ok", iterations=500, concurrency=8):
+    """
+    Measures round-trip latency of exec_host_command against each relay URL (e.g. the TCP and unix socket
+    listeners of the same relay). Returns {url: {"p50", "p95", "throughput"}} with latencies in milliseconds.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    results = {}
+    for url in relay_urls:
+        def timed_call(_):
+            started = time.perf_counter()
+            exec_host_command(command, relay_url=url)
+            return time.perf_counter() - started
+
+        exec_host_command(command, relay_url=url) # Warm up the connection pool
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = sorted(executor.map(timed_call, range(iterations)))
+        elapsed = time.perf_counter() - started
+        results[url] = {
+            "p50": latencies[len(latencies) // 2] * 1000,
+            "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+            "throughput": iterations / elapsed,
+        }
+    return results
+
 
 if __name__ == '__main__':
+    import sys
+    if len(sys.argv) > 2 and sys.argv[1] == '--benchmark':
+        # python python_backend/host_caller.py --benchmark http://localhost:7655 unix:///tmp/tailbrain-relay.sock
+        logging.getLogger().setLevel(logging.WARNING) # Per-call INFO logs would dominate the measurement
+        for url, result in benchmark_relay(sys.argv[2:]).items():
+            print(f"{url:<45} p50 {result['p50']:7.2f}ms  p95 {result['p95']:7.2f}ms  {result['throughput']:8.1f} calls/s")
+        sys.exit(0)
+
     # Example usage (for testing this module directly)
     logging.info("Testing host_caller.py...")
     try:
@@ -0,0 +1,144 @@
+import os
+import json
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from host_caller import HOST_RELAY_URL
+
+# The machine whose relay is HOST_RELAY_URL. It is always registered and uses the module-level caches.
+LOCAL_HOST_NAME = os.environ.get('LOCAL_HOST_NAME', 'local')
+# How long a fan-out read waits for each host before reporting it as timed out. The host's call keeps
+# running in the background and warms its cache for the next read.
+HOST_FANOUT_TIMEOUT = float(os.environ.get('HOST_FANOUT_TIMEOUT', 5))
+HOST_FANOUT_WORKERS = int(os.environ.get('HOST_FANOUT_WORKERS', 16))
+
+_executor = ThreadPoolExecutor(max_workers=HOST_FANOUT_WORKERS, thread_name_prefix='host-fanout')
+
+
+class UnknownHostError(ValueError):
+    pass
+
+
+class HostRegistry:
+    """
+    Named relays TailBrain can read from: the local one (HOST_RELAY_URL), hosts from the TAILBRAIN_HOSTS
+    environment variable ('name=url,name=url') and hosts from a JSON file ({"name": "url"}), which is
+    re-read when it changes. Each remote host gets its own copies of the docker indexes and state caches.
+    A configured host may not take the local host's name: the local host's data comes from the module-level
+    caches, which always read HOST_RELAY_URL.
+    """
+
+    def __init__(self, hosts_file):
+        self.hosts_file = hosts_file
+        self._file_mtime = None
+        self._file_hosts = {}
+        self._env_hosts = self._parse_env(os.environ.get('TAILBRAIN_HOSTS', ''))
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _without_local(hosts, source):
+        if LOCAL_HOST_NAME in hosts:
+            logging.error(f"Ignoring host '{LOCAL_HOST_NAME}' from {source}: that name is the local host (HOST_RELAY_URL)")
+        return {name: url for name, url in hosts.items() if name != LOCAL_HOST_NAME}
+
+    @classmethod
+    def _parse_env(cls, value):
+        hosts = {}
+        for entry in value.split(','):
+            name, sep, url = entry.strip().partition('=')
+            if sep and name.strip() and url.strip():
+                hosts[name.strip()] = url.strip()
+        return cls._without_local(hosts, 'TAILBRAIN_HOSTS')
+
+    def _load_file(self):
+        try:
+            mtime = os.path.getmtime(self.hosts_file)
+        except OSError:
+            self._file_hosts, self._file_mtime = {}, None
+            return
+        if mtime == self._file_mtime:
+            return
+        try:
+            with open(self.hosts_file, 'r', encoding='utf-8') as f:
+                loaded = json.load(f)
+            if not isinstance(loaded, dict) or not all(isinstance(v, str) for v in loaded.values()):
+                raise ValueError("expected an object mapping host names to relay URLs")
+            self._file_hosts = self._without_local(loaded, self.hosts_file)
+            logging.info(f"Loaded {len(loaded)} hosts from {self.hosts_file}")
+        except (OSError, ValueError) as e:
+            logging.error(f"Ignoring invalid hosts file {self.hosts_file}: {e}")
+            self._file_hosts = {}
+        self._file_mtime = mtime
+
+    def hosts(self):
+        """Returns {name: relay_url}, the local host first."""
+        self._load_file()
+        return {LOCAL_HOST_NAME: HOST_RELAY_URL, **self._file_hosts, **self._env_hosts}
+
+    def resolve(self, selector):
+        """
+        Turns a 'host' query value ('all', or comma separated names) into a list of host names.
+        Raises:
+            UnknownHostError: If a name is not registered.
+        """
+        hosts = self.hosts()
+        if not selector or selector == 'all':
+            return list(hosts)
+        names = [name.strip() for name in selector.split(',') if name.strip()]
+        unknown = [name for name in names if name not in hosts]
+        if unknown:
+            raise UnknownHostError(f"Unknown host(s): {', '.join(unknown)}. Registered: {', '.join(hosts)}")
+        return names
+
+    def relay_url_for(self, selector):
+        """
+        Returns the relay URL of the one host a 'host' query value names (the local host when it is empty),
+        for actions that must reach a specific machine.
+        Raises:
+            UnknownHostError: If the name is not registered or does not name exactly one host.
+        """
+        names = self.resolve(selector or LOCAL_HOST_NAME)
+        if len(names) != 1:
+            raise UnknownHostError(f"Exactly one host is required, got '{selector}'")
+        return self.hosts()[names[0]]
+
+    def cache_for(self, host_name, local_cache):
+        """
+        Returns the host's instance of a cache (ResourceIndex or CachedCommand).
+        The local host uses local_cache itself; other hosts get a copy created on first use.
+        """
+        if host_name == LOCAL_HOST_NAME:
+            return local_cache
+        relay_url = self.hosts()[host_name]
+        key = (local_cache.name, host_name)
+        with self._lock:
+            cache = self._caches.get(key)
+            if cache is None or cache.relay_url != relay_url: # (Re)created when the host's URL changes
+                cache = self._caches[key] = local_cache.for_host(host_name, relay_url)
+            return cache
+
+    def fan_out(self, host_names, fetch, timeout=HOST_FANOUT_TIMEOUT):
+        """
+        Runs fetch(host_name) for every host concurrently, waiting at most `timeout` seconds overall.
+        Returns:
+            tuple: ({host: result} for hosts that answered, {host: error message} for the others).
+        """
+        # Each call runs in the caller's context, so its spans land in the request's trace.
+        futures = {_executor.submit(contextvars.copy_context().run, fetch, name): name for name in host_names}
+        done, _ = wait(futures, timeout=timeout)
+        results, errors = {}, {}
+        for future, name in futures.items():
+            if future not in done:
+                errors[name] = f"Timed out after {timeout:g}s"
+                continue
+            try:
+                results[name] = future.result()
+            except ValueError as e: # Relay unreachable, command failed, unparseable output
+                errors[name] = str(e)
+            except Exception as e:
+                logging.exception(f"Unexpected error reading from host '{name}':")
+                errors[name] = str(e)
+        return results, errors
@@ -0,0 +1,182 @@
+import os
+import sys
+import gzip
+import hashlib
+import logging
+import mimetypes
+from pathlib import Path
+from flask import request, send_from_directory
+
+try:
+    import brotli # Optional: enables 'br' responses and precompressed .br assets
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent as-is; compressing them costs more than it saves.
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE_STATIC_EXTENSIONS = ('.js', '.css', '.html', '.svg', '.json', '.map', '.txt', '.webmanifest', '.ico')
+# Vite content-hashes everything it writes under assets/, so those files never change under the same URL.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def _supported_encodings():
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def negotiate_encoding(available=None):
+    """
+    Picks the content coding for the current request from its Accept-Encoding header.
+    Args:
+        available (iterable): Codings that can be served (defaults to everything this process can produce).
+    Returns:
+        str or None: 'br', 'gzip' or None for identity.
+    """
+    available = _supported_encodings() if available is None else available
+    best, best_quality = None, 0
+    for encoding in ('br', 'gzip'): # Preference order when the client weighs them equally
+        if encoding not in available:
+            continue
+        quality = request.accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def content_etag(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _is_conditional_api_response(response):
+    return (
+        request.method in ('GET', 'HEAD')
+        and request.path.startswith('/api/')
+        and response.status_code == 200
+        and response.mimetype == 'application/json'
+        and not response.direct_passthrough
+        and not response.is_streamed
+        and 'Content-Encoding' not in response.headers
+    )
+
+
+def conditional_json_response(response):
+    """
+    after_request hook for the API read routes.
+    Tags JSON bodies with a content-hash ETag, answers a matching If-None-Match with 304 Not Modified,
+    and otherwise compresses the body with the best coding the client accepts.
+    """
+    if not _is_conditional_api_response(response):
+        return response
+
+    body = response.get_data()
+    etag = content_etag(body)
+    response.vary.add('Accept-Encoding')
+    # Pollers must revalidate every time, but a revalidation that hits costs only headers.
+    response.headers['Cache-Control'] = 'no-cache'
+
+    # Compressed representations get a suffixed ETag (as Apache does) so caches never mix them up,
+    # but any representation of the same content satisfies If-None-Match.
+    if request.if_none_match and any(
+        request.if_none_match.contains(candidate)
+        for candidate in (etag, f"{etag}-gzip", f"{etag}-br")
+    ):
+        response.set_etag(etag)
+        response.status_code = 304
+        response.set_data(b'')
+        response.headers.pop('Content-Length', None)
+        return response
+
+    encoding = negotiate_encoding() if len(body) >= COMPRESS_MIN_SIZE else None
+    if encoding:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        response.set_etag(f"{etag}-{encoding}")
+    else:
+        response.set_etag(etag)
+    return response
+
+
+def init_app(app):
+    app.after_request(conditional_json_response)
+
+
+def send_static_file(directory, filename, immutable=False):
+    """
+    send_from_directory() that prefers a precompressed sibling (filename.br / filename.gz) when the client accepts it.
+    Args:
+        directory (str or Path): Directory to serve from.
+        filename (str): Requested path relative to directory.
+        immutable (bool): Mark the response as cacheable forever (content-hashed build output).
+    """
+    directory = Path(directory)
+    available = [enc for enc, suffix in (('br', '.br'), ('gzip', '.gz'))
+                 if (directory / f"{filename}{suffix}").is_file()]
+    encoding = negotiate_encoding(available) if available else None
+
+    if encoding:
+        response = send_from_directory(directory, f"{filename}{'.br' if encoding == 'br' else '.gz'}")
+        response.headers['Content-Encoding'] = encoding
+        response.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    else:
+        response = send_from_directory(directory, filename)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else 'no-cache'
+    return response
+
+
+def _write_atomic(path, data):
+    # Never expose a half-written file to a server already reading the directory.
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def precompress_static(root):
+    """
+    Writes .gz (and .br, when brotli is installed) next to every compressible file under root.
+    Siblings that are already up to date are skipped; stale ones (older than their source) are rewritten,
+    or deleted when they can no longer be produced or would not be smaller, so old content is never served.
+    Run once per build (Dockerfile, `npm run build`), not by the server: workers would race on the same files.
+    Returns:
+        int: Number of compressed files written.
+    """
+    root = Path(root)
+    if not root.is_dir():
+        return 0
+    written = 0
+    for path in root.rglob('*'):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE_STATIC_EXTENSIONS:
+            continue
+        source_mtime = path.stat().st_mtime
+        data = None
+        for encoding, suffix in (('gzip', '.gz'), ('br', '.br')):
+            target = path.with_name(path.name + suffix)
+            if target.exists() and target.stat().st_mtime >= source_mtime:
+                continue
+            compressed = None
+            if encoding in _supported_encodings():
+                if data is None:
+                    data = path.read_bytes()
+                compressed = gzip.compress(data, compresslevel=9) if encoding == 'gzip' else brotli.compress(data, quality=11)
+            if compressed is None or len(compressed) >= len(data):
+                target.unlink(missing_ok=True) # Not worth serving; a stale sibling would be served instead of the source
+                continue
+            _write_atomic(target, compressed)
+            written += 1
+    return written
+
+
+if __name__ == '__main__':
+    # Used at build time: python python_backend/http_cache.py ./frontend/dist (Dockerfile, npm run build)
+    target_dir = sys.argv[1] if len(sys.argv) > 1 else str(Path(__file__).resolve().parent.parent / 'frontend' / 'dist')
+    count = precompress_static(target_dir)
+    logging.info(f"Precompressed {count} static files under {target_dir}")
@@ -0,0 +1,248 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from host_caller import PRIORITY_READ, PRIORITY_BACKGROUND
+import shared_state
+
+# Background pre-pull of the images used by the registered compose apps, so `up` does not wait on the registry.
+# Every PREPULL_INTERVAL seconds the leader lists the images each app pulls (`docker-compose config --format json`;
+# services with a build section are skipped, their image is built locally) and pulls them, at most
+# PREPULL_CONCURRENCY pulls at a time, starting each app PREPULL_STAGGER seconds after the previous one so a host
+# with many apps does not hit the registry (or its disk) all at once. The resulting image IDs and repo digests are
+# recorded in DATA_DIR/image-prepull.json, which every worker reads. When all of an app's images were pulled within
+# PREPULL_MAX_AGE seconds and their repo digests still match what the registry serves (checked in one relay call when
+# `up` runs), `up -d --pull=always` runs with --pull=missing instead.
+# Pulls are sent as background work: never shed, and not holding the relay slots interactive requests wait on.
+# Rounds run in the leader only, manual ones included (shared_state.request_leader_task), so two rounds never
+# rewrite the state file at the same time.
+PREPULL_INTERVAL = float(os.environ.get('PREPULL_INTERVAL', 3600)) # 0 disables the schedule
+PREPULL_CONCURRENCY = int(os.environ.get('PREPULL_CONCURRENCY', 2))
+PREPULL_STAGGER = float(os.environ.get('PREPULL_STAGGER', 10))
+PREPULL_MAX_AGE = float(os.environ.get('PREPULL_MAX_AGE', 2 * PREPULL_INTERVAL or 7200))
+PREPULL_TIMEOUT = float(os.environ.get('PREPULL_TIMEOUT', 900)) # Per image; large layers are slow
+PREPULL_CHECK_TIMEOUT = float(os.environ.get('PREPULL_CHECK_TIMEOUT', 30)) # Registry digest check of one app
+# What an image reference may look like before it is put on a command line.
+_IMAGE_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._/:@-]*$')
+LEADER_TASK = 'image-prepull'
+
+
+def compose_command(compose_path, arguments):
+    """
+    The shell command running `docker-compose <arguments>` for a compose file, from its directory, resolved the way
+    the up and down routes resolve it (so relative or symlinked paths run in the same directory).
+    """
+    compose_file = Path(compose_path)
+    return f"cd \"{compose_file.parent.resolve()}\" && docker-compose -f \"{compose_file.name}\" {arguments}"
+
+
+def parse_image_inspect(line):
+    """Parses '<image id> <RepoDigests JSON>' as printed by the pull command. Returns (image_id, digests)."""
+    image_id, _, digests = line.strip().partition(' ')
+    try:
+        return image_id or None, json.loads(digests) if digests else []
+    except json.JSONDecodeError:
+        return image_id or None, []
+
+
+class PrePuller:
+    """Runs pre-pull rounds and keeps their results, shared with the other workers through a JSON file."""
+
+    def __init__(self, state_path, apps_path, exec_command):
+        self.state_path = state_path
+        self.apps_path = apps_path
+        self.exec_command = exec_command
+        self._state = None
+        self._state_mtime = None
+        self._running = None
+        self._lock = threading.Lock()
+
+    def _registered_apps(self):
+        """Read from the file rather than app.py's list: the leader's copy is only reloaded on compose requests."""
+        try:
+            with open(self.apps_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not read compose apps for pre-pull: {e}")
+            return []
+
+    def state(self):
+        """
+        Returns:
+            dict: {'images': {ref: {imageId, digests, pulledAt, changed, error}}, 'apps': {app id: {images, built, checkedAt, error}},
+                   'startedAt', 'finishedAt'}, re-read when another worker wrote it.
+        """
+        try:
+            mtime = os.path.getmtime(self.state_path)
+        except OSError:
+            return self._state or {"images": {}, "apps": {}, "startedAt": None, "finishedAt": None}
+        if mtime != self._state_mtime:
+            try:
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    self._state = json.load(f)
+                self._state_mtime = mtime
+            except (OSError, ValueError) as e:
+                logging.error(f"Could not read pre-pull state {self.state_path}: {e}")
+        return self._state or {"images": {}, "apps": {}, "startedAt": None, "finishedAt": None}
+
+    def _save(self, state):
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp_path, self.state_path)
+            self._state, self._state_mtime = state, os.path.getmtime(self.state_path)
+        except OSError as e:
+            logging.error(f"Could not save pre-pull state {self.state_path}: {e}")
+
+    def images_for(self, app_item):
+        """
+        Lists the images an app pulls, from its resolved compose config. Services with a build section are left out:
+        their image is built on the host, so there is no registry version to pre-pull (or to wait for).
+        Returns:
+            tuple: (sorted image references, sorted names of the services that are built).
+        Raises:
+            ValueError: If compose cannot resolve the file.
+        """
+        result = self.exec_command(compose_command(app_item['path'], 'config --format json'), priority=PRIORITY_READ)
+        try:
+            services = json.loads(result['stdout']).get('services') or {}
+        except (ValueError, AttributeError) as e:
+            raise ValueError(f"Unexpected output from docker-compose config: {e}") from e
+        images = sorted({service['image'] for service in services.values() if service.get('image') and not service.get('build')})
+        built = sorted(name for name, service in services.items() if service.get('build'))
+        return images, built
+
+    def registry_digests(self, images):
+        """
+        Reads the manifest digest each image reference resolves to in its registry now, in one relay call.
+        Returns:
+            dict: {image reference: digest}.
+        Raises:
+            ValueError: If a registry cannot be queried (unreachable, unauthorized, or no buildx on the host).
+        """
+        command = ' && '.join(f"docker buildx imagetools inspect --format \"{{{{.Manifest.Digest}}}}\" {image}" for image in images)
+        digests = self.exec_command(command, priority=PRIORITY_READ, timeout=PREPULL_CHECK_TIMEOUT)['stdout'].split()
+        if len(digests) != len(images):
+            raise ValueError(f"Expected {len(images)} registry digests, got {len(digests)}")
+        return dict(zip(images, digests))
+
+    def pull(self, image, previous=None):
+        """Pulls one image and reads back its ID and repo digests. Returns the image's new state entry."""
+        started = time.time()
+        try:
+            result = self.exec_command(
+                f"docker pull -q {image} && docker image inspect --format \"{{{{.Id}}}} {{{{json .RepoDigests}}}}\" {image}",
+                priority=PRIORITY_BACKGROUND, timeout=PREPULL_TIMEOUT,
+            )
+        except ValueError as e:
+            logging.warning(f"Pre-pull of {image} failed: {e}")
+            return {**(previous or {}), "error": str(e), "attemptedAt": started}
+        lines = result['stdout'].strip().splitlines()
+        image_id, digests = parse_image_inspect(lines[-1] if lines else '')
+        changed = previous is not None and previous.get('imageId') not in (None, image_id)
+        logging.info(f"Pre-pulled {image} in {time.time() - started:.1f}s{' (new version)' if changed else ''}")
+        return {"imageId": image_id, "digests": digests, "pulledAt": time.time(), "changed": changed,
+                "error": None, "attemptedAt": started}
+
+    def run(self):
+        """One pre-pull round over every registered app. Returns the new state."""
+        apps = self._registered_apps()
+        previous = self.state()
+        state = {"images": dict(previous.get('images', {})), "apps": {}, "startedAt": time.time(), "finishedAt": None}
+        submitted = set()
+        logging.info(f"Pre-pulling images of {len(apps)} compose apps, {PREPULL_CONCURRENCY} at a time")
+        with ThreadPoolExecutor(max_workers=max(1, PREPULL_CONCURRENCY), thread_name_prefix='prepull') as executor:
+            futures = {}
+            for index, app_item in enumerate(apps):
+                if index and PREPULL_STAGGER:
+                    time.sleep(PREPULL_STAGGER)
+                try:
+                    images, built = self.images_for(app_item)
+                except ValueError as e:
+                    logging.warning(f"Could not list the images of compose app {app_item.get('name')}: {e}")
+                    state['apps'][app_item['id']] = {"images": [], "built": [], "checkedAt": time.time(), "error": str(e)}
+                    continue
+                state['apps'][app_item['id']] = {"images": images, "built": built, "checkedAt": time.time(), "error": None}
+                for image in images:
+                    if image in submitted: # Shared by several apps: pulled once per round
+                        continue
+                    submitted.add(image)
+                    if not _IMAGE_PATTERN.match(image):
+                        state['images'][image] = {"error": "Not a valid image reference", "attemptedAt": time.time()}
+                        continue
+                    futures[image] = executor.submit(self.pull, image, previous.get('images', {}).get(image))
+            for image, future in futures.items():
+                state['images'][image] = future.result()
+        # Forget images no app uses any more.
+        used = {image for entry in state['apps'].values() for image in entry['images']}
+        state['images'] = {image: entry for image, entry in state['images'].items() if image in used}
+        state['finishedAt'] = time.time()
+        self._save(state)
+        return state
+
+    def run_in_background(self):
+        """
+        Starts a round unless one is already running in this process.
+        Returns:
+            bool: Whether a round was started.
+        """
+        with self._lock:
+            if self._running is not None and self._running.is_alive():
+                return False
+
+            def run():
+                try:
+                    self.run()
+                except Exception as e: # Keep the thread's failure in the log rather than on stderr
+                    logging.exception(f"Pre-pull round failed: {e}")
+
+            self._running = threading.Thread(target=run, name='image-prepull', daemon=True)
+            self._running.start()
+            return True
+
+    def request_round(self):
+        """
+        Has the leader start a round (this worker runs it itself when there is no shared store).
+        Returns:
+            bool: False if this worker is already running a round.
+        """
+        if shared_state.request_leader_task(LEADER_TASK):
+            return True
+        return self.run_in_background()
+
+    def is_running(self):
+        return self._running is not None and self._running.is_alive()
+
+    def is_current(self, app_id, check_registry=True):
+        """
+        Whether every image of an app was pulled successfully within PREPULL_MAX_AGE seconds and, with check_registry,
+        is still the version its registry serves: a tag pushed again since the pull must be pulled by `up`.
+        Without check_registry only the local state is read (no relay call).
+        """
+        state = self.state()
+        app_state = state['apps'].get(app_id)
+        if not app_state or app_state.get('error') or not app_state['images']:
+            return False
+        now = time.time()
+        for image in app_state['images']:
+            entry = state['images'].get(image) or {}
+            if entry.get('error') or not entry.get('pulledAt') or now - entry['pulledAt'] > PREPULL_MAX_AGE:
+                return False
+        if not check_registry:
+            return True
+        try:
+            remote = self.registry_digests(app_state['images'])
+        except ValueError as e:
+            logging.warning(f"Could not check the registry digests of compose app {app_id}, pulling: {e}")
+            return False
+        for image, digest in remote.items():
+            if not any(local.endswith(f"@{digest}") for local in state['images'][image].get('digests') or []):
+                logging.info(f"{image} changed in its registry since it was pre-pulled ({digest})")
+                return False
+        return True
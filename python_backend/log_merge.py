@@ -0,0 +1,99 @@
+import re
+import heapq
+import itertools
+
+# Interleaving the logs of several containers into one stream ordered by time, for the merged log view.
+# Each container's log is fetched with `docker logs --timestamps`, filtered on the host (grep projection,
+# --since/--until), and split into its stdout and stderr lines. Every one of those is already in time order,
+# so a k-way merge (heapq.merge) produces the combined order lazily, holding only one line per source at a time,
+# instead of concatenating everything and sorting it. When only the most recent lines are wanted, the sources are
+# merged newest first and the merge stops after `limit` lines.
+
+# docker logs --timestamps prefixes each line with RFC3339 (nanosecond) UTC time followed by a space.
+_TIMESTAMP_PATTERN = re.compile(r'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d{1,9}))?(Z|[+-]\d\d:\d\d) ')
+# What --since/--until accept that we pass through: RFC3339 dates/times, Unix timestamps and durations ('10m', '1h30m').
+_TIME_BOUND_PATTERN = re.compile(r'^[0-9][0-9A-Za-z:.+-]{0,39}$')
+
+
+class InvalidTimeBoundError(ValueError):
+    pass
+
+
+def validate_time_bound(value):
+    """
+    Checks a since/until value before it is put on a docker command line.
+    Raises:
+        InvalidTimeBoundError: If the value is not a timestamp or duration docker would accept.
+    """
+    if not _TIME_BOUND_PATTERN.match(value):
+        raise InvalidTimeBoundError(f"Invalid time bound '{value}': use an RFC3339 time, a Unix timestamp or a duration like 10m")
+    return value
+
+
+def sort_key(timestamp, fraction, zone):
+    """A string that sorts like the instant it names, whatever the precision docker printed."""
+    return f"{timestamp}.{(fraction or '').ljust(9, '0')}{'' if zone == 'Z' else zone}"
+
+
+class _Entries:
+    """
+    The entries of one output stream, built as they are iterated, oldest first or (reversed()) newest first.
+    Lines without a timestamp (the continuation of a multi-line write) take the one of the line before them.
+    """
+
+    def __init__(self, text, container_id, name, stream):
+        self.lines = (text or '').splitlines()
+        self.source = {"container": container_id, "name": name, "stream": stream}
+
+    def _entry(self, timestamp, line):
+        return {"ts": timestamp, **self.source, "line": line}
+
+    def __iter__(self):
+        key, timestamp = '', None
+        for line in self.lines:
+            match = _TIMESTAMP_PATTERN.match(line)
+            if match:
+                key = sort_key(*match.groups())
+                timestamp = line[:match.end() - 1]
+                line = line[match.end():]
+            yield key, self._entry(timestamp, line)
+
+    def __reversed__(self):
+        continuations = [] # Seen (newest first) before the timestamped line they belong to
+        for line in reversed(self.lines):
+            match = _TIMESTAMP_PATTERN.match(line)
+            if not match:
+                continuations.append(line)
+                continue
+            key, timestamp = sort_key(*match.groups()), line[:match.end() - 1]
+            for continuation in continuations:
+                yield key, self._entry(timestamp, continuation)
+            continuations = []
+            yield key, self._entry(timestamp, line[match.end():])
+        for continuation in continuations: # Before the first timestamp
+            yield '', self._entry(None, continuation)
+
+
+def split_lines(text, container_id, name, stream):
+    """
+    Turns one output stream of `docker logs --timestamps` into time-ordered entries.
+    Returns:
+        iterable: (sort key, entry dict with ts, container, name, stream, line) tuples, also iterable newest first.
+    """
+    return _Entries(text, container_id, name, stream)
+
+
+def merge(sources, limit=None):
+    """
+    Merges time-ordered entry sources (as returned by split_lines) into one stream.
+    With a limit, only the `limit` most recent entries overall are read (the sources are merged newest first),
+    still yielded oldest first.
+    """
+    if limit is None:
+        for _, entry in heapq.merge(*sources, key=lambda item: item[0]):
+            yield entry
+        return
+    # Sources in reverse order, so equal timestamps keep the order the forward merge gives them.
+    newest = heapq.merge(*(reversed(source) for source in reversed(sources)), key=lambda item: item[0], reverse=True)
+    for _, entry in reversed(list(itertools.islice(newest, limit))):
+        yield entry
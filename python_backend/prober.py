@@ -0,0 +1,301 @@
+import os
+import re
+import ssl
+import time
+import json
+import bisect
+import asyncio
+import logging
+import threading
+import collections
+from urllib.parse import urlsplit
+
+from host_caller import HOST_RELAY_URL, PRIORITY_READ
+import shared_state
+
+# Reachability and latency of what TailBrain exposes. Every PROBE_INTERVAL seconds the leader probes, concurrently
+# (at most PROBE_CONCURRENCY at once, on one asyncio loop), every serve/funnel endpoint and its local backend, plus
+# the peers selected in DATA_DIR/probe-peers.json (or PROBE_PEERS):
+#   http  URLs: a HEAD request, timed to the status line; 5xx counts as down
+#   tcp   host:port targets (TCP forwards): a TCP connect
+#   ping  peers: `tailscale ping` through the relay, which reports the direct or DERP round trip
+# The backend usually runs in a container, so targets on the host's loopback are probed at the relay's address.
+# The last PROBE_HISTORY results per target give its availability and latency histogram; the leader publishes
+# the summary to the other workers ('probes' in shared_state), so reads are answered from memory. Only the leader
+# probes: a round in another worker would start from an empty history and publish over the leader's. Other workers
+# ask the leader for a round (shared_state.request_leader_task) when a refresh is requested.
+PROBE_INTERVAL = float(os.environ.get('PROBE_INTERVAL', 30)) # 0 disables background probing
+PROBE_CONCURRENCY = int(os.environ.get('PROBE_CONCURRENCY', 16))
+PROBE_TIMEOUT = float(os.environ.get('PROBE_TIMEOUT', 5))
+PROBE_HISTORY = int(os.environ.get('PROBE_HISTORY', 120))
+PROBE_PEERS = [peer.strip() for peer in os.environ.get('PROBE_PEERS', '').split(',') if peer.strip()]
+# How long a refresh waits for the leader's round before answering with the last summary.
+PROBE_REFRESH_WAIT = float(os.environ.get('PROBE_REFRESH_WAIT', 2 * PROBE_TIMEOUT + 10))
+LEADER_TASK = 'tailscale-probes'
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+_LOOPBACK_HOSTS = {'localhost', '127.0.0.1', '::1', '0.0.0.0'}
+_URL_PATTERN = re.compile(r'https?://[^\s()]+')
+_HOST_PORT_PATTERN = re.compile(r'^(?:[A-Za-z0-9.-]+|\[[0-9a-fA-F:]+\]):\d{1,5}$')
+_PEER_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9.:-]*$')
+_PING_LATENCY = re.compile(r'\bin ([\d.]+)\s*ms\b')
+_PING_PATH = re.compile(r'\bvia (\S+)')
+
+
+def _target(kind, address, source):
+    return {"id": f"{kind}:{address}", "kind": kind, "address": address, "source": source}
+
+
+def targets_from_serve(entries):
+    """Every URL and host:port mentioned in the parsed `tailscale serve status` lines (the exposed URL and its backend)."""
+    targets = []
+    for entry in entries or []:
+        line = entry.get('rawLine', '')
+        targets += [_target('http', url.rstrip('/'), 'serve') for url in _URL_PATTERN.findall(line)]
+        targets += [_target('tcp', token, 'serve') for token in line.split() if _HOST_PORT_PATTERN.match(token)]
+    return targets
+
+
+def targets_from_funnel(config):
+    """The endpoints of a `tailscale funnel status --json` (serve config): web hosts, their proxies, and TCP forwards."""
+    targets = []
+    for host_port, web in ((config or {}).get('Web') or {}).items():
+        targets.append(_target('http', f"https://{host_port}", 'funnel'))
+        for handler in ((web or {}).get('Handlers') or {}).values():
+            if (handler or {}).get('Proxy'):
+                proxy = handler['Proxy']
+                targets.append(_target('http', proxy if '://' in proxy else f"http://{proxy}", 'funnel'))
+    for _, tcp in ((config or {}).get('TCP') or {}).items():
+        if (tcp or {}).get('TCPForward'):
+            targets.append(_target('tcp', tcp['TCPForward'], 'funnel'))
+    return targets
+
+
+def targets_from_peers(peers):
+    return [_target('ping', peer, 'peer') for peer in peers if _PEER_PATTERN.match(peer)]
+
+
+def _reachable(host):
+    """The host's loopback as seen from the backend: the relay's address."""
+    return (urlsplit(HOST_RELAY_URL).hostname or host) if host in _LOOPBACK_HOSTS else host
+
+
+def _split_host_port(address):
+    host, _, port = address.rpartition(':')
+    return host.strip('[]'), int(port)
+
+
+async def probe_http(url, timeout=PROBE_TIMEOUT):
+    """HEAD request over a raw connection (no HTTP client dependency). Returns (ok, latency_ms, detail)."""
+    parts = urlsplit(url)
+    secure = parts.scheme == 'https'
+    context = None
+    if secure:
+        # Reachability, not trust: local backends commonly serve self-signed certificates.
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    host = _reachable(parts.hostname or '')
+    started = time.perf_counter()
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(host, parts.port or (443 if secure else 80), ssl=context,
+                                server_hostname=parts.hostname if secure else None),
+        timeout)
+    try:
+        writer.write(f"HEAD {parts.path or '/'} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: close\r\n"
+                     f"User-Agent: tailbrain-prober\r\n\r\n".encode('ascii'))
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+    finally:
+        writer.close()
+    latency = (time.perf_counter() - started) * 1000
+    fields = status_line.decode('latin-1').split()
+    status = int(fields[1]) if len(fields) > 1 and fields[1].isdigit() else None
+    if status is None:
+        return False, latency, "no HTTP status line"
+    return status < 500, latency, f"HTTP {status}"
+
+
+async def probe_tcp(address, timeout=PROBE_TIMEOUT):
+    host, port = _split_host_port(address)
+    started = time.perf_counter()
+    _, writer = await asyncio.wait_for(asyncio.open_connection(_reachable(host), port), timeout)
+    latency = (time.perf_counter() - started) * 1000
+    writer.close()
+    return True, latency, "connected"
+
+
+def parse_ping(stdout):
+    """Parses `tailscale ping` output ('pong from box (100.x.y.z) via 1.2.3.4:41641 in 12ms'). Returns (ok, latency_ms, detail)."""
+    latency = _PING_LATENCY.search(stdout or '')
+    if not latency:
+        return False, None, (stdout or '').strip().splitlines()[-1] if (stdout or '').strip() else "no pong"
+    path = _PING_PATH.search(stdout)
+    return True, float(latency.group(1)), f"via {path.group(1)}" if path else "pong"
+
+
+class TargetStats:
+    """The recent results of one target."""
+
+    def __init__(self, target):
+        self.target = target
+        self.results = collections.deque(maxlen=PROBE_HISTORY) # (checked_at, ok, latency_ms)
+        self.last_detail = None
+
+    def add(self, checked_at, ok, latency, detail):
+        self.results.append((checked_at, ok, latency))
+        self.last_detail = detail
+
+    def summary(self):
+        latencies = sorted(latency for _, ok, latency in self.results if ok and latency is not None)
+        counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for latency in latencies:
+            counts[bisect.bisect_left(LATENCY_BUCKETS_MS, latency)] += 1
+        successes = sum(1 for _, ok, _ in self.results if ok)
+        checked_at, ok, latency = self.results[-1] if self.results else (None, None, None)
+
+        def percentile(fraction):
+            return round(latencies[min(len(latencies) - 1, int(fraction * len(latencies)))], 1) if latencies else None
+
+        return {
+            **self.target,
+            "up": ok,
+            "lastCheckedAt": checked_at,
+            "lastLatencyMs": round(latency, 1) if latency is not None else None,
+            "lastDetail": self.last_detail,
+            "attempts": len(self.results),
+            "availability": round(successes / len(self.results), 4) if self.results else None,
+            "p50Ms": percentile(0.5),
+            "p95Ms": percentile(0.95),
+            "histogram": {"bucketsMs": list(LATENCY_BUCKETS_MS), "counts": counts},
+        }
+
+
+class Prober:
+    """Runs probing rounds (leader) and serves their summary (every worker)."""
+
+    def __init__(self, list_targets, exec_command, peers_path):
+        self.list_targets = list_targets # () -> serve/funnel targets
+        self.exec_command = exec_command
+        self.peers_path = peers_path
+        self._stats = {}
+        self._summary = None # Used directly when there is no shared store
+        self._running = None
+        self._lock = threading.Lock()
+
+    def peers(self):
+        """The peers to ping: DATA_DIR/probe-peers.json when it exists, PROBE_PEERS otherwise."""
+        try:
+            with open(self.peers_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return list(PROBE_PEERS)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not read probe peers from {self.peers_path}: {e}")
+            return list(PROBE_PEERS)
+
+    def set_peers(self, peers):
+        """
+        Raises:
+            ValueError: If a peer is not a hostname or IP address.
+        """
+        invalid = [peer for peer in peers if not isinstance(peer, str) or not _PEER_PATTERN.match(peer)]
+        if invalid:
+            raise ValueError(f"Invalid peer names: {', '.join(map(str, invalid))}")
+        tmp_path = f"{self.peers_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(peers, f)
+        os.replace(tmp_path, self.peers_path)
+
+    def _ping(self, peer):
+        result = self.exec_command(f"tailscale ping -c 1 --timeout={int(PROBE_TIMEOUT)}s {peer}",
+                                   priority=PRIORITY_READ, timeout=PROBE_TIMEOUT + 5)
+        return parse_ping(result['stdout'])
+
+    async def _probe(self, target, semaphore):
+        async with semaphore:
+            try:
+                if target['kind'] == 'http':
+                    return await probe_http(target['address'])
+                if target['kind'] == 'tcp':
+                    return await probe_tcp(target['address'])
+                return await asyncio.to_thread(self._ping, target['address'])
+            except asyncio.TimeoutError:
+                return False, None, f"timed out after {PROBE_TIMEOUT:g}s"
+            except (OSError, ValueError) as e: # Refused, unresolvable, TLS failure; relay errors for pings
+                return False, None, str(e) or e.__class__.__name__
+
+    async def _round(self, targets):
+        semaphore = asyncio.Semaphore(max(1, PROBE_CONCURRENCY))
+        return await asyncio.gather(*(self._probe(target, semaphore) for target in targets))
+
+    def run(self):
+        """One probing round over the current targets. Returns the published summary."""
+        targets = {target['id']: target for target in self.list_targets() + targets_from_peers(self.peers())}
+        started = time.time()
+        results = asyncio.run(self._round(list(targets.values()))) if targets else []
+        with self._lock:
+            for target_id in list(self._stats):
+                if target_id not in targets: # Serve/funnel entry removed, peer deselected
+                    del self._stats[target_id]
+            for target, (ok, latency, detail) in zip(targets.values(), results):
+                stats = self._stats.setdefault(target['id'], TargetStats(target))
+                stats.target = target
+                stats.add(started, ok, latency, detail)
+            summary = {"checkedAt": started, "durationMs": round((time.time() - started) * 1000, 1),
+                       "targets": [stats.summary() for stats in self._stats.values()]}
+        self._summary = summary
+        if shared_state.store is not None:
+            shared_state.store.publish('probes', summary, started)
+        logging.debug(f"Probed {len(targets)} targets in {summary['durationMs']}ms")
+        return summary
+
+    def run_in_background(self):
+        """Starts a round unless one is still running. Returns whether one was started."""
+        if self._running is not None and self._running.is_alive():
+            return False
+
+        def run():
+            try:
+                self.run()
+            except Exception as e:
+                logging.exception(f"Probing round failed: {e}")
+
+        self._running = threading.Thread(target=run, name='prober', daemon=True)
+        self._running.start()
+        return True
+
+    def request_round(self):
+        """
+        Has the leader start a round (this worker runs it itself when there is no shared store).
+        Returns:
+            bool: False if this worker is already running a round.
+        """
+        if shared_state.request_leader_task(LEADER_TASK):
+            return True
+        return self.run_in_background()
+
+    def refresh(self, timeout=PROBE_REFRESH_WAIT):
+        """
+        Probes now and returns the new summary: the leader's next published round, waited for at most `timeout`
+        seconds (after which the last summary is returned), or a round run here when there is no shared store.
+        """
+        if shared_state.store is None:
+            return self.run()
+        previous = self.summary()
+        shared_state.request_leader_task(LEADER_TASK)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.2)
+            summary = self.summary()
+            if summary is not None and (previous is None or summary['checkedAt'] != previous['checkedAt']):
+                return summary
+        logging.warning(f"No probing round published within {timeout:g}s of the refresh request")
+        return self.summary()
+
+    def summary(self):
+        """The last round's {checkedAt, durationMs, targets}, or None before the first one."""
+        if shared_state.store is not None:
+            payload, _ = shared_state.store.load('probes')
+            return payload
+        return self._summary
@@ -0,0 +1,198 @@
+import os
+import re
+import sys
+import hmac
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import collections
+from flask import g, jsonify, request, send_from_directory
+
+# Opt-in profiling of a live process, for app.py and host_command_relay.py. Disabled unless PROFILING_TOKEN is set;
+# every use must then send it in the X-Profiling-Token header.
+#   POST <prefix>/sample?seconds=10      samples every thread's stack for a while (in the background) and writes
+#                                        a collapsed-stack file (flamegraph.pl, speedscope, https://ui.perfetto.dev).
+#   any request with X-Profile: true     (or ?profile=true) is run under cProfile and written as a .pstats file,
+#                                        named in the X-Profile-File response header.
+#   GET <prefix>, GET <prefix>/<name>    list / download the files.
+# Profiles cover the process that answered: with several gunicorn workers, each one profiles itself.
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', 60))
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+_PROFILE_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+\.(collapsed|pstats)$')
+
+
+def _authorized():
+    provided = request.headers.get('X-Profiling-Token', '')
+    return bool(PROFILING_TOKEN) and hmac.compare_digest(provided.encode('utf-8'), PROFILING_TOKEN.encode('utf-8'))
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds, interval=PROFILE_SAMPLE_INTERVAL):
+    """
+    Samples the stacks of every other thread of this process for `seconds`.
+    Returns:
+        collections.Counter: {'thread;outermost frame;...;innermost frame': samples}.
+    """
+    own = threading.get_ident()
+    counts = collections.Counter()
+    thread_names, names_at = {}, 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if time.monotonic() - names_at > 1: # Threads come and go (request threads, fan-out pools)
+            thread_names, names_at = {thread.ident: thread.name for thread in threading.enumerate()}, time.monotonic()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(thread_names.get(ident, f"thread-{ident}"))
+            counts[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
+
+class Profiler:
+    """The profiling surface of one Flask app: a background stack sampler and per-request cProfile capture."""
+
+    def __init__(self, directory, process_name):
+        self.directory = directory
+        self.process_name = process_name
+        self._sampling = None
+        self._lock = threading.Lock()
+
+    def _new_path(self, kind, suffix):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{self.process_name}-{kind}-{os.getpid()}-{int(time.time() * 1000)}.{suffix}")
+
+    def _prune(self):
+        entries = [entry for entry in os.scandir(self.directory) if _PROFILE_NAME_PATTERN.match(entry.name)]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:max(0, len(entries) - PROFILE_KEEP)]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass # Pruned by another worker
+
+    def start_sampling(self, seconds, interval=PROFILE_SAMPLE_INTERVAL):
+        """
+        Starts a background sampling run. Returns the name of the file it will write.
+        Raises:
+            RuntimeError: If a sampling run is already in progress in this process.
+        """
+        with self._lock:
+            if self._sampling is not None and self._sampling.is_alive():
+                raise RuntimeError("A sampling profile is already running in this process")
+            path = self._new_path('sample', 'collapsed')
+            self._sampling = threading.Thread(target=self._sample_to_file, args=(path, seconds, interval),
+                                              name='profile-sampler', daemon=True)
+            self._sampling.start()
+        return os.path.basename(path)
+
+    def _sample_to_file(self, path, seconds, interval):
+        logging.info(f"Sampling stacks of process {os.getpid()} for {seconds:g}s into {path}")
+        counts = sample_stacks(seconds, interval)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for stack, count in counts.most_common():
+                    f.write(f"{stack} {count}\n")
+            os.replace(tmp_path, path)
+            self._prune()
+        except OSError as e:
+            logging.error(f"Could not write sampling profile {path}: {e}")
+            return
+        logging.info(f"Wrote sampling profile {path} ({sum(counts.values())} samples, {len(counts)} distinct stacks)")
+
+    def _start_request_profile(self):
+        if not PROFILING_TOKEN:
+            return None
+        if request.headers.get('X-Profile', '').lower() != 'true' and request.args.get('profile', '').lower() != 'true':
+            return None
+        if not _authorized():
+            return jsonify({"error": "Profiling requires a valid X-Profiling-Token"}), 403
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e: # Python 3.12+: one profiler at a time per process
+            logging.warning(f"Not profiling {request.method} {request.path}: {e}")
+            return None
+        g.request_profile = profile
+        return None
+
+    def _finish_request_profile(self, response):
+        profile = g.pop('request_profile', None)
+        if profile is None:
+            return response
+        profile.disable()
+        path = self._new_path('request', 'pstats')
+        try:
+            stats = pstats.Stats(profile)
+            stats.dump_stats(path)
+            self._prune()
+        except OSError as e:
+            logging.error(f"Could not write request profile {path}: {e}")
+            return response
+        logging.info(f"Profiled {request.method} {request.path} into {path}")
+        response.headers['X-Profile-File'] = os.path.basename(path)
+        return response
+
+    def init_app(self, app, url_prefix):
+        app.before_request(self._start_request_profile)
+        app.after_request(self._finish_request_profile)
+
+        def require_token():
+            if not PROFILING_TOKEN:
+                return jsonify({"error": "Profiling is disabled (set PROFILING_TOKEN)"}), 404
+            if not _authorized():
+                return jsonify({"error": "Profiling requires a valid X-Profiling-Token"}), 403
+            return None
+
+        @app.route(f"{url_prefix}/sample", methods=['POST'], endpoint=f"{self.process_name}_profile_sample")
+        def start_sampling_route():
+            denied = require_token()
+            if denied:
+                return denied
+            try:
+                seconds = float(request.args.get('seconds', 10))
+                interval = float(request.args.get('interval', PROFILE_SAMPLE_INTERVAL))
+            except ValueError:
+                return jsonify({"error": "seconds and interval must be numbers"}), 400
+            if not 0 < seconds <= PROFILE_MAX_SECONDS or not 0.001 <= interval <= 1:
+                return jsonify({"error": f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}] and interval in [0.001, 1]"}), 400
+            try:
+                name = self.start_sampling(seconds, interval)
+            except RuntimeError as e:
+                return jsonify({"error": str(e)}), 409
+            return jsonify({"file": name, "seconds": seconds, "pid": os.getpid()}), 202
+
+        @app.route(url_prefix, methods=['GET'], endpoint=f"{self.process_name}_profile_list")
+        def list_profiles_route():
+            denied = require_token()
+            if denied:
+                return denied
+            try:
+                entries = [entry for entry in os.scandir(self.directory) if _PROFILE_NAME_PATTERN.match(entry.name)]
+            except FileNotFoundError:
+                entries = []
+            entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+            return jsonify([{"name": entry.name, "size": entry.stat().st_size, "modifiedAt": entry.stat().st_mtime}
+                            for entry in entries]), 200
+
+        @app.route(f"{url_prefix}/<name>", methods=['GET'], endpoint=f"{self.process_name}_profile_download")
+        def download_profile_route(name):
+            denied = require_token()
+            if denied:
+                return denied
+            if not _PROFILE_NAME_PATTERN.match(name):
+                return jsonify({"error": f"Invalid profile name '{name}'"}), 400
+            return send_from_directory(self.directory, name, as_attachment=True)
@@ -0,0 +1,130 @@
+import re
+import json
+import itertools
+import collections
+
+# Declarative projections the relay applies to a command's output before sending it back, so the backend
+# receives (and parses) only what it needs. Shared by host_command_relay.py, which applies them, and
+# host_caller.py, which applies them itself when talking to a relay that does not support them yet.
+#
+# A projection is a dict; every key is optional and they are applied in this order:
+#   json       Path selecting part of a JSON document: dot-separated keys, list indexes, '*' for every
+#              element of a list/object, '{a,b}' to keep only some keys. '' selects the whole document.
+#   jsonLines  Treat the output as one JSON document per line (docker --format "{{json .}}").
+#   grep       Regex; keep matching lines (ignoreCase, invert modify it).
+#   head/tail  Keep the first/last N lines.
+#   streams    Which outputs to project: ["stdout"] (default), or ["stdout", "stderr"].
+# Example: {"json": "*.{NetworkID,IPAddress}"} on `docker inspect --format "{{json .NetworkSettings.Networks}}"`.
+_KNOWN_KEYS = {'json', 'jsonLines', 'grep', 'ignoreCase', 'invert', 'head', 'tail', 'streams'}
+_STREAMS = ('stdout', 'stderr')
+
+
+class InvalidProjectionError(ValueError):
+    pass
+
+
+def parse_path(path):
+    """Parses a projection path into segments: ('key', name), ('each', None) or ('fields', [names])."""
+    segments = []
+    for part in path.split('.') if path else []:
+        if part == '*':
+            segments.append(('each', None))
+        elif part.startswith('{') and part.endswith('}'):
+            fields = [field.strip() for field in part[1:-1].split(',') if field.strip()]
+            if not fields:
+                raise InvalidProjectionError(f"Empty field list in path '{path}'")
+            segments.append(('fields', fields))
+        elif part:
+            segments.append(('key', part))
+        else:
+            raise InvalidProjectionError(f"Empty segment in path '{path}'")
+    return segments
+
+
+def select(value, segments):
+    """Applies parsed path segments to a JSON value. Missing keys select None rather than failing."""
+    if not segments:
+        return value
+    (kind, arg), rest = segments[0], segments[1:]
+    if kind == 'each':
+        if isinstance(value, dict):
+            return {key: select(item, rest) for key, item in value.items()}
+        if isinstance(value, list):
+            return [select(item, rest) for item in value]
+        return None
+    if kind == 'fields':
+        if isinstance(value, dict):
+            return {key: select(value[key], rest) for key in arg if key in value}
+        return None
+    if isinstance(value, list):
+        try:
+            return select(value[int(arg)], rest)
+        except (ValueError, IndexError):
+            return None
+    if isinstance(value, dict):
+        return select(value.get(arg), rest)
+    return None
+
+
+def validate(spec):
+    """
+    Checks a projection and returns it with its regex and path compiled.
+    Raises:
+        InvalidProjectionError: If the projection is malformed.
+    """
+    if not isinstance(spec, dict):
+        raise InvalidProjectionError("Projection must be an object")
+    unknown = set(spec) - _KNOWN_KEYS
+    if unknown:
+        raise InvalidProjectionError(f"Unknown projection keys: {', '.join(sorted(unknown))}")
+    compiled = dict(spec)
+    if 'json' in spec:
+        if not isinstance(spec['json'], str):
+            raise InvalidProjectionError("'json' must be a path string")
+        compiled['json'] = parse_path(spec['json'])
+    if 'grep' in spec:
+        try:
+            compiled['grep'] = re.compile(spec['grep'], re.IGNORECASE if spec.get('ignoreCase') else 0)
+        except (re.error, TypeError) as e:
+            raise InvalidProjectionError(f"Invalid grep pattern: {e}")
+    for key in ('head', 'tail'):
+        if key in spec and (not isinstance(spec[key], int) or isinstance(spec[key], bool) or spec[key] < 0):
+            raise InvalidProjectionError(f"'{key}' must be a non-negative integer")
+    streams = spec.get('streams', ['stdout'])
+    if not isinstance(streams, list) or not set(streams) <= set(_STREAMS):
+        raise InvalidProjectionError("'streams' must be a list of 'stdout' / 'stderr'")
+    compiled['streams'] = streams
+    return compiled
+
+
+def apply(lines, spec):
+    """
+    Projects output given as an iterable of text lines (a file object works), yielding chunks of text.
+    Args:
+        lines (iterable): The command's output, line by line.
+        spec (dict): A projection, as accepted by validate().
+    Raises:
+        InvalidProjectionError: If the projection is malformed.
+        ValueError: If a JSON projection is applied to output that is not JSON.
+    """
+    spec = validate(spec)
+    lines = iter(lines)
+    if 'json' in spec:
+        if spec.get('jsonLines'):
+            lines = (json.dumps(select(json.loads(line), spec['json']), separators=(',', ':')) + '\n'
+                     for line in lines if line.strip())
+        else:
+            yield json.dumps(select(json.loads(''.join(lines)), spec['json']), separators=(',', ':'))
+            return
+    if 'grep' in spec:
+        pattern, invert = spec['grep'], bool(spec.get('invert'))
+        lines = (line for line in lines if bool(pattern.search(line)) != invert)
+    if 'head' in spec:
+        lines = itertools.islice(lines, spec['head'])
+    if 'tail' in spec:
+        lines = collections.deque(lines, maxlen=spec['tail'])
+    yield from lines
+
+
+def apply_text(text, spec):
+    return ''.join(apply(text.splitlines(keepends=True), spec))
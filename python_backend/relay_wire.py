@@ -0,0 +1,62 @@
+import json
+import struct
+
+# Framed binary envelope for /execute responses, used when the caller's Accept header asks for it.
+# Raw stdout/stderr bytes travel in frames, so large outputs are neither embedded in a JSON string
+# nor parsed as one document, and can be produced and consumed chunk by chunk.
+# Shared by host_command_relay.py (encoder) and host_caller.py (decoder).
+MEDIA_TYPE = 'application/vnd.tailbrain.relay-frames'
+
+FRAME_HEADER = b'H' # JSON: code, error, stdoutBytes/stderrBytes (sent), stdoutTotal/stderrTotal (produced), truncated,
+                    # projected, spans (trace events, when the request carried a trace ID)
+FRAME_STDOUT = b'O'
+FRAME_STDERR = b'E'
+_FRAME_PREFIX = struct.Struct('>cI') # frame type, payload length
+CHUNK_SIZE = 256 * 1024
+
+
+def encode_frame(kind, payload):
+    return _FRAME_PREFIX.pack(kind, len(payload)) + payload
+
+
+def iter_stream_frames(kind, stream, chunk_size=CHUNK_SIZE):
+    """Yields frames carrying the content of a binary file object, read from its start."""
+    stream.seek(0)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield encode_frame(kind, chunk)
+
+
+def encode_header(header):
+    return encode_frame(FRAME_HEADER, json.dumps(header, separators=(',', ':')).encode('utf-8'))
+
+
+class FrameDecoder:
+    """
+    Incremental decoder: feed() it bytes as they arrive and it yields complete (kind, payload) frames.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+        offset = 0
+        while len(self._buffer) - offset >= _FRAME_PREFIX.size:
+            kind, length = _FRAME_PREFIX.unpack_from(self._buffer, offset)
+            end = offset + _FRAME_PREFIX.size + length
+            if len(self._buffer) < end:
+                break
+            yield kind, bytes(self._buffer[offset + _FRAME_PREFIX.size:end])
+            offset = end
+        del self._buffer[:offset]
+
+    def close(self):
+        """
+        Raises:
+            ValueError: If the stream ended in the middle of a frame.
+        """
+        if self._buffer:
+            raise ValueError(f"Relay response ended inside a frame ({len(self._buffer)} bytes left over)")
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError: # Windows: no flock, and the dev server runs a single process that is its own leader
+    fcntl = None
+
+# Gunicorn runs several workers. They share cached state through small JSON files (on tmpfs when available,
+# so reads come from the page cache) and elect one leader, via an flock, to run the background pollers.
+BACKGROUND_REFRESH_INTERVAL = float(os.environ.get('BACKGROUND_REFRESH_INTERVAL', 4))
+# The leader stops polling the host when no worker has served a read for this long.
+BACKGROUND_IDLE_TIMEOUT = float(os.environ.get('BACKGROUND_IDLE_TIMEOUT', 120))
+LEADER_RETRY_INTERVAL = 5
+ACTIVITY_WRITE_INTERVAL = 1
+
+store = None
+election = None
+_leader_tasks = []
+_background_thread = None
+
+
+class SharedStore:
+    """
+    A directory of JSON documents shared by all worker processes.
+    Each document is replaced atomically; its mtime is its 'refreshed at' time, so marking a document stale
+    (invalidate) is a utime() call that every worker notices without re-parsing the content.
+    Parsed documents are cached per file identity (inode, size and mtime), so unchanged documents are never
+    parsed twice; the inode alone is not enough, a replaced file may be given the inode of the one it replaced.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._parsed = {}
+        self._last_activity_write = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def publish(self, key, payload, refreshed_at=None):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, separators=(',', ':'))
+        if refreshed_at is not None:
+            os.utime(tmp_path, (refreshed_at, refreshed_at))
+        os.replace(tmp_path, path)
+
+    def load(self, key):
+        """
+        Returns (payload, refreshed_at) for a published document, or (None, 0) if there is none.
+        """
+        path = self._path(key)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None, 0
+        identity = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        cached = self._parsed.get(key)
+        if cached is None or cached[0] != identity:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    payload = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Could not read shared state '{key}': {e}")
+                return None, 0
+            cached = (identity, payload)
+            self._parsed[key] = cached
+        return cached[1], st.st_mtime
+
+    def invalidate(self, key):
+        try:
+            os.utime(self._path(key), (0, 0))
+        except FileNotFoundError:
+            pass
+
+    def record_activity(self):
+        now = time.time()
+        if now - self._last_activity_write < ACTIVITY_WRITE_INTERVAL:
+            return
+        self._last_activity_write = now
+        path = os.path.join(self.directory, 'activity')
+        try:
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            open(path, 'a').close()
+
+    def last_activity(self):
+        try:
+            return os.stat(os.path.join(self.directory, 'activity')).st_mtime
+        except FileNotFoundError:
+            return 0
+
+    def request(self, name):
+        """Records that a worker asked for a run of the leader task `name` (the request file's mtime)."""
+        now = time.time()
+        path = os.path.join(self.directory, f"request-{name}")
+        try:
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            open(path, 'a').close()
+            os.utime(path, (now, now))
+        return now
+
+    def requested_at(self, name):
+        try:
+            return os.stat(os.path.join(self.directory, f"request-{name}")).st_mtime
+        except FileNotFoundError:
+            return 0
+
+
+class LeaderElection:
+    """
+    Leadership is an exclusive flock on a lock file. The kernel releases it when the holder exits,
+    so when gunicorn replaces a dead worker, another worker picks leadership up on its next attempt.
+    """
+
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        self.is_leader = False
+        self._fd = None
+
+    def try_acquire(self):
+        if self.is_leader:
+            return True
+        if fcntl is None:
+            self.is_leader = True
+            return True
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode('ascii'))
+        self._fd = fd
+        self.is_leader = True
+        logging.info(f"Worker {os.getpid()} is now the leader for background refresh")
+        return True
+
+
+def default_state_dir(data_dir):
+    """tmpfs when the platform has one (namespaced per DATA_DIR), otherwise DATA_DIR/state."""
+    if os.environ.get('SHARED_STATE_DIR'):
+        return os.environ['SHARED_STATE_DIR']
+    if os.path.isdir('/dev/shm'):
+        suffix = hashlib.sha1(os.path.abspath(data_dir).encode('utf-8')).hexdigest()[:8]
+        return f"/dev/shm/tailbrain-{suffix}"
+    return os.path.join(data_dir, 'state')
+
+
+def register_leader_task(name, func, interval=None, when_idle=False, scheduled=True):
+    """
+    Registers a function the leader worker calls every `interval` seconds (default BACKGROUND_REFRESH_INTERVAL).
+    Tasks pause while nobody uses the UI, unless `when_idle` (scheduled work that does not feed a view).
+    Any worker can also ask for a run with request_leader_task(); `scheduled=False` tasks only run then.
+    """
+    _leader_tasks.append({"name": name, "func": func, "interval": interval or BACKGROUND_REFRESH_INTERVAL,
+                          "when_idle": when_idle, "scheduled": scheduled, "last_run": 0})
+
+
+def request_leader_task(name):
+    """
+    Asks the leader to run a registered task on its next pass (within about a second), whichever worker it is.
+    Work whose results the leader publishes must run there: a round in another worker would overwrite them.
+    Returns:
+        bool: Whether the request was recorded; False without a shared store (no leader to ask).
+    """
+    if store is None:
+        return False
+    store.request(name)
+    return True
+
+
+def record_activity():
+    if store is not None:
+        store.record_activity()
+
+
+def is_leader():
+    return election is not None and election.is_leader
+
+
+def _background_loop():
+    last_election_attempt = 0
+    while True:
+        now = time.time()
+        if not election.is_leader and now - last_election_attempt >= LEADER_RETRY_INTERVAL:
+            last_election_attempt = now
+            election.try_acquire()
+        if election.is_leader:
+            _run_due_tasks(now)
+        time.sleep(1)
+
+
+def _run_due_tasks(now):
+    """
+    One pass of the leader's schedule: runs every task a worker asked for since its last run, and every scheduled
+    task whose interval has elapsed, skipping idle-paused ones.
+    """
+    active = now - store.last_activity() < BACKGROUND_IDLE_TIMEOUT
+    for task in _leader_tasks:
+        requested = store.requested_at(task['name']) > task['last_run']
+        due = task['scheduled'] and now - task['last_run'] >= task['interval'] and (active or task['when_idle'])
+        if not (requested or due):
+            continue
+        task['last_run'] = now
+        try:
+            task['func']()
+        except Exception as e: # A failing poller must not take the others down
+            logging.warning(f"Background task '{task['name']}' failed: {e}")
+
+
+def start(data_dir):
+    """
+    Sets up the shared store and starts this worker's background thread (election + leader tasks).
+    Safe to call once per process; gunicorn imports the app in each worker after forking.
+    """
+    global store, election, _background_thread
+    if _background_thread is not None:
+        return
+    state_dir = default_state_dir(data_dir)
+    try:
+        store = SharedStore(state_dir)
+    except OSError as e:
+        logging.error(f"Could not create shared state directory {state_dir}, caching per worker only: {e}")
+        return
+    election = LeaderElection(os.path.join(state_dir, 'leader.lock'))
+    election.try_acquire()
+    _background_thread = threading.Thread(target=_background_loop, name='tailbrain-background', daemon=True)
+    _background_thread.start()
+    logging.info(f"Shared state in {state_dir}; worker {os.getpid()} leader={election.is_leader}")
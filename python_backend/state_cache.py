@@ -0,0 +1,122 @@
+import os
+import time
+import logging
+import threading
+
+from host_caller import exec_host_command, RelayBusyError
+import shared_state
+import tracing
+
+STATE_CACHE_TTL = float(os.environ.get('STATE_CACHE_TTL', 5))
+
+
+class CachedCommand:
+    """
+    Caches the parsed output of one read-only host command (e.g. 'tailscale serve status').
+    Like docker_index.ResourceIndex, it carries a version that only moves when the parsed value changes,
+    so mutation routes can hand clients the new value plus a version to reconcile against.
+    Shares its value with the other workers through shared_state, the same way ResourceIndex does.
+    """
+
+    def __init__(self, name, command, parse, ttl=STATE_CACHE_TTL, relay_url=None):
+        self.name = name
+        self.command = command
+        self.relay_url = relay_url # None: the default relay (HOST_RELAY_URL)
+        self.parse = parse
+        self.ttl = ttl
+        self.value = None
+        self.version = 0
+        self.refreshed_at = 0
+        self.stale = False # True while serving a value restored from disk at boot
+        self._stale = True
+        self._invalidated_at = 0
+        self._lock = threading.Lock()
+        self._background_refresh = None
+
+    def get(self, force_refresh=False):
+        """
+        Returns the cached value, re-running the command first if it is older than the TTL (or if forced).
+        Raises:
+            ValueError: If the relay call fails or the output cannot be parsed.
+        """
+        shared_state.record_activity()
+        if not force_refresh and self._is_fresh():
+            return self.value
+        if not force_refresh and self.stale:
+            self._refresh_in_background()
+            return self.value
+        with self._lock:
+            if not force_refresh and self._is_fresh():
+                return self.value
+            try:
+                result = exec_host_command(self.command, relay_url=self.relay_url)
+            except RelayBusyError as e:
+                if force_refresh or self.value is None:
+                    raise
+                logging.warning(f"Serving the previous {self.name} value, relay is busy: {e}")
+                return self.value
+            with tracing.span("parse", cache=self.name):
+                return self.set(self.parse(result['stdout']))
+
+    def for_host(self, host_name, relay_url):
+        """Returns an empty cache for the same command on another host's relay (see hosts.py)."""
+        return CachedCommand(f"{self.name}@{host_name}", self.command, self.parse, self.ttl, relay_url)
+
+    def _is_fresh(self):
+        if shared_state.store is not None:
+            payload, refreshed_at = shared_state.store.load(self.name)
+            if payload is None or time.time() - refreshed_at >= self.ttl:
+                return False
+            if self._stale and refreshed_at <= self._invalidated_at:
+                return False # Invalidated here, and nobody has re-run the command since
+            self._stale = False
+            self.value, self.version, self.refreshed_at = payload['value'], payload['version'], refreshed_at
+            self.stale = False
+            return True
+        return not self._stale and time.time() - self.refreshed_at < self.ttl
+
+    def set(self, value):
+        if shared_state.store is not None:
+            payload, _ = shared_state.store.load(self.name)
+            self.version = max(self.version, payload['version'] if payload else 0)
+        if value != self.value or self.version == 0:
+            self.version += 1
+        self.value = value
+        self.refreshed_at = time.time()
+        self.stale = False
+        self._stale = False
+        if shared_state.store is not None:
+            shared_state.store.publish(self.name, {"version": self.version, "value": value}, self.refreshed_at)
+        logging.debug(f"{self.name} cache refreshed, version {self.version}")
+        return value
+
+    def invalidate(self):
+        self._stale = True
+        self._invalidated_at = time.time()
+        if shared_state.store is not None:
+            shared_state.store.invalidate(self.name)
+
+    def _refresh_in_background(self):
+        if self._background_refresh is not None and self._background_refresh.is_alive():
+            return
+
+        def run():
+            try:
+                self.get(force_refresh=True)
+            except ValueError as e:
+                logging.warning(f"Background refresh of {self.name} failed: {e}")
+
+        self._background_refresh = threading.Thread(target=run, name=f"refresh-{self.name}", daemon=True)
+        self._background_refresh.start()
+
+    def export(self):
+        """Returns the cached value in warm_start's persisted form, or None if the command never ran."""
+        if self.version == 0:
+            return None
+        return {"version": self.version, "refreshedAt": self.refreshed_at, "data": self.value}
+
+    def seed(self, data, version, refreshed_at):
+        """Installs a value restored from disk, unless something fresher was already loaded."""
+        if self.version == 0:
+            self.value, self.version, self.refreshed_at = data, version, refreshed_at
+            self.stale = True
@@ -0,0 +1,327 @@
+import os
+import re
+import json
+import time
+import heapq
+import struct
+import logging
+import threading
+
+import shared_state
+
+# Container resource history. The leader samples `docker stats` every STATS_INTERVAL seconds and writes the
+# samples into one fixed-size file per container under DATA_DIR/stats. Each file holds three ring buffers
+# (tiers) of fixed-size records: 10 s resolution for 2 hours, 1 min for 2 days and 1 h for 30 days. A sample is
+# folded into the current slot of every tier, so older data is downsampled as it is written and the files never grow.
+STATS_INTERVAL = float(os.environ.get('STATS_INTERVAL', 10))
+STATS_MAX_CONTAINERS = int(os.environ.get('STATS_MAX_CONTAINERS', 200)) # Files beyond this are pruned, oldest first
+TIERS = ((10, 720), (60, 2880), (3600, 720)) # (resolution seconds, slots)
+# Gauges are averaged within a slot; counters (cumulative since the container started) keep the latest value.
+GAUGES = ('cpuPercent', 'memBytes', 'memPercent', 'pids')
+COUNTERS = ('netRxBytes', 'netTxBytes', 'blockReadBytes', 'blockWriteBytes')
+METRICS = GAUGES + COUNTERS
+STATS_COMMAND = 'docker stats --no-stream --format "{{json .}}"'
+# Fields /api/docker/stats/top can rank by, and the fields rollups sum up.
+RANK_FIELDS = {
+    'cpu': 'cpuPercent', 'mem': 'memBytes', 'netRx': 'netRxRate', 'netTx': 'netTxRate',
+    'blockRead': 'blockReadRate', 'blockWrite': 'blockWriteRate', 'io': 'ioRate',
+}
+ROLLUP_FIELDS = ('cpuPercent', 'memBytes', 'memLimitBytes', 'pids', 'netRxRate', 'netTxRate', 'blockReadRate',
+                 'blockWriteRate', 'ioRate')
+
+_MAGIC = b'TBTS'
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct(f"<4sI{len(TIERS) * 2}I")
+_RECORD = struct.Struct(f"<dI{len(METRICS)}d") # bucket start, samples folded in, metrics
+_HEADER_BYTES = _HEADER.pack(_MAGIC, _FORMAT_VERSION, *(value for tier in TIERS for value in tier))
+_FILE_SIZE = _HEADER.size + sum(slots for _, slots in TIERS) * _RECORD.size
+_CONTAINER_ID = re.compile(r'^[0-9a-f]{12,64}$')
+
+_UNITS = {
+    'b': 1, 'kb': 1e3, 'mb': 1e6, 'gb': 1e9, 'tb': 1e12,
+    'kib': 1024, 'mib': 1024 ** 2, 'gib': 1024 ** 3, 'tib': 1024 ** 4,
+}
+_SIZE = re.compile(r'^\s*([0-9.]+)\s*([a-zA-Z]*)\s*$')
+
+
+def parse_size(text):
+    """Parses docker's human-readable sizes ('1.5MiB', '12.3kB', '0B') into bytes. Returns None if unparseable."""
+    match = _SIZE.match(text or '')
+    if not match:
+        return None
+    unit = _UNITS.get(match.group(2).lower() or 'b')
+    return float(match.group(1)) * unit if unit else None
+
+
+def _parse_percent(text):
+    try:
+        return float((text or '').strip().rstrip('%'))
+    except ValueError:
+        return None
+
+
+def _parse_pair(text):
+    """'used / limit' -> (used bytes, limit bytes)."""
+    first, _, second = (text or '').partition('/')
+    return parse_size(first), parse_size(second)
+
+
+def parse_stats(record):
+    """
+    Turns one `docker stats --format "{{json .}}"` record into numbers.
+    Returns:
+        dict: cpuPercent, cpuFraction (of one CPU), memBytes, memLimitBytes, memPercent, memFraction, pids,
+              netRxBytes, netTxBytes, blockReadBytes, blockWriteBytes (None where docker reported '--' or nothing).
+    """
+    mem_used, mem_limit = _parse_pair(record.get('MemUsage'))
+    net_rx, net_tx = _parse_pair(record.get('NetIO'))
+    block_read, block_write = _parse_pair(record.get('BlockIO'))
+    try:
+        pids = float(record.get('PIDs'))
+    except (TypeError, ValueError):
+        pids = None
+    cpu_percent = _parse_percent(record.get('CPUPerc'))
+    mem_percent = _parse_percent(record.get('MemPerc'))
+    return {
+        "cpuPercent": cpu_percent,
+        "cpuFraction": cpu_percent / 100 if cpu_percent is not None else None,
+        "memBytes": mem_used,
+        "memLimitBytes": mem_limit,
+        "memPercent": mem_percent,
+        "memFraction": mem_percent / 100 if mem_percent is not None else None,
+        "pids": pids,
+        "netRxBytes": net_rx,
+        "netTxBytes": net_tx,
+        "blockReadBytes": block_read,
+        "blockWriteBytes": block_write,
+    }
+
+
+def parse_stats_output(stdout_str):
+    """Parses `docker stats --format "{{json .}}"` output into {container ID (12 chars): {name, ...parse_stats()}}."""
+    samples = {}
+    for line in stdout_str.splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            logging.warning(f"Skipping unparseable docker stats line: {e}")
+            continue
+        container_id = (record.get('ID') or '')[:12]
+        if _CONTAINER_ID.match(container_id):
+            samples[container_id] = {"name": record.get('Name'), **parse_stats(record)}
+    return samples
+
+
+def add_rates(samples, previous, elapsed):
+    """
+    Adds per-second rates (netRxRate, ..., ioRate: block read + write) to samples, from the counters of the
+    previous round taken `elapsed` seconds earlier. Rates are None without a previous sample or across a restart.
+    """
+    for container_id, sample in samples.items():
+        before = (previous or {}).get(container_id)
+        for name in COUNTERS:
+            rate_name = name.replace('Bytes', 'Rate')
+            old, new = (before or {}).get(name), sample.get(name)
+            usable = before is not None and elapsed > 0 and None not in (old, new) and new >= old
+            sample[rate_name] = (new - old) / elapsed if usable else None
+        block = (sample['blockReadRate'], sample['blockWriteRate'])
+        sample['ioRate'] = sum(block) if None not in block else None
+    return samples
+
+
+def top(rows, by, limit):
+    """The `limit` rows with the largest `by` field (a RANK_FIELDS key), by partial sort; missing values rank last."""
+    field = RANK_FIELDS[by]
+    return heapq.nlargest(limit, rows, key=lambda row: (row.get(field) is not None, row.get(field) or 0))
+
+
+def rollup(rows, group_keys):
+    """
+    Sums ROLLUP_FIELDS per group. group_keys(row) returns the groups a row belongs to (a container is counted
+    in each of its networks). Returns a list of {group, containers, ...sums}, largest CPU first.
+    """
+    groups = {}
+    for row in rows:
+        for key in group_keys(row):
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {"group": key, "containers": 0, **{name: None for name in ROLLUP_FIELDS}}
+            group["containers"] += 1
+            for name in ROLLUP_FIELDS:
+                if row.get(name) is not None:
+                    group[name] = (group[name] or 0) + row[name]
+    return sorted(groups.values(), key=lambda group: group["cpuPercent"] or 0, reverse=True)
+
+
+class StatsStore:
+    """The per-container ring files. Safe to share between threads; only the leader worker writes."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, container_id):
+        if not _CONTAINER_ID.match(container_id):
+            raise ValueError(f"Invalid container ID '{container_id}'")
+        return os.path.join(self.directory, f"{container_id[:12]}.ring")
+
+    def _open(self, path, create):
+        """Opens a ring file, (re)creating it if it is missing or was written with other tiers."""
+        try:
+            fd = os.open(path, os.O_RDWR if create else os.O_RDONLY)
+        except FileNotFoundError:
+            if not create:
+                return None
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.pread(fd, _HEADER.size, 0) != _HEADER_BYTES:
+            if not create:
+                os.close(fd)
+                return None
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, _FILE_SIZE) # Zero-filled: every slot starts out empty
+            os.pwrite(fd, _HEADER_BYTES, 0)
+        return fd
+
+    @staticmethod
+    def _slot_offset(tier_index, bucket):
+        resolution, slots = TIERS[tier_index]
+        tier_start = _HEADER.size + sum(s for _, s in TIERS[:tier_index]) * _RECORD.size
+        return tier_start + int(bucket // resolution % slots) * _RECORD.size
+
+    def append(self, container_id, timestamp, metrics):
+        """Folds one sample (a parse_stats() dict) into the container's file."""
+        os.makedirs(self.directory, exist_ok=True)
+        timestamp = int(timestamp)
+        with self._lock:
+            fd = self._open(self._path(container_id), create=True)
+            try:
+                for tier_index, (resolution, _) in enumerate(TIERS):
+                    bucket = timestamp - timestamp % resolution
+                    offset = self._slot_offset(tier_index, bucket)
+                    stored_bucket, count, *values = _RECORD.unpack(os.pread(fd, _RECORD.size, offset))
+                    if stored_bucket != bucket: # Empty slot, or one lap of the ring old
+                        count, values = 0, [float('nan')] * len(METRICS)
+                    count += 1
+                    for i, name in enumerate(METRICS):
+                        value = metrics.get(name)
+                        if value is None:
+                            continue
+                        if name in GAUGES and values[i] == values[i]: # Not NaN: running mean
+                            values[i] += (value - values[i]) / count
+                        else:
+                            values[i] = value
+                    os.pwrite(fd, _RECORD.pack(bucket, count, *values), offset)
+            finally:
+                os.close(fd)
+
+    def query(self, container_id, start, end, resolution=None):
+        """
+        Returns the container's samples between start and end (epoch seconds), oldest first, from the finest
+        tier that still covers `start` (or the tier with the given resolution). Counters also get per-second
+        rates (netRxRate, ...), computed between consecutive points.
+        Raises:
+            ValueError: If the container ID or resolution is invalid.
+        """
+        if resolution is None:
+            now = time.time()
+            tier_index = next((i for i, (res, slots) in enumerate(TIERS) if now - start <= res * slots), len(TIERS) - 1)
+        else:
+            tier_index = next((i for i, (res, _) in enumerate(TIERS) if res == resolution), None)
+            if tier_index is None:
+                raise ValueError(f"resolution must be one of {', '.join(str(res) for res, _ in TIERS)}")
+        resolution, slots = TIERS[tier_index]
+        fd = self._open(self._path(container_id), create=False)
+        if fd is None:
+            return {"resolution": resolution, "points": []}
+        try:
+            tier_start = _HEADER.size + sum(s for _, s in TIERS[:tier_index]) * _RECORD.size
+            data = os.pread(fd, slots * _RECORD.size, tier_start)
+        finally:
+            os.close(fd)
+
+        points = []
+        for stored_bucket, count, *values in _RECORD.iter_unpack(data):
+            if count and start <= stored_bucket <= end:
+                point = {"t": stored_bucket, "samples": count}
+                point.update({name: (None if value != value else value) for name, value in zip(METRICS, values)})
+                point.update({name.replace('Bytes', 'Rate'): None for name in COUNTERS})
+                points.append(point)
+        points.sort(key=lambda point: point['t'])
+        for previous, point in zip(points, points[1:]):
+            elapsed = point['t'] - previous['t']
+            for name in COUNTERS:
+                rate_name = name.replace('Bytes', 'Rate')
+                before, after = previous[name], point[name]
+                # A counter going down means the container restarted; there is no rate across that point.
+                point[rate_name] = (after - before) / elapsed if None not in (before, after) and after >= before else None
+        return {"resolution": resolution, "points": points}
+
+    def prune(self, keep_ids):
+        """Removes files beyond STATS_MAX_CONTAINERS (least recently written first) and those older than the last tier."""
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.ring')]
+        except FileNotFoundError:
+            return
+        horizon = time.time() - TIERS[-1][0] * TIERS[-1][1]
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for index, entry in enumerate(entries):
+            container_id = entry.name[:-len('.ring')]
+            if (index >= STATS_MAX_CONTAINERS or entry.stat().st_mtime < horizon) and container_id not in keep_ids:
+                try:
+                    os.remove(entry.path)
+                except OSError as e:
+                    logging.warning(f"Could not prune stats history {entry.path}: {e}")
+
+
+class StatsCollector:
+    """
+    Leader task: samples every running container with one `docker stats --no-stream` call, appends the samples
+    to the store and publishes the latest round (with rates) in the shared state as 'stats-latest'.
+    """
+
+    def __init__(self, store, exec_command):
+        self.store = store
+        self.exec_command = exec_command
+        self._latest = None # Used directly when there is no shared store
+        self._running = None
+
+    def collect(self):
+        result = self.exec_command(STATS_COMMAND)
+        timestamp = time.time()
+        samples = parse_stats_output(result['stdout'])
+        previous = self.latest()
+        if previous and timestamp - previous['sampledAt'] <= STATS_INTERVAL * 5: # Otherwise rates would be long averages
+            add_rates(samples, previous['containers'], timestamp - previous['sampledAt'])
+        else:
+            add_rates(samples, None, 0)
+        for container_id, sample in samples.items():
+            self.store.append(container_id, timestamp, sample)
+        self.store.prune(set(samples))
+        self._latest = {"sampledAt": timestamp, "containers": samples}
+        if shared_state.store is not None:
+            shared_state.store.publish('stats-latest', self._latest, timestamp)
+        logging.debug(f"Recorded resource samples for {len(samples)} containers")
+        return len(samples)
+
+    def latest(self):
+        """The last round of samples, {sampledAt, containers: {id: sample}}, or None before the first one."""
+        if shared_state.store is not None:
+            payload, _ = shared_state.store.load('stats-latest')
+            return payload
+        return self._latest
+
+    def collect_in_background(self):
+        """`docker stats --no-stream` takes a couple of seconds; run it without holding up the other leader tasks."""
+        if self._running is not None and self._running.is_alive():
+            return
+
+        def run():
+            try:
+                self.collect()
+            except ValueError as e:
+                logging.warning(f"Resource sampling failed: {e}")
+
+        self._running = threading.Thread(target=run, name='stats-collector', daemon=True)
+        self._running.start()
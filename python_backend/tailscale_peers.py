@@ -0,0 +1,84 @@
+import os
+import json
+
+import docker_index
+
+# The tailnet's nodes, from `tailscale status --json`, held in a docker_index.ResourceIndex so the peers view gets
+# the same name search, facet filters and keyset pagination as the container and network lists. The status is
+# parsed once per TAILSCALE_PEERS_TTL seconds into one compact record per node, however many pages or keystrokes
+# are answered from it; on tailnets with thousands of nodes the raw status is several megabytes.
+TAILSCALE_PEERS_TTL = float(os.environ.get('TAILSCALE_PEERS_TTL', 10))
+# What `tailscale status --json` reports as LastSeen for nodes that are online (or were never seen).
+_ZERO_TIME = '0001-01-01T00:00:00Z'
+
+
+def _peer_record(node, users, is_self=False):
+    user = users.get(str(node.get('UserID'))) or {}
+    online = bool(node.get('Online')) or is_self
+    if is_self:
+        connection = 'self'
+    elif not online:
+        connection = 'offline'
+    elif node.get('CurAddr'):
+        connection = 'direct'
+    elif node.get('Relay'):
+        connection = 'relay' # Through a DERP server; `relay` names its region
+    else:
+        connection = 'idle' # Online, but no traffic since the connection was set up
+    last_seen = node.get('LastSeen')
+    return {
+        "id": str(node.get('ID') or node.get('PublicKey') or node.get('HostName')),
+        "hostname": node.get('HostName'),
+        "dnsName": (node.get('DNSName') or '').rstrip('.'),
+        "ips": node.get('TailscaleIPs') or [],
+        "os": node.get('OS'),
+        "online": online,
+        "lastSeen": last_seen if last_seen and last_seen != _ZERO_TIME else None,
+        "connection": connection,
+        "relay": node.get('Relay') or None,
+        "curAddr": node.get('CurAddr') or None,
+        "user": user.get('LoginName'),
+        "tags": node.get('Tags') or [],
+        "exitNode": bool(node.get('ExitNode')),
+        "exitNodeOption": bool(node.get('ExitNodeOption')),
+        "rxBytes": node.get('RxBytes', 0),
+        "txBytes": node.get('TxBytes', 0),
+        "self": is_self,
+    }
+
+
+def parse_status(stdout_str):
+    """Parses `tailscale status --json` into one compact record per node (this one first, flagged 'self')."""
+    if not stdout_str or not stdout_str.strip():
+        return []
+    status = json.loads(stdout_str)
+    users = {str(user_id): user for user_id, user in (status.get('User') or {}).items()}
+    records = [_peer_record(status['Self'], users, is_self=True)] if status.get('Self') else []
+    records += [_peer_record(node, users) for node in (status.get('Peer') or {}).values()]
+    return records
+
+
+def _describe_peer(record):
+    names = [record.get('hostname') or '', record.get('dnsName') or ''] + list(record.get('ips') or [])
+    return {
+        "id": record['id'],
+        "names": ','.join(name.lower() for name in names if name), # Searchable by hostname, MagicDNS name or IP
+        "labels": {tag: '' for tag in record.get('tags') or []}, # ?label=tag:server
+        "facets": {
+            "os": (record.get('os') or '').lower(),
+            "online": 'true' if record.get('online') else 'false',
+            "connection": record.get('connection'),
+        },
+        "sort": {
+            "name": (record.get('hostname') or '').lower(),
+            "os": record.get('os'),
+            "online": '1' if record.get('online') else '0',
+            "lastSeen": record.get('lastSeen') or ('9999' if record.get('online') else ''), # Online sorts as most recent
+        },
+    }
+
+
+peer_index = docker_index.ResourceIndex(
+    'tailscale-peers', 'tailscale status --json', _describe_peer,
+    sort_fields=('name', 'os', 'online', 'lastSeen'), ttl=TAILSCALE_PEERS_TTL, parse=parse_status,
+)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The backend imports its modules flat (it runs from python_backend/), so the tests do too.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# The relay (host_command_relay.py and its helpers) lives at the repository root.
+sys.path.insert(1, os.path.dirname(BACKEND_DIR))
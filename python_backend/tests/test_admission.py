@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+
+import host_caller
+from host_caller import PRIORITY_BACKGROUND, PRIORITY_MUTATION, PRIORITY_READ, RelayBusyError
+
+
+@pytest.fixture
+def relay_load(monkeypatch):
+    """The load the relay reports on /health; None while it is idle."""
+    load = {"value": None}
+    monkeypatch.setattr(host_caller, 'check_relay', lambda relay_url, timeout=None: {"load": load['value']})
+    return load
+
+
+@pytest.fixture
+def admission(monkeypatch, relay_load):
+    monkeypatch.setattr(host_caller, 'RELAY_MAX_CONCURRENCY', 3)
+    monkeypatch.setattr(host_caller, 'RELAY_MUTATION_RESERVED_SLOTS', 1)
+    monkeypatch.setattr(host_caller, 'READ_ADMISSION_TIMEOUT', 0.05)
+    monkeypatch.setattr(host_caller, 'READ_RATE_LIMIT', 1)
+    monkeypatch.setattr(host_caller, 'READ_BURST', 4)
+    monkeypatch.setattr(host_caller, 'RELAY_LOAD_CHECK_INTERVAL', 0)
+    return host_caller._Admission('http://relay.test:7655')
+
+
+def test_classify_command():
+    assert host_caller.classify_command('docker ps -a') == PRIORITY_READ
+    assert host_caller.classify_command('docker buildx imagetools inspect nginx:1') == PRIORITY_READ
+    assert host_caller.classify_command('docker restart web') == PRIORITY_MUTATION
+    assert host_caller.classify_command('cd "/srv" && docker-compose -f "c.yml" up -d') == PRIORITY_MUTATION
+
+
+def test_reads_leave_the_reserved_slots_to_mutations(admission):
+    admission.acquire(PRIORITY_READ)
+    admission.acquire(PRIORITY_READ)
+    with pytest.raises(RelayBusyError) as shed:
+        admission.acquire(PRIORITY_READ)
+    assert shed.value.status == 503 and shed.value.retry_after >= 1
+    admission.acquire(PRIORITY_MUTATION) # The reserved slot
+    assert admission.in_flight == 3
+
+
+def test_a_read_waits_for_a_slot_to_be_released(admission, monkeypatch):
+    admission.acquire(PRIORITY_READ)
+    admission.acquire(PRIORITY_READ)
+    threading.Timer(0.01, admission.release, args=(PRIORITY_READ,)).start()
+    monkeypatch.setattr(host_caller, 'READ_ADMISSION_TIMEOUT', 2)
+    admission.acquire(PRIORITY_READ)
+    assert admission.in_flight == 2
+
+
+def test_a_shed_read_does_not_spend_rate_budget(admission):
+    admission.acquire(PRIORITY_READ)
+    admission.acquire(PRIORITY_READ)
+    tokens = admission._tokens
+    with pytest.raises(RelayBusyError):
+        admission.acquire(PRIORITY_READ)
+    assert admission._tokens == pytest.approx(tokens, abs=0.2)
+
+
+def test_read_rate_limit_and_refill(admission):
+    for _ in range(4): # The burst
+        admission.acquire(PRIORITY_READ)
+        admission.release(PRIORITY_READ)
+    with pytest.raises(RelayBusyError) as shed:
+        admission.acquire(PRIORITY_READ)
+    assert shed.value.status == 429 and shed.value.retry_after == 1
+    admission._tokens_at -= 2 # Two seconds later, at one read per second
+    admission.acquire(PRIORITY_READ)
+    admission.release(PRIORITY_READ)
+    admission.acquire(PRIORITY_READ)
+    admission.release(PRIORITY_READ)
+    with pytest.raises(RelayBusyError):
+        admission.acquire(PRIORITY_READ)
+
+
+def test_a_saturated_relay_sheds_reads_only(admission, relay_load):
+    relay_load['value'] = {"saturated": True, "inFlight": 16, "capacity": 16, "retryAfter": 3}
+    with pytest.raises(RelayBusyError) as shed:
+        admission.acquire(PRIORITY_READ)
+    assert (shed.value.status, shed.value.retry_after) == (503, 3)
+    admission.acquire(PRIORITY_MUTATION)
+    assert admission.in_flight == 1
+
+
+def test_background_work_is_never_shed_and_takes_no_slot(admission, relay_load):
+    relay_load['value'] = {"saturated": True, "retryAfter": 3}
+    admission._tokens = 0
+    for _ in range(host_caller.RELAY_MAX_CONCURRENCY):
+        admission.acquire(PRIORITY_MUTATION)
+    admission.acquire(PRIORITY_BACKGROUND) # Would block or be shed with any other priority
+    admission.release(PRIORITY_BACKGROUND)
+    assert admission.in_flight == host_caller.RELAY_MAX_CONCURRENCY
+
+
+def test_exec_host_command_reports_a_shed_read(monkeypatch, admission, relay_load):
+    relay_load['value'] = {"saturated": True, "retryAfter": 2}
+    monkeypatch.setattr(host_caller, '_admission_for', lambda relay_url: admission)
+    monkeypatch.setattr(host_caller, '_post_command', lambda *args: pytest.fail("A shed read must not reach the relay"))
+    reported = []
+    monkeypatch.setattr(host_caller, 'on_relay_busy', reported.append)
+    with pytest.raises(RelayBusyError):
+        host_caller.exec_host_command('docker ps -a')
+    assert len(reported) == 1 and reported[0].retry_after == 2
+    assert admission.in_flight == 0
@@ -0,0 +1,74 @@
+import compose_fingerprint
+from compose_fingerprint import CONFIG_HASH_LABEL, SERVICE_LABEL
+
+IMAGE_ID = 'sha256:' + 'a' * 64
+NEW_IMAGE_ID = 'sha256:' + 'b' * 64
+
+
+def _member(container_id, service, config_hash, image='nginx:1', status='running'):
+    return container_id, {"Image": image}, {SERVICE_LABEL: service, CONFIG_HASH_LABEL: config_hash}, status
+
+
+def _states(drift):
+    return {entry['service']: (entry['state'], entry['reasons']) for entry in drift['services']}
+
+
+def test_parse_drift_output():
+    stdout = (f"web h1\napi h2\n\n---tailbrain-fingerprint---\n"
+              f"{'c' * 64} {IMAGE_ID}\n{'d' * 12} {NEW_IMAGE_ID}\n")
+    assert compose_fingerprint.parse_drift_output(stdout) == (
+        {"web": "h1", "api": "h2"}, {'c' * 12: IMAGE_ID, 'd' * 12: NEW_IMAGE_ID})
+    assert compose_fingerprint.parse_drift_output("web h1\n") == ({"web": "h1"}, {})
+
+
+def test_drift_command_skips_inspect_without_containers():
+    assert 'docker inspect' not in compose_fingerprint.drift_command('/srv/app/docker-compose.yml', [])
+    assert compose_fingerprint.drift_command('/srv/app/docker-compose.yml', ['c1']).endswith(' c1')
+
+
+def test_in_sync_app():
+    drift = compose_fingerprint.service_drift(
+        {"web": "h1"}, [_member('c1', 'web', 'h1')], {"c1": IMAGE_ID}, {"nginx:1": IMAGE_ID})
+    assert drift['inSync'] and drift['changed'] == []
+    assert _states(drift) == {"web": ('inSync', [])}
+
+
+def test_each_kind_of_drift():
+    desired = {"web": "h1", "api": "h2", "db": "h3"}
+    members = [
+        _member('c1', 'web', 'old'), # Config edited
+        _member('c2', 'api', 'h2', status='exited'),
+        _member('c3', 'cron', 'h4'), # Removed from the compose file
+    ]
+    drift = compose_fingerprint.service_drift(desired, members, {"c1": NEW_IMAGE_ID, "c2": IMAGE_ID},
+                                              {"nginx:1": IMAGE_ID})
+    assert _states(drift) == {
+        "api": ('drifted', ['stopped']),
+        "cron": ('orphaned', []),
+        "db": ('missing', ['no container']),
+        "web": ('drifted', ['config', 'image']),
+    }
+    assert drift['changed'] == ['api', 'db', 'web']
+    assert not drift['inSync']
+
+
+def test_no_prepull_state_is_not_in_sync():
+    # PREPULL_INTERVAL=0, or the app was never pre-pulled: a newer image may exist, so `up` must not be skipped.
+    drift = compose_fingerprint.service_drift({"web": "h1"}, [_member('c1', 'web', 'h1')], {"c1": IMAGE_ID}, {})
+    assert _states(drift) == {"web": ('drifted', ['imageUnknown'])}
+    assert not drift['inSync'] and drift['changed'] == ['web']
+
+
+def test_built_services_are_compared_by_config_only():
+    members = [_member('c1', 'api', 'h1', image='shop-api')]
+    drift = compose_fingerprint.service_drift({"api": "h1"}, members, {"c1": IMAGE_ID}, {}, built={'api'})
+    assert drift['inSync']
+
+
+def test_fingerprint_follows_config_and_image():
+    def fingerprint(config_hash, image_id):
+        return compose_fingerprint.service_drift(
+            {"web": config_hash}, [_member('c1', 'web', config_hash)], {"c1": image_id}, {"nginx:1": image_id})['fingerprint']
+
+    assert fingerprint('h1', IMAGE_ID) == fingerprint('h1', IMAGE_ID)
+    assert len({fingerprint('h1', IMAGE_ID), fingerprint('h2', IMAGE_ID), fingerprint('h1', NEW_IMAGE_ID)}) == 3
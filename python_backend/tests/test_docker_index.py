@@ -0,0 +1,96 @@
+import base64
+import json
+
+import pytest
+
+import docker_index
+
+
+def _cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _container(container_id, name, created_at, state='running'):
+    return {"ID": container_id, "Names": name, "CreatedAt": created_at, "State": state, "Image": "nginx", "Labels": ""}
+
+
+@pytest.fixture
+def snapshot():
+    records = [
+        _container('c1', 'web', '2024-01-15 10:30:45 +0100 CET'),
+        _container('c2', 'db', '2024-01-15 09:45:00 +0000 UTC', state='exited'),
+        _container('c3', 'cache', '2024-01-14 23:59:59 -0500 EST'),
+        _container('c4', 'api', '2024-01-15 09:31:00 +0000 UTC'),
+    ]
+    return docker_index.IndexSnapshot(records, docker_index._describe_container, version=1, refreshed_at=0)
+
+
+def test_cursor_round_trip():
+    assert docker_index.decode_cursor(docker_index.encode_cursor(['web', 'c1'])) == ('web', 'c1')
+
+
+@pytest.mark.parametrize('value', [[1, 2], ['web', 2], [None, 'c1'], ['web'], {'a': 1}, 'web'])
+def test_decode_cursor_rejects_non_string_pairs(value):
+    with pytest.raises(docker_index.InvalidQueryError):
+        docker_index.decode_cursor(_cursor(value))
+
+
+def test_decode_cursor_rejects_garbage():
+    with pytest.raises(docker_index.InvalidQueryError):
+        docker_index.decode_cursor('not a cursor!')
+
+
+def test_query_with_integer_cursor_is_an_invalid_query(snapshot):
+    with pytest.raises(docker_index.InvalidQueryError):
+        snapshot.query(cursor=_cursor([1, 2]), limit=2)
+
+
+def test_pages_cover_every_match_once(snapshot):
+    seen, cursor = [], None
+    while True:
+        page = snapshot.query(sort='name', cursor=cursor, limit=1)
+        seen += [item['Names'] for item in page['items']]
+        cursor = page['nextCursor']
+        if cursor is None:
+            break
+    assert seen == ['api', 'cache', 'db', 'web']
+
+
+def test_descending_pages(snapshot):
+    first = snapshot.query(sort='name', descending=True, limit=3)
+    assert [item['Names'] for item in first['items']] == ['web', 'db', 'cache']
+    second = snapshot.query(sort='name', descending=True, cursor=first['nextCursor'], limit=3)
+    assert [item['Names'] for item in second['items']] == ['api']
+    assert second['nextCursor'] is None
+
+
+def test_facet_and_name_filters(snapshot):
+    page = snapshot.query(facets={'status': ['running']}, name='a')
+    assert [item['Names'] for item in page['items']] == ['api', 'cache']
+    assert page['total'] == 2
+
+
+def test_created_sorts_by_time_not_display_string(snapshot):
+    # 10:30 CET is 09:30 UTC and 23:59 EST the day before is 04:59 UTC, so neither sorts where its text would.
+    page = snapshot.query(sort='created')
+    assert [item['Names'] for item in page['items']] == ['cache', 'web', 'api', 'db']
+
+
+@pytest.mark.parametrize('created_at, expected', [
+    ('2024-01-15 10:30:45 +0100 CET', '2024-01-15T09:30:45.000000Z'),
+    ('2024-01-15 10:30:45.123456789 +0000 UTC', '2024-01-15T10:30:45.123456Z'),
+    ('yesterday', 'yesterday'),
+    (None, None),
+])
+def test_created_sort_key(created_at, expected):
+    assert docker_index.created_sort_key(created_at) == expected
+
+
+def test_resolve_by_prefix_and_name(snapshot):
+    assert snapshot.resolve('c3')['Names'] == 'cache'
+    assert snapshot.resolve('web')['ID'] == 'c1'
+    assert snapshot.resolve('c') is None # Ambiguous prefix
+
+
+def test_parse_labels_keeps_commas_in_values():
+    assert docker_index.parse_labels('a=1,b=x,y,c=') == {'a': '1', 'b': 'x,y', 'c': ''}
@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+
+import pytest
+
+import hosts
+from host_caller import HOST_RELAY_URL
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setenv('TAILBRAIN_HOSTS', 'pi=http://pi.tailnet:7655, broken ,local=http://evil:7655')
+    hosts_file = tmp_path / 'hosts.json'
+    hosts_file.write_text(json.dumps({"nas": "http://100.64.0.2:7655", "local": "http://other:7655"}))
+    return hosts.HostRegistry(str(hosts_file))
+
+
+def test_configured_hosts_cannot_replace_the_local_one(registry):
+    assert registry.hosts() == {"local": HOST_RELAY_URL, "nas": "http://100.64.0.2:7655", "pi": "http://pi.tailnet:7655"}
+
+
+def test_hosts_file_is_reread_when_it_changes(registry, tmp_path):
+    registry.hosts()
+    (tmp_path / 'hosts.json').write_text(json.dumps({"box": "http://box:7655"}))
+    os.utime(tmp_path / 'hosts.json', (1, 1))
+    assert list(registry.hosts()) == ['local', 'box', 'pi']
+
+
+def test_invalid_hosts_file_is_ignored(registry, tmp_path):
+    (tmp_path / 'hosts.json').write_text('["not", "an", "object"]')
+    assert list(registry.hosts()) == ['local', 'pi']
+
+
+@pytest.mark.parametrize('selector, expected', [
+    (None, ['local', 'nas', 'pi']), ('all', ['local', 'nas', 'pi']), ('nas', ['nas']), (' pi , local ', ['pi', 'local']),
+])
+def test_resolve(registry, selector, expected):
+    assert registry.resolve(selector) == expected
+
+
+def test_resolve_rejects_unknown_hosts(registry):
+    with pytest.raises(hosts.UnknownHostError, match='nope'):
+        registry.resolve('nas,nope')
+
+
+def test_relay_url_for_needs_exactly_one_host(registry):
+    assert registry.relay_url_for(None) == HOST_RELAY_URL
+    assert registry.relay_url_for('nas') == "http://100.64.0.2:7655"
+    for selector in ('all', 'nas,pi', 'nope'):
+        with pytest.raises(hosts.UnknownHostError):
+            registry.relay_url_for(selector)
+
+
+def test_fan_out_reports_failures_and_timeouts_per_host(registry):
+    release = threading.Event()
+
+    def fetch(name):
+        if name == 'nas':
+            raise ValueError("Relay unreachable")
+        if name == 'pi':
+            release.wait(5) # Slower than the fan-out timeout
+        return f"{name} ok"
+
+    try:
+        results, errors = registry.fan_out(['local', 'nas', 'pi'], fetch, timeout=0.2)
+    finally:
+        release.set()
+    assert results == {"local": "local ok"}
+    assert errors == {"nas": "Relay unreachable", "pi": "Timed out after 0.2s"}
+
+
+def test_fan_out_waits_for_the_hosts_concurrently(registry):
+    barrier = threading.Barrier(3, timeout=2) # Only passes if all three calls run at once
+
+    def fetch(name):
+        barrier.wait()
+        return name
+
+    results, errors = registry.fan_out(['local', 'nas', 'pi'], fetch, timeout=3)
+    assert (results, errors) == ({"local": "local", "nas": "nas", "pi": "pi"}, {})
+
+
+def test_cache_for_local_is_the_module_cache(registry):
+    class Cache:
+        name = 'containers'
+        relay_url = None
+
+        def for_host(self, host_name, relay_url):
+            copy = Cache()
+            copy.relay_url = relay_url
+            return copy
+
+    local_cache = Cache()
+    assert registry.cache_for('local', local_cache) is local_cache
+    nas = registry.cache_for('nas', local_cache)
+    assert nas.relay_url == "http://100.64.0.2:7655" and registry.cache_for('nas', local_cache) is nas
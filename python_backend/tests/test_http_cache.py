@@ -0,0 +1,46 @@
+import gzip
+import os
+
+import http_cache
+
+
+def _age(path, seconds):
+    stat = path.stat()
+    os.utime(path, (stat.st_atime - seconds, stat.st_mtime - seconds))
+
+
+def test_precompress_writes_smaller_siblings(tmp_path):
+    source = tmp_path / 'app.js'
+    source.write_text('console.log("hello");\n' * 200)
+    assert http_cache.precompress_static(tmp_path) >= 1
+    assert gzip.decompress((tmp_path / 'app.js.gz').read_bytes()) == source.read_bytes()
+    assert http_cache.precompress_static(tmp_path) == 0 # Up to date
+
+
+def test_stale_sibling_is_deleted_when_recompressing_does_not_pay(tmp_path):
+    source = tmp_path / 'app.js'
+    source.write_text('x' * 4000)
+    http_cache.precompress_static(tmp_path)
+    stale = tmp_path / 'app.js.gz'
+    assert stale.exists()
+    _age(stale, 60)
+    source.write_bytes(os.urandom(64)) # New content that does not compress
+    http_cache.precompress_static(tmp_path)
+    assert not stale.exists()
+    assert not (tmp_path / 'app.js.br').exists()
+
+
+def test_stale_sibling_is_rewritten(tmp_path):
+    source = tmp_path / 'index.html'
+    source.write_text('<p>old</p>' * 300)
+    http_cache.precompress_static(tmp_path)
+    _age(tmp_path / 'index.html.gz', 60)
+    source.write_text('<p>new</p>' * 300)
+    http_cache.precompress_static(tmp_path)
+    assert gzip.decompress((tmp_path / 'index.html.gz').read_bytes()) == source.read_bytes()
+
+
+def test_non_compressible_extensions_are_left_alone(tmp_path):
+    (tmp_path / 'logo.png').write_bytes(b'\0' * 4000)
+    assert http_cache.precompress_static(tmp_path) == 0
+    assert not (tmp_path / 'logo.png.gz').exists()
@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+
+import pytest
+
+import image_prepull
+import shared_state
+from host_caller import PRIORITY_BACKGROUND
+
+DIGEST = 'sha256:' + 'a' * 64
+NEW_DIGEST = 'sha256:' + 'b' * 64
+
+
+class FakeRelay:
+    """Answers exec_command calls from a list of (command prefix, stdout or exception), recording each call."""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = []
+
+    def __call__(self, command, priority=None, timeout=60):
+        self.calls.append((command, priority))
+        for prefix, answer in self.answers:
+            if prefix in command:
+                if isinstance(answer, Exception):
+                    raise answer
+                return {"stdout": answer, "stderr": ""}
+        raise AssertionError(f"Unexpected command {command}")
+
+
+def _puller(tmp_path, relay, state=None):
+    apps_path = tmp_path / 'apps.json'
+    apps_path.write_text(json.dumps([{"id": "app1", "name": "shop", "path": "/srv/shop/docker-compose.yml"}]))
+    state_path = tmp_path / 'image-prepull.json'
+    if state is not None:
+        state_path.write_text(json.dumps(state))
+    return image_prepull.PrePuller(str(state_path), str(apps_path), relay)
+
+
+def _state(pulled_at, digests=(f"nginx@{DIGEST}",)):
+    return {"images": {"nginx:1": {"imageId": "sha256:img", "digests": list(digests), "pulledAt": pulled_at, "error": None}},
+            "apps": {"app1": {"images": ["nginx:1"], "built": [], "checkedAt": pulled_at, "error": None}},
+            "startedAt": pulled_at, "finishedAt": pulled_at}
+
+
+CONFIG = json.dumps({"services": {
+    "web": {"image": "nginx:1"},
+    "api": {"image": "shop/api:dev", "build": {"context": "."}},
+    "worker": {"build": {"context": "./worker"}},
+}})
+
+
+def test_build_services_are_not_pulled(tmp_path):
+    relay = FakeRelay([('config --format json', CONFIG), ('docker pull', f'sha256:img ["nginx@{DIGEST}"]')])
+    state = _puller(tmp_path, relay).run()
+    assert state['apps']['app1']['images'] == ['nginx:1']
+    assert state['apps']['app1']['built'] == ['api', 'worker']
+    assert list(state['images']) == ['nginx:1']
+    pulls = [(command, priority) for command, priority in relay.calls if 'docker pull' in command]
+    assert len(pulls) == 1 and pulls[0][1] == PRIORITY_BACKGROUND
+
+
+def test_current_when_the_registry_still_serves_the_pulled_digest(tmp_path):
+    relay = FakeRelay([('imagetools inspect', DIGEST + '\n')])
+    assert _puller(tmp_path, relay, _state(time.time())).is_current('app1')
+
+
+def test_not_current_after_a_push_to_the_same_tag(tmp_path):
+    relay = FakeRelay([('imagetools inspect', NEW_DIGEST + '\n')])
+    assert not _puller(tmp_path, relay, _state(time.time())).is_current('app1')
+
+
+def test_not_current_when_the_registry_cannot_be_asked(tmp_path):
+    relay = FakeRelay([('imagetools inspect', ValueError("unauthorized"))])
+    assert not _puller(tmp_path, relay, _state(time.time())).is_current('app1')
+
+
+@pytest.mark.parametrize('state', [None, _state(time.time() - 10 * image_prepull.PREPULL_MAX_AGE)])
+def test_not_current_without_a_recent_pull(tmp_path, state):
+    relay = FakeRelay([])
+    assert not _puller(tmp_path, relay, state).is_current('app1')
+    assert relay.calls == []
+
+
+def test_local_check_does_not_ask_the_registry(tmp_path):
+    relay = FakeRelay([])
+    assert _puller(tmp_path, relay, _state(time.time())).is_current('app1', check_registry=False)
+    assert relay.calls == []
+
+
+def test_compose_command_resolves_the_directory_like_up(tmp_path, monkeypatch):
+    (tmp_path / 'real').mkdir()
+    (tmp_path / 'link').symlink_to(tmp_path / 'real')
+    monkeypatch.chdir(tmp_path)
+    real = (tmp_path / 'real').resolve()
+    assert image_prepull.compose_command('link/docker-compose.yml', 'config') == \
+        f'cd "{real}" && docker-compose -f "docker-compose.yml" config'
+
+
+def test_manual_rounds_are_run_by_the_leader(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_state, 'store', shared_state.SharedStore(str(tmp_path / 'state')))
+    puller = _puller(tmp_path, FakeRelay([]))
+    monkeypatch.setattr(puller, 'run', lambda: pytest.fail("Only the leader pre-pulls"))
+    assert puller.request_round()
+    assert shared_state.store.requested_at(image_prepull.LEADER_TASK) > 0
+    assert not puller.is_running()
+
+
+def test_manual_round_without_a_shared_store_runs_here(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_state, 'store', None)
+    puller = _puller(tmp_path, FakeRelay([]))
+    ran = threading.Event()
+    monkeypatch.setattr(puller, 'run', ran.set)
+    assert puller.request_round()
+    assert ran.wait(5)
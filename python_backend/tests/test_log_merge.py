@@ -0,0 +1,88 @@
+import pytest
+
+import log_merge
+
+
+def _lines(entries):
+    return [(entry['name'], entry['line']) for entry in entries]
+
+
+def test_split_lines_strips_timestamps_and_carries_them_to_continuations():
+    text = "2024-01-15T10:00:00.123456789Z first\n  continued\n2024-01-15T10:00:01Z second\n"
+    entries = list(log_merge.split_lines(text, 'c1', 'web', 'stdout'))
+    assert [entry for _, entry in entries] == [
+        {"ts": "2024-01-15T10:00:00.123456789Z", "container": "c1", "name": "web", "stream": "stdout", "line": "first"},
+        {"ts": "2024-01-15T10:00:00.123456789Z", "container": "c1", "name": "web", "stream": "stdout", "line": "  continued"},
+        {"ts": "2024-01-15T10:00:01Z", "container": "c1", "name": "web", "stream": "stdout", "line": "second"},
+    ]
+    assert entries[0][0] == entries[1][0] < entries[2][0]
+
+
+def test_sort_key_ignores_printed_precision():
+    assert log_merge.sort_key('2024-01-15T10:00:00', '5', 'Z') == log_merge.sort_key('2024-01-15T10:00:00', '500000000', 'Z')
+    assert log_merge.sort_key('2024-01-15T10:00:00', None, 'Z') < log_merge.sort_key('2024-01-15T10:00:00', '000000001', 'Z')
+
+
+def test_merge_interleaves_sources_by_time():
+    web = log_merge.split_lines("2024-01-15T10:00:00.1Z a\n2024-01-15T10:00:00.3Z c\n", 'c1', 'web', 'stdout')
+    web_err = log_merge.split_lines("2024-01-15T10:00:00.25Z b\n", 'c1', 'web', 'stderr')
+    db = log_merge.split_lines("2024-01-15T10:00:00.05Z start\n2024-01-15T10:00:01Z d\n", 'c2', 'db', 'stdout')
+    assert _lines(log_merge.merge([web, web_err, db])) == [
+        ('db', 'start'), ('web', 'a'), ('web', 'b'), ('web', 'c'), ('db', 'd')]
+
+
+def test_merge_limit_keeps_the_most_recent_entries_oldest_first():
+    web = log_merge.split_lines("2024-01-15T10:00:01Z a\n2024-01-15T10:00:03Z c\n", 'c1', 'web', 'stdout')
+    db = log_merge.split_lines("2024-01-15T10:00:02Z b\n2024-01-15T10:00:04Z d\n", 'c2', 'db', 'stdout')
+    assert [line for _, line in _lines(log_merge.merge([web, db], limit=3))] == ['b', 'c', 'd']
+
+
+def test_merge_of_nothing():
+    assert list(log_merge.merge([log_merge.split_lines('', 'c1', 'web', 'stdout')], limit=10)) == []
+
+
+@pytest.mark.parametrize('value', ['2024-01-15T10:00:00Z', '1705312800', '1705312800.5', '10m', '1h30m'])
+def test_validate_time_bound_accepts_docker_formats(value):
+    assert log_merge.validate_time_bound(value) == value
+
+
+@pytest.mark.parametrize('value', ['', 'yesterday', '10m; rm -rf /', '$(id)', '1' * 41])
+def test_validate_time_bound_rejects_anything_else(value):
+    with pytest.raises(log_merge.InvalidTimeBoundError):
+        log_merge.validate_time_bound(value)
+
+
+def _sources():
+    return [
+        log_merge.split_lines("no timestamp yet\n2024-01-15T10:00:01Z a\n  a2\n  a3\n2024-01-15T10:00:03Z c\n", 'c1', 'web', 'stdout'),
+        log_merge.split_lines("2024-01-15T10:00:01Z tie\n2024-01-15T10:00:02Z b\n", 'c1', 'web', 'stderr'),
+        log_merge.split_lines("2024-01-15T10:00:03.000Z tie2\n  tie2b\n2024-01-15T10:00:04Z d\n", 'c2', 'db', 'stdout'),
+    ]
+
+
+@pytest.mark.parametrize('limit', range(1, 13))
+def test_limited_merge_is_the_tail_of_the_full_merge(limit):
+    full = list(log_merge.merge(_sources()))
+    assert list(log_merge.merge(_sources(), limit=limit)) == full[-limit:]
+
+
+def test_reversed_source_is_the_source_backwards():
+    source = _sources()[0]
+    assert list(reversed(source)) == list(source)[::-1]
+
+
+def test_limited_merge_reads_only_the_newest_lines():
+    class Tail:
+        """A source that fails if the merge reads more than its newest entry."""
+
+        def __init__(self, source):
+            self.source = source
+
+        def __reversed__(self):
+            newest = reversed(self.source)
+            yield next(newest)
+            pytest.fail("Read past the newest entry")
+
+    web = log_merge.split_lines("2024-01-15T10:00:01Z a\n2024-01-15T10:00:05Z e\n", 'c1', 'web', 'stdout')
+    db = log_merge.split_lines("2024-01-15T10:00:02Z b\n2024-01-15T10:00:06Z f\n", 'c2', 'db', 'stdout')
+    assert [line for _, line in _lines(log_merge.merge([Tail(web), Tail(db)], limit=1))] == ['f']
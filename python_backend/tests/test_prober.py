@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+import prober
+import shared_state
+
+
+@pytest.mark.parametrize('stdout, expected', [
+    ("pong from box (100.64.0.2) via 203.0.113.5:41641 in 12ms\n", (True, 12.0, "via 203.0.113.5:41641")),
+    ("pong from box (100.64.0.2) via DERP(fra) in 48.5ms\n", (True, 48.5, "via DERP(fra)")),
+    ("ping \"box\" timed out\nno reply\n", (False, None, "no reply")),
+    ("", (False, None, "no pong")),
+])
+def test_parse_ping(stdout, expected):
+    assert prober.parse_ping(stdout) == expected
+
+
+def test_summary_percentiles_histogram_and_availability():
+    stats = prober.TargetStats(prober._target('tcp', '127.0.0.1:8080', 'serve'))
+    for n, latency in enumerate([3, 7, 20, 40, 90, 200, 400, 900, 2000, 5000]):
+        stats.add(n, True, latency, "connected")
+    stats.add(10, False, None, "refused")
+    summary = stats.summary()
+    assert summary['id'] == 'tcp:127.0.0.1:8080'
+    assert (summary['up'], summary['lastLatencyMs'], summary['lastDetail']) == (False, None, "refused")
+    assert (summary['attempts'], summary['availability']) == (11, round(10 / 11, 4))
+    assert (summary['p50Ms'], summary['p95Ms']) == (200, 5000)
+    assert summary['histogram']['counts'] == [1, 1, 1, 1, 1, 1, 1, 1, 1, 1]
+
+
+def test_summary_of_a_target_never_probed():
+    summary = prober.TargetStats(prober._target('ping', 'box', 'peer')).summary()
+    assert (summary['up'], summary['availability'], summary['p50Ms']) == (None, None, None)
+
+
+def test_targets_from_funnel():
+    config = {
+        "Web": {"box.ts.net:443": {"Handlers": {"/": {"Proxy": "http://127.0.0.1:3000"}, "/static": {"Path": "/srv"}}}},
+        "TCP": {"443": {"HTTPS": True}, "5432": {"TCPForward": "127.0.0.1:5432"}},
+    }
+    assert [target['id'] for target in prober.targets_from_funnel(config)] == [
+        'http:https://box.ts.net:443', 'http:http://127.0.0.1:3000', 'tcp:127.0.0.1:5432']
+    assert prober.targets_from_funnel(None) == []
+
+
+def test_targets_from_serve():
+    entries = [{"rawLine": "https://box.ts.net/ (tailnet only)"}, {"rawLine": "|-- / proxy http://127.0.0.1:3000/"},
+               {"rawLine": "tcp://box.ts.net:5432 forwards to 127.0.0.1:5432"}]
+    assert [target['id'] for target in prober.targets_from_serve(entries)] == [
+        'http:https://box.ts.net', 'http:http://127.0.0.1:3000', 'tcp:127.0.0.1:5432']
+
+
+def test_targets_from_peers_drops_invalid_names():
+    assert [target['id'] for target in prober.targets_from_peers(['box', 'box.ts.net', '100.64.0.2', '-x', 'a b'])] == [
+        'ping:box', 'ping:box.ts.net', 'ping:100.64.0.2']
+
+
+def _summary(checked_at):
+    return {"checkedAt": checked_at, "durationMs": 1.0, "targets": []}
+
+
+def test_refresh_in_a_worker_waits_for_the_leaders_round(tmp_path, monkeypatch):
+    store = shared_state.SharedStore(str(tmp_path))
+    monkeypatch.setattr(shared_state, 'store', store)
+    store.publish('probes', _summary(100), 100)
+    service = prober.Prober(lambda: pytest.fail("Only the leader probes"), None, str(tmp_path / 'peers.json'))
+
+    def leader_round():
+        assert store.requested_at(prober.LEADER_TASK) > 0
+        store.publish('probes', _summary(200), 200)
+    threading.Timer(0.3, leader_round).start()
+    assert service.refresh(timeout=5)['checkedAt'] == 200
+
+
+def test_refresh_gives_up_with_the_last_summary(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_state, 'store', shared_state.SharedStore(str(tmp_path)))
+    shared_state.store.publish('probes', _summary(100), 100)
+    service = prober.Prober(lambda: pytest.fail("Only the leader probes"), None, str(tmp_path / 'peers.json'))
+    assert service.refresh(timeout=0.3)['checkedAt'] == 100
+
+
+def test_refresh_without_a_shared_store_probes_here(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_state, 'store', None)
+    service = prober.Prober(lambda: [], None, str(tmp_path / 'peers.json'))
+    assert service.refresh()['targets'] == []
@@ -0,0 +1,92 @@
+import os
+import threading
+import collections
+
+import pytest
+from flask import Flask, jsonify
+
+import profiling
+
+TOKEN = 'secret-token'
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILING_TOKEN', TOKEN)
+    return profiling.Profiler(str(tmp_path / 'profiles'), 'test')
+
+
+@pytest.fixture
+def client(profiler):
+    app = Flask(__name__)
+
+    @app.route('/api/ping')
+    def ping():
+        return jsonify({"ok": True})
+
+    profiler.init_app(app, '/api/profile')
+    return app.test_client()
+
+
+@pytest.fixture
+def blocked_sampler(monkeypatch):
+    """Makes sampling runs last until the returned event is set."""
+    release = threading.Event()
+
+    def sample_stacks(seconds, interval=profiling.PROFILE_SAMPLE_INTERVAL):
+        release.wait(5)
+        return collections.Counter({"MainThread;main (app.py:1)": 3})
+
+    monkeypatch.setattr(profiling, 'sample_stacks', sample_stacks)
+    yield release
+    release.set()
+
+
+def test_disabled_without_a_configured_token(client, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILING_TOKEN', '')
+    assert client.post('/api/profile/sample', headers={'X-Profiling-Token': ''}).status_code == 404
+    assert client.get('/api/profile').status_code == 404
+    assert client.get('/api/ping?profile=true').status_code == 200 # Ignored, not refused
+
+
+@pytest.mark.parametrize('headers', [{}, {'X-Profiling-Token': 'wrong'}, {'X-Profiling-Token': TOKEN + 'x'}])
+def test_missing_or_wrong_token_is_rejected(client, headers):
+    assert client.post('/api/profile/sample?seconds=1', headers=headers).status_code == 403
+    assert client.get('/api/profile', headers=headers).status_code == 403
+    assert client.get('/api/profile/test-sample-1-1.collapsed', headers=headers).status_code == 403
+    assert client.get('/api/ping', headers={**headers, 'X-Profile': 'true'}).status_code == 403
+
+
+def test_request_profile_with_token_writes_a_pstats_file(client, profiler):
+    response = client.get('/api/ping', headers={'X-Profiling-Token': TOKEN, 'X-Profile': 'true'})
+    assert response.status_code == 200
+    name = response.headers['X-Profile-File']
+    assert name.endswith('.pstats') and os.path.exists(os.path.join(profiler.directory, name))
+    listed = client.get('/api/profile', headers={'X-Profiling-Token': TOKEN}).get_json()
+    assert [entry['name'] for entry in listed] == [name]
+
+
+def test_only_one_sampling_run_at_a_time(client, profiler, blocked_sampler):
+    headers = {'X-Profiling-Token': TOKEN}
+    first = client.post('/api/profile/sample?seconds=5', headers=headers)
+    assert first.status_code == 202
+    assert client.post('/api/profile/sample?seconds=5', headers=headers).status_code == 409
+    with pytest.raises(RuntimeError):
+        profiler.start_sampling(5)
+    blocked_sampler.set()
+    profiler._sampling.join(5)
+    path = os.path.join(profiler.directory, first.get_json()['file'])
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == "MainThread;main (app.py:1) 3\n"
+    assert client.post('/api/profile/sample?seconds=5', headers=headers).status_code == 202
+
+
+@pytest.mark.parametrize('query', ['seconds=abc', 'seconds=0', 'seconds=3600', 'interval=0'])
+def test_sampling_parameters_are_validated(client, query):
+    assert client.post(f"/api/profile/sample?{query}", headers={'X-Profiling-Token': TOKEN}).status_code == 400
+
+
+def test_download_rejects_names_that_are_not_profiles(client):
+    headers = {'X-Profiling-Token': TOKEN}
+    assert client.get('/api/profile/..%2Fsecrets.collapsed', headers=headers).status_code == 404 # Never reaches the route
+    assert client.get('/api/profile/app.py', headers=headers).status_code == 400
@@ -0,0 +1,33 @@
+import pytest
+
+import host_command_relay
+
+
+@pytest.fixture
+def client():
+    return host_command_relay.app.test_client()
+
+
+def test_token_is_required_when_configured(client, monkeypatch):
+    monkeypatch.setattr(host_command_relay, 'RELAY_TOKEN', 's3cret')
+    assert client.post('/execute', json={"command": "true"}).status_code == 401
+    assert client.post('/execute', json={"command": "true"}, headers={"X-Relay-Token": "wrong"}).status_code == 401
+    assert client.post('/execute', json={"command": "true"}, headers={"X-Relay-Token": "s3cret"}).status_code == 200
+    assert client.get('/processes').status_code == 401
+    assert client.post('/processes/999999999/kill').status_code == 401
+    assert client.get('/health').status_code == 200
+
+
+def test_kill_without_token_is_limited_to_allowed_networks(client, monkeypatch):
+    monkeypatch.setattr(host_command_relay, 'RELAY_TOKEN', '')
+    remote = client.post('/processes/999999999/kill', environ_base={"REMOTE_ADDR": "100.64.0.7"})
+    assert remote.status_code == 403
+    local = client.post('/processes/999999999/kill', environ_base={"REMOTE_ADDR": "172.17.0.2"})
+    assert local.status_code == 404 # Allowed through; there is no such process
+
+
+def test_kill_with_token_is_accepted_from_anywhere(client, monkeypatch):
+    monkeypatch.setattr(host_command_relay, 'RELAY_TOKEN', 's3cret')
+    response = client.post('/processes/999999999/kill', headers={"X-Relay-Token": "s3cret"},
+                           environ_base={"REMOTE_ADDR": "100.64.0.7"})
+    assert response.status_code == 404
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+import relay_projection
+
+NETWORKS = json.dumps({
+    "bridge": {"NetworkID": "n1", "IPAddress": "172.17.0.2", "Gateway": "172.17.0.1"},
+    "web": {"NetworkID": "n2", "IPAddress": "10.0.0.5", "Gateway": "10.0.0.1"},
+})
+
+
+def test_json_path_keeps_selected_fields_of_every_element():
+    projected = json.loads(relay_projection.apply_text(NETWORKS, {"json": "*.{NetworkID,IPAddress}"}))
+    assert projected == {"bridge": {"NetworkID": "n1", "IPAddress": "172.17.0.2"},
+                         "web": {"NetworkID": "n2", "IPAddress": "10.0.0.5"}}
+
+
+def test_json_path_keys_indexes_and_missing_values():
+    document = json.dumps({"Peer": [{"HostName": "a"}, {"HostName": "b"}]})
+    assert json.loads(relay_projection.apply_text(document, {"json": "Peer.1.HostName"})) == "b"
+    assert json.loads(relay_projection.apply_text(document, {"json": "Peer.7.HostName"})) is None
+    assert json.loads(relay_projection.apply_text(document, {"json": "Missing.key"})) is None
+    assert json.loads(relay_projection.apply_text(document, {"json": ""})) == json.loads(document)
+
+
+def test_json_lines():
+    output = '{"ID":"a","Names":"web","Image":"nginx"}\n\n{"ID":"b","Names":"db","Image":"postgres"}\n'
+    projected = relay_projection.apply_text(output, {"json": "{ID,Names}", "jsonLines": True})
+    assert [json.loads(line) for line in projected.splitlines()] == [{"ID": "a", "Names": "web"}, {"ID": "b", "Names": "db"}]
+
+
+def test_grep_then_tail():
+    output = ''.join(f"{level} line {n}\n" for n, level in enumerate(['INFO', 'ERROR'] * 5))
+    assert relay_projection.apply_text(output, {"grep": "error", "ignoreCase": True, "tail": 2}) == 'ERROR line 7\nERROR line 9\n'
+    assert relay_projection.apply_text(output, {"grep": "ERROR", "invert": True, "head": 1}) == 'INFO line 0\n'
+
+
+def test_apply_accepts_a_lazy_line_source():
+    lines = (f"{n}\n" for n in range(1_000_000))
+    assert ''.join(relay_projection.apply(lines, {"head": 3})) == '0\n1\n2\n'
+
+
+def test_json_projection_of_non_json_output_fails():
+    with pytest.raises(ValueError):
+        relay_projection.apply_text('not json', {"json": "a"})
+
+
+@pytest.mark.parametrize('spec', [
+    [], {"bogus": 1}, {"json": 5}, {"json": "a..b"}, {"json": "{}"}, {"grep": "("},
+    {"head": -1}, {"tail": True}, {"head": "3"}, {"streams": ["stdin"]}, {"streams": "stdout"},
+])
+def test_invalid_projections(spec):
+    with pytest.raises(relay_projection.InvalidProjectionError):
+        relay_projection.validate(spec)
+
+
+def test_validate_defaults_to_stdout():
+    assert relay_projection.validate({})['streams'] == ['stdout']
@@ -0,0 +1,147 @@
+import os
+import socket
+import struct
+import sys
+
+import pytest
+
+import relay_sockets
+
+CONTAINER = 'f' * 64
+_HEADER = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+
+
+def _hex_address(ip, port):
+    """The /proc/net notation: each 32-bit word of the address in host byte order, then the port."""
+    family = socket.AF_INET6 if ':' in ip else socket.AF_INET
+    packed = socket.inet_pton(family, ip)
+    words = struct.unpack(f"!{len(packed) // 4}I", packed)
+    return struct.pack(f"={len(words)}I", *words).hex().upper() + f":{port:04X}"
+
+
+def _socket_line(ip, port, state, inode, uid=0):
+    return f"   0: {_hex_address(ip, port)} {_hex_address(ip, 0)} {state} 00000000:00000000 00:00000000 00000000 {uid:>5} 0 {inode} 1\n"
+
+
+class FakeProc:
+    """A /proc tree: socket tables under net/, and per process stat, comm, cmdline, cgroup and fd symlinks."""
+
+    def __init__(self, root):
+        self.root = root
+        (root / 'net').mkdir()
+        self.tables = {'tcp': [], 'tcp6': [], 'udp': []} # No udp6 file: IPv6 UDP not available
+
+    def write_tables(self):
+        for name, lines in self.tables.items():
+            (self.root / 'net' / name).write_text(_HEADER + ''.join(lines))
+
+    def add_process(self, pid, name, cgroup='0::/user.slice', start_time=1000):
+        base = self.root / str(pid)
+        (base / 'fd').mkdir(parents=True)
+        (base / 'stat').write_text(f"{pid} ({name}) S " + ' '.join(['0'] * 18) + f" {start_time} 0 0\n")
+        (base / 'comm').write_text(f"{name}\n")
+        (base / 'cmdline').write_bytes(f"/usr/bin/{name}\0--serve\0".encode())
+        (base / 'cgroup').write_text(cgroup + '\n')
+
+    def open_socket(self, pid, fd, inode):
+        os.symlink(f"socket:[{inode}]", self.root / str(pid) / 'fd' / str(fd))
+
+    def close_fd(self, pid, fd):
+        os.unlink(self.root / str(pid) / 'fd' / str(fd))
+
+
+@pytest.mark.skipif(sys.byteorder != 'little', reason="literal /proc values from a little-endian host")
+@pytest.mark.parametrize('hex_address, ipv6, expected', [
+    ('0100007F:1F90', False, ('127.0.0.1', 8080)),
+    ('00000000:0035', False, ('0.0.0.0', 53)),
+    ('0A01A8C0:01BB', False, ('192.168.1.10', 443)),
+    ('00000000000000000000000001000000:0050', True, ('::1', 80)),
+    ('B80D0120000000000000000001000000:0016', True, ('2001:db8::1', 22)),
+])
+def test_decode_address(hex_address, ipv6, expected):
+    assert relay_sockets._decode_address(hex_address, ipv6) == expected
+
+
+@pytest.fixture
+def proc(tmp_path):
+    return FakeProc(tmp_path)
+
+
+def test_read_listeners_keeps_listening_sockets_only(proc):
+    proc.tables['tcp'] = [
+        _socket_line('127.0.0.1', 8080, '0A', 101, uid=1000),
+        _socket_line('10.0.0.2', 43210, '01', 102), # Established
+        _socket_line('0.0.0.0', 9000, '0A', 0), # Being torn down
+    ]
+    proc.tables['tcp6'] = [_socket_line('::', 443, '0A', 103), _socket_line('::1', 5000, '06', 104)] # TIME_WAIT
+    proc.tables['udp'] = [_socket_line('0.0.0.0', 53, '07', 105), _socket_line('10.0.0.2', 5353, '01', 106)]
+    proc.write_tables()
+    assert relay_sockets.read_listeners(str(proc.root)) == {
+        101: {"protocol": "tcp", "address": "127.0.0.1", "port": 8080, "uid": 1000},
+        103: {"protocol": "tcp6", "address": "::", "port": 443, "uid": 0},
+        105: {"protocol": "udp", "address": "0.0.0.0", "port": 53, "uid": 0},
+    }
+
+
+@pytest.mark.parametrize('cgroup, expected', [
+    (f"12:devices:/docker/{CONTAINER}\n11:cpu:/docker/{CONTAINER}", CONTAINER[:12]), # cgroup v1
+    (f"0::/system.slice/docker-{CONTAINER}.scope", CONTAINER[:12]), # systemd driver
+    (f"0::/machine.slice/libpod-{CONTAINER}.scope/container", CONTAINER[:12]), # podman
+    ("0::/user.slice/user-1000.slice/session-2.scope", None),
+])
+def test_container_id_from_cgroup(proc, cgroup, expected):
+    proc.add_process(40, 'nginx', cgroup=cgroup)
+    process = relay_sockets.SocketInventory(str(proc.root))._process(40)
+    assert (process.name, process.cmdline, process.container_id) == ('nginx', '/usr/bin/nginx --serve', expected)
+
+
+def test_listeners_rescan_only_new_or_reowned_sockets(proc, monkeypatch):
+    proc.add_process(10, 'sshd')
+    proc.add_process(20, 'nginx', cgroup=f"0::/system.slice/docker-{CONTAINER}.scope")
+    proc.open_socket(10, 3, 201)
+    proc.open_socket(20, 5, 202)
+    proc.tables['tcp'] = [_socket_line('0.0.0.0', 22, '0A', 201), _socket_line('0.0.0.0', 80, '0A', 202)]
+    proc.write_tables()
+    inventory = relay_sockets.SocketInventory(str(proc.root))
+    scans = []
+    scan = inventory._scan
+    monkeypatch.setattr(inventory, '_scan', lambda wanted: scans.append(set(wanted)) or scan(wanted))
+
+    def owners():
+        return {entry['port']: (entry['pid'], entry['name'], entry['containerId']) for entry in inventory.listeners()}
+
+    assert owners() == {22: (10, 'sshd', None), 80: (20, 'nginx', CONTAINER[:12])}
+    assert scans == [{201, 202}]
+    owners()
+    assert scans == [{201, 202}] # Warm: one readlink per known owner, no scan
+
+    proc.add_process(30, 'redis')
+    proc.open_socket(30, 7, 203)
+    proc.tables['tcp'].append(_socket_line('127.0.0.1', 6379, '0A', 203))
+    proc.write_tables()
+    assert owners()[6379] == (30, 'redis', None)
+    assert scans[-1] == {203}
+
+    proc.close_fd(10, 3) # sshd hands its socket over to a new process
+    proc.add_process(40, 'sshd-new')
+    proc.open_socket(40, 4, 201)
+    assert owners()[22] == (40, 'sshd-new', None)
+    assert scans[-1] == {201}
+
+    proc.tables['tcp'] = [line for line in proc.tables['tcp'] if ' 202 ' not in line] # nginx stopped listening
+    proc.write_tables()
+    assert set(owners()) == {22, 6379}
+    assert len(scans) == 3
+    assert 202 not in inventory._owners and 20 not in inventory._processes
+
+
+def test_sockets_without_an_owner_are_not_rescanned(proc, monkeypatch):
+    proc.tables['tcp'] = [_socket_line('0.0.0.0', 8443, '0A', 301)] # Owned by a process in another namespace
+    proc.write_tables()
+    inventory = relay_sockets.SocketInventory(str(proc.root))
+    scans = []
+    scan = inventory._scan
+    monkeypatch.setattr(inventory, '_scan', lambda wanted: scans.append(set(wanted)) or scan(wanted))
+    assert inventory.listeners()[0]['pid'] is None
+    inventory.listeners()
+    assert scans == [{301}]
@@ -0,0 +1,100 @@
+import gzip
+import io
+import json
+
+import pytest
+
+import host_caller
+import relay_wire
+
+
+def _frames(header, stdout=b'', stderr=b''):
+    return (relay_wire.encode_header(header)
+            + b''.join(relay_wire.iter_stream_frames(relay_wire.FRAME_STDOUT, io.BytesIO(stdout), chunk_size=4))
+            + b''.join(relay_wire.iter_stream_frames(relay_wire.FRAME_STDERR, io.BytesIO(stderr), chunk_size=4)))
+
+
+class FakeResponse:
+    def __init__(self, body, chunk_size=3):
+        self.body, self.chunk_size = body, chunk_size
+
+    def iter_content(self, _):
+        for offset in range(0, len(self.body), self.chunk_size):
+            yield self.body[offset:offset + self.chunk_size]
+
+    def close(self):
+        pass
+
+
+def test_decoder_reassembles_frames_split_anywhere():
+    body = _frames({"code": 0}, b'hello world', b'warn')
+    decoder = relay_wire.FrameDecoder()
+    frames = [frame for offset in range(len(body)) for frame in decoder.feed(body[offset:offset + 1])]
+    decoder.close()
+    assert frames[0] == (relay_wire.FRAME_HEADER, b'{"code":0}')
+    assert b''.join(p for k, p in frames if k == relay_wire.FRAME_STDOUT) == b'hello world'
+    assert b''.join(p for k, p in frames if k == relay_wire.FRAME_STDERR) == b'warn'
+
+
+def test_decoder_close_rejects_a_partial_frame():
+    decoder = relay_wire.FrameDecoder()
+    list(decoder.feed(_frames({"code": 0}, b'abcdef')[:-2]))
+    with pytest.raises(ValueError):
+        decoder.close()
+
+
+def test_read_framed_response():
+    body = _frames({"code": 0, "stdoutBytes": 12, "stderrBytes": 4}, b'hello\r\nworld', b'warn')
+    header, stdout, stderr = host_caller._read_framed_response(FakeResponse(body))
+    assert (header['code'], stdout, stderr) == (0, 'hello\nworld', 'warn')
+    assert not header.get('truncated')
+
+
+def test_read_framed_response_detects_missing_output():
+    body = _frames({"code": 0, "stdoutBytes": 100, "stderrBytes": 0}, b'short')
+    with pytest.raises(ValueError):
+        host_caller._read_framed_response(FakeResponse(body))
+
+
+def test_read_framed_response_truncates_to_the_backend_limit(monkeypatch):
+    monkeypatch.setattr(host_caller, 'HOST_OUTPUT_MAX_BYTES', 5)
+    body = _frames({"code": 0, "stdoutBytes": 10, "stderrBytes": 0}, b'0123456789')
+    header, stdout, _ = host_caller._read_framed_response(FakeResponse(body))
+    assert (stdout, header['truncated']) == ('01234', True)
+
+
+def test_framed_command_error_raises_the_relay_error(monkeypatch):
+    monkeypatch.setattr(host_caller, '_post_command',
+                        lambda *args: ({"code": 1, "error": "Command failed with exit code 1"}, '', 'No such container: x'))
+    with pytest.raises(ValueError, match='No such container') as raised:
+        host_caller.exec_host_command('docker stop x', relay_url='http://relay.test')
+    assert not isinstance(raised.value, host_caller.RelayBusyError)
+
+
+@pytest.fixture
+def relay_client():
+    import host_command_relay
+    return host_command_relay.app.test_client()
+
+
+def test_relay_answers_a_failed_command_with_500_in_both_envelopes(relay_client):
+    framed = relay_client.post('/execute', json={"command": "false"}, headers={"Accept": relay_wire.MEDIA_TYPE})
+    assert framed.status_code == 500
+    assert framed.mimetype == relay_wire.MEDIA_TYPE
+    decoder = relay_wire.FrameDecoder()
+    kind, payload = next(decoder.feed(framed.get_data()))
+    assert kind == relay_wire.FRAME_HEADER and json.loads(payload)['code'] == 1
+
+    plain = relay_client.post('/execute', json={"command": "false"})
+    assert plain.status_code == 500
+    assert plain.get_json()['code'] == 1
+
+
+def test_relay_compresses_large_framed_output(relay_client):
+    response = relay_client.post('/execute', json={"command": "seq 1 5000"},
+                                 headers={"Accept": relay_wire.MEDIA_TYPE, "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    frames = list(relay_wire.FrameDecoder().feed(gzip.decompress(response.get_data())))
+    stdout = b''.join(payload for kind, payload in frames if kind == relay_wire.FRAME_STDOUT)
+    assert stdout.split() == [str(n).encode() for n in range(1, 5001)]
@@ -0,0 +1,122 @@
+import json
+import os
+import time
+
+import pytest
+
+import docker_index
+import shared_state
+import state_cache
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = shared_state.SharedStore(str(tmp_path))
+    monkeypatch.setattr(shared_state, 'store', store)
+    return store
+
+
+def test_load_round_trip(store):
+    assert store.load('missing') == (None, 0)
+    store.publish('doc', {"a": 1}, refreshed_at=1000)
+    assert store.load('doc') == ({"a": 1}, 1000)
+
+
+def test_load_notices_a_rewrite_that_keeps_the_inode(store):
+    store.publish('doc', {"value": "old"}, refreshed_at=1000)
+    store.load('doc')
+    path = store._path('doc')
+    inode = os.stat(path).st_ino
+    with open(path, 'w', encoding='utf-8') as f: # Same inode, as a replaced file may get on ext4 or tmpfs
+        json.dump({"value": "new, and longer"}, f)
+    os.utime(path, (2000, 2000))
+    assert os.stat(path).st_ino == inode
+    assert store.load('doc') == ({"value": "new, and longer"}, 2000)
+
+
+def test_invalidate_makes_the_document_stale(store):
+    store.publish('doc', {"a": 1})
+    store.invalidate('doc')
+    assert store.load('doc') == ({"a": 1}, 0)
+
+
+def _index():
+    return docker_index.ResourceIndex('containers-test', 'docker ps', docker_index._describe_container,
+                                      sort_fields=('name',), ttl=60)
+
+
+def test_invalidated_index_ignores_a_snapshot_older_than_the_invalidation(store):
+    index = _index()
+    index.replace([{"ID": "c1", "Names": "web"}])
+    assert index._is_fresh()
+    refreshed_at = index.peek().refreshed_at
+    index.invalidate()
+    # Another worker patches one record into the shared snapshot, keeping its original refresh time.
+    store.publish(index.name, {"version": 5, "records": [{"ID": "c1", "Names": "web"}]}, refreshed_at)
+    assert not index._is_fresh()
+    # A re-listing after the invalidation is adopted.
+    store.publish(index.name, {"version": 6, "records": [{"ID": "c2", "Names": "db"}]}, time.time() + 1)
+    assert index._is_fresh()
+    assert index.peek().version == 6
+    assert not index._stale
+
+
+def test_invalidated_cache_ignores_a_value_older_than_the_invalidation(store):
+    cache = state_cache.CachedCommand('serve-test', 'tailscale serve status', parse=str, ttl=60)
+    cache.set('before')
+    refreshed_at = cache.refreshed_at
+    cache.invalidate()
+    store.publish(cache.name, {"version": 1, "value": 'before'}, refreshed_at)
+    assert not cache._is_fresh()
+    store.publish(cache.name, {"version": 2, "value": 'after'}, time.time() + 1)
+    assert cache._is_fresh()
+    assert cache.value == 'after'
+
+
+def test_another_workers_snapshot_is_adopted_before_the_first_listing(store):
+    cache = state_cache.CachedCommand('status-test', 'tailscale status', parse=str, ttl=60)
+    store.publish(cache.name, {"version": 3, "value": 'shared'}, time.time())
+    assert cache._is_fresh()
+    assert (cache.value, cache.version) == ('shared', 3)
+
+
+def test_idle_leader_runs_only_when_idle_tasks(store, monkeypatch):
+    monkeypatch.setattr(shared_state, '_leader_tasks', [])
+    runs = []
+    shared_state.register_leader_task('view', lambda: runs.append('view'))
+    shared_state.register_leader_task('history', lambda: runs.append('history'), interval=10, when_idle=True)
+    now = time.time()
+    shared_state._run_due_tasks(now) # Nobody has served a read yet
+    assert runs == ['history']
+    shared_state._run_due_tasks(now + 5) # Not due yet
+    assert runs == ['history']
+    store.record_activity()
+    shared_state._run_due_tasks(now + 11)
+    assert runs == ['history', 'view', 'history']
+
+
+def test_a_failing_task_does_not_stop_the_others(store, monkeypatch):
+    monkeypatch.setattr(shared_state, '_leader_tasks', [])
+    runs = []
+    shared_state.register_leader_task('broken', lambda: 1 / 0, when_idle=True)
+    shared_state.register_leader_task('history', lambda: runs.append('history'), when_idle=True)
+    shared_state._run_due_tasks(time.time())
+    assert runs == ['history']
+
+
+def test_requested_tasks_run_outside_their_schedule(store, monkeypatch):
+    monkeypatch.setattr(shared_state, '_leader_tasks', [])
+    runs = []
+    shared_state.register_leader_task('probes', lambda: runs.append('probes'), interval=3600, scheduled=False)
+    now = time.time()
+    shared_state._run_due_tasks(now)
+    assert runs == [] # Not scheduled, not requested
+    assert shared_state.request_leader_task('probes')
+    shared_state._run_due_tasks(time.time() + 0.01)
+    shared_state._run_due_tasks(time.time() + 0.02) # Once per request
+    assert runs == ['probes']
+
+
+def test_no_leader_to_ask_without_a_store(monkeypatch):
+    monkeypatch.setattr(shared_state, 'store', None)
+    assert not shared_state.request_leader_task('probes')
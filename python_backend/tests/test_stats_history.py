@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+import stats_history
+
+CONTAINER = 'a1b2c3d4e5f6'
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('0B', 0), ('12.3kB', 12300), ('1.5MiB', 1.5 * 1024 ** 2), ('2GB', 2e9), (' 7 ', 7), ('--', None), ('1.5XB', None),
+])
+def test_parse_size(text, expected):
+    assert stats_history.parse_size(text) == expected
+
+
+def test_parse_stats_output():
+    line = json.dumps({"ID": CONTAINER + 'ffff', "Name": "web", "CPUPerc": "12.50%", "MemUsage": "100MiB / 1GiB",
+                       "MemPerc": "9.77%", "NetIO": "1kB / 2kB", "BlockIO": "0B / 4MB", "PIDs": "7"})
+    samples = stats_history.parse_stats_output(line + '\nnot json\n' + json.dumps({"ID": "zzz"}))
+    assert list(samples) == [CONTAINER]
+    sample = samples[CONTAINER]
+    assert sample['name'] == 'web'
+    assert (sample['cpuPercent'], sample['cpuFraction'], sample['pids']) == (12.5, 0.125, 7)
+    assert (sample['memBytes'], sample['memLimitBytes']) == (100 * 1024 ** 2, 1024 ** 3)
+    assert (sample['netRxBytes'], sample['netTxBytes'], sample['blockWriteBytes']) == (1000, 2000, 4e6)
+
+
+def test_add_rates_skips_restarts_and_first_rounds():
+    previous = {"a": {"netRxBytes": 100, "netTxBytes": 50, "blockReadBytes": 0, "blockWriteBytes": 0}}
+    samples = {
+        "a": {"netRxBytes": 300, "netTxBytes": 10, "blockReadBytes": 20, "blockWriteBytes": 40},
+        "b": {"netRxBytes": 1, "netTxBytes": 1, "blockReadBytes": 1, "blockWriteBytes": 1},
+    }
+    stats_history.add_rates(samples, previous, elapsed=10)
+    assert samples['a']['netRxRate'] == 20
+    assert samples['a']['netTxRate'] is None # Counter went down: restarted
+    assert samples['a']['ioRate'] == 6
+    assert samples['b']['netRxRate'] is None and samples['b']['ioRate'] is None
+
+
+def test_top_ranks_missing_values_last():
+    rows = [{"id": "a", "cpuPercent": 5}, {"id": "b", "cpuPercent": None}, {"id": "c", "cpuPercent": 50}, {"id": "d"}]
+    assert [row['id'] for row in stats_history.top(rows, 'cpu', 3)] == ['c', 'a', 'b']
+
+
+def test_rollup_counts_a_container_in_each_group():
+    rows = [
+        {"networks": ["front", "back"], "cpuPercent": 10, "memBytes": 100},
+        {"networks": ["back"], "cpuPercent": 30, "memBytes": None},
+    ]
+    groups = stats_history.rollup(rows, lambda row: row['networks'])
+    assert [(g['group'], g['containers'], g['cpuPercent'], g['memBytes']) for g in groups] == [
+        ('back', 2, 40, 100), ('front', 1, 10, 100)]
+    assert groups[0]['netRxRate'] is None
+
+
+def test_store_averages_gauges_and_keeps_the_latest_counter(tmp_path):
+    store = stats_history.StatsStore(str(tmp_path))
+    base = 1_700_000_000 - 1_700_000_000 % 3600
+    store.append(CONTAINER, base, {"cpuPercent": 10, "netRxBytes": 100})
+    store.append(CONTAINER, base + 5, {"cpuPercent": 30, "netRxBytes": 150})
+    store.append(CONTAINER, base + 10, {"cpuPercent": 50, "netRxBytes": 250, "memBytes": None})
+    fine = store.query(CONTAINER, base, base + 60, resolution=10)
+    assert [(p['t'], p['samples'], p['cpuPercent'], p['netRxBytes']) for p in fine['points']] == [
+        (base, 2, 20, 150), (base + 10, 1, 50, 250)]
+    assert fine['points'][1]['netRxRate'] == 10
+    assert fine['points'][0]['memBytes'] is None
+    coarse = store.query(CONTAINER, base, base + 60, resolution=60)
+    assert [(p['samples'], p['cpuPercent']) for p in coarse['points']] == [(3, 30)]
+
+
+def test_store_ring_overwrites_a_lap_old_slot(tmp_path):
+    store = stats_history.StatsStore(str(tmp_path))
+    resolution, slots = stats_history.TIERS[0]
+    base = 1_700_000_000 - 1_700_000_000 % (resolution * slots)
+    store.append(CONTAINER, base, {"cpuPercent": 99})
+    store.append(CONTAINER, base + resolution * slots, {"cpuPercent": 1}) # Same slot, one lap later
+    points = store.query(CONTAINER, base, base + 2 * resolution * slots, resolution=resolution)['points']
+    assert [(p['t'], p['samples'], p['cpuPercent']) for p in points] == [(base + resolution * slots, 1, 1)]
+
+
+def test_store_file_size_is_fixed(tmp_path):
+    store = stats_history.StatsStore(str(tmp_path))
+    for n in range(50):
+        store.append(CONTAINER, 1_700_000_000 + n * 10, {"cpuPercent": n})
+    assert (tmp_path / f"{CONTAINER}.ring").stat().st_size == stats_history._FILE_SIZE
+
+
+def test_store_rejects_bad_ids_and_resolutions(tmp_path):
+    store = stats_history.StatsStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.append('../etc/passwd', 0, {})
+    with pytest.raises(ValueError):
+        store.query(CONTAINER, 0, 1, resolution=7)
+    assert store.query(CONTAINER, 0, 1, resolution=10) == {"resolution": 10, "points": []}
+
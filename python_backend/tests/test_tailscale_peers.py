@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+import docker_index
+import tailscale_peers
+
+
+def _node(node_id, hostname, **fields):
+    return {"ID": node_id, "HostName": hostname, "DNSName": f"{hostname}.tail1234.ts.net.", "OS": "linux",
+            "TailscaleIPs": [f"100.64.0.{node_id}"], "UserID": 1, **fields}
+
+
+@pytest.fixture
+def status():
+    return {
+        "Self": _node(1, "laptop", OS="macOS", Online=False, LastSeen="0001-01-01T00:00:00Z"),
+        "User": {"1": {"LoginName": "me@example.com"}},
+        "Peer": {
+            "key2": _node(2, "nas", Online=True, CurAddr="203.0.113.5:41641", Relay="fra", Tags=["tag:server"]),
+            "key3": _node(3, "pi", Online=True, Relay="fra", LastSeen="0001-01-01T00:00:00Z"),
+            "key4": _node(4, "phone", OS="iOS", Online=True),
+            "key5": _node(5, "old", Online=False, LastSeen="2024-01-15T10:00:00Z"),
+        },
+    }
+
+
+def _records(status):
+    return {record['hostname']: record for record in tailscale_peers.parse_status(json.dumps(status))}
+
+
+def test_self_comes_first_flagged_and_online(status):
+    records = tailscale_peers.parse_status(json.dumps(status))
+    assert [record['hostname'] for record in records] == ['laptop', 'nas', 'pi', 'phone', 'old']
+    assert records[0]['self'] and records[0]['online'] and records[0]['connection'] == 'self'
+    assert not any(record['self'] for record in records[1:])
+
+
+def test_connection_classification(status):
+    records = _records(status)
+    assert {name: record['connection'] for name, record in records.items()} == {
+        "laptop": 'self', "nas": 'direct', "pi": 'relay', "phone": 'idle', "old": 'offline'}
+    assert records['pi']['relay'] == 'fra' and records['pi']['curAddr'] is None
+
+
+def test_zero_last_seen_is_none(status):
+    records = _records(status)
+    assert records['pi']['lastSeen'] is None and records['laptop']['lastSeen'] is None
+    assert records['old']['lastSeen'] == '2024-01-15T10:00:00Z'
+
+
+def test_record_fields(status):
+    nas = _records(status)['nas']
+    assert nas['id'] == '2' and nas['dnsName'] == 'nas.tail1234.ts.net'
+    assert (nas['user'], nas['tags'], nas['ips']) == ('me@example.com', ['tag:server'], ['100.64.0.2'])
+
+
+@pytest.mark.parametrize('stdout, expected', [
+    ('', []), ('  \n', []),
+    (json.dumps({"Self": _node(1, "laptop")}), ['laptop']), # No Peer key: a tailnet of one
+    (json.dumps({"Self": _node(1, "laptop"), "Peer": None}), ['laptop']),
+    (json.dumps({"Peer": {"k": _node(2, "nas")}}), ['nas']),
+])
+def test_missing_sections(stdout, expected):
+    assert [record['hostname'] for record in tailscale_peers.parse_status(stdout)] == expected
+
+
+@pytest.fixture
+def snapshot(status):
+    return docker_index.IndexSnapshot(tailscale_peers.parse_status(json.dumps(status)), tailscale_peers._describe_peer,
+                                      version=1, refreshed_at=0)
+
+
+def test_tags_are_labels(snapshot):
+    page = snapshot.query(labels=['tag:server'])
+    assert [item['hostname'] for item in page['items']] == ['nas']
+
+
+def test_facets_and_name_search_by_ip(snapshot):
+    assert [item['hostname'] for item in snapshot.query(facets={'connection': ['relay', 'direct']})['items']] == ['nas', 'pi']
+    assert [item['hostname'] for item in snapshot.query(facets={'online': ['false']})['items']] == ['old']
+    assert [item['hostname'] for item in snapshot.query(name='100.64.0.4')['items']] == ['phone']
+
+
+def test_online_nodes_sort_as_most_recently_seen(snapshot):
+    page = snapshot.query(sort='lastSeen', descending=True)
+    assert [item['hostname'] for item in page['items']][-1] == 'old'
@@ -0,0 +1,138 @@
+import json
+import time
+
+import pytest
+
+import shared_state
+import topology
+
+WEB = 'a' * 12 + 'f' * 52
+WORKER = 'a' * 11 + 'b' + 'e' * 52
+DB = 'c' * 64
+FRONT = '1' * 64
+BACK = '2' * 64
+
+
+def _inspect_output():
+    networks = [
+        {"Id": FRONT, "Name": "front", "Driver": "bridge", "Scope": "local", "Internal": False,
+         "IPAM": {"Config": [{"Subnet": "172.20.0.0/16"}]},
+         "Containers": {WEB: {"Name": "web", "IPv4Address": "172.20.0.2/16", "MacAddress": "02:42:ac:14:00:02"},
+                        "lb-front": {"Name": "front-endpoint"}}},
+        {"Id": BACK, "Name": "back", "Driver": "bridge", "Scope": "local", "Internal": True, "IPAM": {"Config": []},
+         "Containers": {WEB: {"Name": "web", "IPv4Address": "172.21.0.2/16"},
+                        DB: {"Name": "db", "IPv4Address": "172.21.0.3/16"}}},
+    ]
+    containers = [
+        f"{WEB} " + json.dumps({"front": {"NetworkID": FRONT, "Aliases": ["web", "www"]}}),
+        f"{WORKER} " + json.dumps({"back": {"NetworkID": BACK, "IPAddress": "172.21.0.9", "Aliases": ["worker"]}}), # Stopped
+        f"{DB} null",
+        "garbage {",
+    ]
+    return json.dumps(networks) + f"\n{topology._SECTION_SEPARATOR}\n" + '\n'.join(containers)
+
+
+def test_parse_topology():
+    networks, containers, endpoints = topology.parse_topology(_inspect_output())
+    assert networks[FRONT[:12]] == {"id": FRONT[:12], "name": "front", "driver": "bridge", "scope": "local",
+                                    "internal": False, "subnets": ["172.20.0.0/16"]}
+    assert networks[BACK[:12]]['internal'] is True
+    assert set(containers) == {WEB[:12], WORKER[:12], DB[:12]} # No swarm load-balancer endpoint
+    assert endpoints[FRONT[:12]][WEB[:12]] == {"ipv4": "172.20.0.2", "ipv6": None, "mac": "02:42:ac:14:00:02",
+                                              "aliases": ["web", "www"]}
+    assert endpoints[BACK[:12]][WORKER[:12]] == {"ipv4": "172.21.0.9", "ipv6": None, "mac": None, "aliases": ["worker"]}
+
+
+@pytest.fixture
+def graph():
+    return topology.TopologyGraph(*topology.parse_topology(_inspect_output()), version=1, refreshed_at=0)
+
+
+def test_adjacency_in_both_directions(graph):
+    assert graph.by_container[WEB[:12]] == {FRONT[:12], BACK[:12]}
+    assert set(graph.endpoints[BACK[:12]]) == {WEB[:12], WORKER[:12], DB[:12]}
+
+
+def test_view_around_a_container_includes_its_neighbours(graph):
+    view = graph.view(container='db')
+    assert [network['name'] for network in view['networks']] == ['back']
+    assert {edge['container'] for edge in view['edges']} == {WEB[:12], WORKER[:12], DB[:12]}
+
+
+def test_view_of_one_network_by_full_id(graph):
+    view = graph.view(network=FRONT)
+    assert [(edge['network'], edge['container']) for edge in view['edges']] == [(FRONT[:12], WEB[:12])]
+
+
+def test_view_of_an_unknown_or_ambiguous_node(graph):
+    with pytest.raises(topology.UnknownNodeError):
+        graph.view(container='nope')
+    with pytest.raises(topology.UnknownNodeError):
+        graph.view(container='aaaaaaaaaaa') # Prefix of both web and worker
+
+
+@pytest.fixture
+def index(monkeypatch):
+    monkeypatch.setattr(shared_state, 'store', None)
+    index = topology.TopologyIndex('topology-test')
+    index._replace(*topology.parse_topology(_inspect_output()))
+    return index
+
+
+def test_remove_container_by_full_id(index):
+    version = index.remove_container(DB)
+    graph = index._graph
+    assert version == graph.version == 2
+    assert DB[:12] not in graph.containers and DB[:12] not in graph.endpoints[BACK[:12]]
+
+
+def test_remove_container_ignores_an_ambiguous_prefix(index):
+    index.remove_container('aaaaaaaaaaa')
+    assert {WEB[:12], WORKER[:12]} <= set(index._graph.containers)
+    assert index._graph.version == 1
+
+
+def test_remove_network_by_name(index):
+    index.remove_network('front')
+    assert FRONT[:12] not in index._graph.networks and FRONT[:12] not in index._graph.endpoints
+    assert index._graph.by_container[WEB[:12]] == {BACK[:12]}
+
+
+def test_update_container_replaces_its_edges(index):
+    index.update_container(WEB, 'web-renamed', {"back": {"NetworkID": BACK, "IPAddress": "172.21.0.4", "Aliases": []}})
+    graph = index._graph
+    assert graph.by_container[WEB[:12]] == {BACK[:12]}
+    assert graph.containers[WEB[:12]]['name'] == 'web-renamed'
+    assert graph.endpoints[BACK[:12]][WEB[:12]]['ipv4'] == '172.21.0.4'
+
+
+def test_add_network(index):
+    index.add_network({"ID": '3' * 64, "Name": "new", "Driver": "overlay", "Scope": "swarm", "Internal": "true"})
+    assert index._graph.networks['3' * 12]['internal'] is True
+    assert index._graph.endpoints['3' * 12] == {}
+
+
+def test_patch_after_invalidate_waits_for_the_rebuild(index):
+    index.invalidate()
+    assert index.remove_container(DB) is None
+    assert DB[:12] in index._graph.containers
+
+
+def test_a_stale_worker_patches_the_newest_shared_graph(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_state, 'store', shared_state.SharedStore(str(tmp_path)))
+    networks, containers, endpoints = topology.parse_topology(_inspect_output())
+    stale = topology.TopologyIndex('topology-test')
+    stale._replace(networks, containers, endpoints)
+    # Another worker removes the front network after this one last read the graph.
+    other = topology.TopologyIndex('topology-test')
+    assert other._is_fresh()
+    other.remove_network('front')
+    # The stale worker's patch must keep that removal.
+    stale.remove_container(DB)
+    payload, _ = shared_state.store.load('topology-test')
+    assert FRONT[:12] not in payload['networks']
+    assert DB[:12] not in payload['containers']
+    assert payload['version'] == 3
+    fresh = topology.TopologyIndex('topology-test')
+    assert fresh._is_fresh() and fresh._graph.version == 3
+    assert time.time() - fresh._graph.refreshed_at < topology.TOPOLOGY_TTL
@@ -0,0 +1,93 @@
+import os
+import time
+
+import pytest
+
+import tracing
+
+
+def _trace(trace_id, duration=0.25):
+    trace = tracing.Trace('GET /api/docker/containers', trace_id)
+    trace.add('request', trace.started_at, duration, 'request')
+    return trace
+
+
+@pytest.fixture
+def store(tmp_path):
+    return tracing.TraceStore(str(tmp_path / 'traces'), keep=3)
+
+
+@pytest.mark.parametrize('trace_id', ['../../etc/passwd', 'a/b', '', 'x' * 65, 'id.json', '..'])
+def test_store_rejects_ids_that_are_not_plain_names(store, trace_id):
+    with pytest.raises(KeyError):
+        store.load(trace_id)
+
+
+def test_untrusted_trace_ids_are_replaced():
+    assert tracing.Trace('x', '../../etc/passwd').trace_id != '../../etc/passwd'
+    assert tracing.Trace('x', 'abc-123_DEF').trace_id == 'abc-123_DEF'
+
+
+def test_save_load_and_list(store):
+    store.save(_trace('first'))
+    document = store.load('first')
+    assert document['otherData']['traceId'] == 'first'
+    assert [(summary['traceId'], summary['durationMs']) for summary in store.list()] == [('first', 250.0)]
+    with pytest.raises(KeyError):
+        store.load('missing')
+
+
+def test_prune_keeps_the_newest_traces(store):
+    for age, trace_id in enumerate(['t4', 't3', 't2', 't1']):
+        store.save(_trace(trace_id))
+        os.utime(os.path.join(store.directory, f"{trace_id}.json"), (1000 - age * 10, 1000 - age * 10))
+    store.save(_trace('t0')) # Newest; past `keep`, the oldest files go
+    assert sorted(name for name in os.listdir(store.directory)) == ['t0.json', 't3.json', 't4.json']
+    assert [summary['traceId'] for summary in store.list()] == ['t0', 't4', 't3']
+
+
+def test_prune_drops_traces_older_than_max_age(tmp_path):
+    store = tracing.TraceStore(str(tmp_path / 'traces'), keep=10, max_age=3600)
+    store.save(_trace('old'))
+    store.save(_trace('recent'))
+    old = os.path.join(store.directory, 'old.json')
+    os.utime(old, (time.time() - 7200, time.time() - 7200))
+    store.save(_trace('new'))
+    assert sorted(os.listdir(store.directory)) == ['new.json', 'recent.json']
+
+
+def test_list_skips_unreadable_files(store):
+    store.save(_trace('good'))
+    with open(os.path.join(store.directory, 'bad.json'), 'w') as f:
+        f.write('{not json')
+    assert [summary['traceId'] for summary in store.list()] == ['good']
+
+
+def test_events_are_capped_per_trace(monkeypatch):
+    monkeypatch.setattr(tracing, 'TRACE_MAX_EVENTS', 5)
+    trace = tracing.Trace('bulk')
+    for n in range(3):
+        trace.add(f"local-{n}", 0, 0.001, 'backend')
+    trace.extend([{"name": f"relay-{n}", "ph": "X"} for n in range(10)])
+    trace.add('late', 0, 0.001, 'backend')
+    assert [event['name'] for event in trace.events] == ['local-0', 'local-1', 'local-2', 'relay-0', 'relay-1']
+    trace.extend([{"name": "more", "ph": "X"}])
+    assert len(trace.events) == 5
+
+
+def test_spans_and_merge_only_record_inside_a_trace():
+    with tracing.span('outside'):
+        pass
+    tracing.merge([{"name": "relay", "ph": "X"}])
+    assert tracing.headers() == {}
+    trace, token = tracing.start('request', 'abc')
+    try:
+        with tracing.span('parse', index='containers'):
+            pass
+        tracing.merge([{"name": "relay.exec", "ph": "X"}])
+        assert tracing.headers() == {tracing.TRACE_ID_HEADER: 'abc'}
+    finally:
+        tracing.finish(token)
+    assert [event['name'] for event in trace.events] == ['parse', 'relay.exec']
+    assert trace.events[0]['args'] == {"index": "containers"}
+    assert tracing.current() is None
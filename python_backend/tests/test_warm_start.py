@@ -0,0 +1,54 @@
+import gzip
+import threading
+
+import warm_start
+
+
+class FakeCache:
+    def __init__(self, version=0, data=None):
+        self.version, self.data, self.seeded = version, data, None
+
+    def export(self):
+        return {"version": self.version, "refreshedAt": 100, "data": self.data} if self.version else None
+
+    def seed(self, data, version, refreshed_at):
+        self.seeded = (data, version, refreshed_at)
+
+
+def test_save_and_restore(tmp_path):
+    path = str(tmp_path / 'snapshot.json.gz')
+    assert warm_start.SnapshotFile(path, {"a": FakeCache(3, [1, 2])}).save()
+    target = FakeCache()
+    assert warm_start.SnapshotFile(path, {"a": target, "b": FakeCache()}).restore() == 1
+    assert target.seeded == ([1, 2], 3, 100)
+
+
+def test_save_skips_unchanged_versions(tmp_path):
+    snapshot = warm_start.SnapshotFile(str(tmp_path / 'snapshot.json.gz'), {"a": FakeCache(1, 'x')})
+    assert snapshot.save()
+    assert not snapshot.save()
+    assert snapshot.save(force=True)
+
+
+def test_restore_ignores_truncated_gzip(tmp_path):
+    path = tmp_path / 'snapshot.json.gz'
+    warm_start.SnapshotFile(str(path), {"a": FakeCache(1, list(range(1000)))}).save()
+    path.write_bytes(path.read_bytes()[:40])
+    assert warm_start.SnapshotFile(str(path), {"a": FakeCache()}).restore() == 0
+
+
+def test_restore_ignores_garbage(tmp_path):
+    path = tmp_path / 'snapshot.json.gz'
+    path.write_bytes(gzip.compress(b'{"format": 1, "sections": ') + b'\x00garbage')
+    assert warm_start.SnapshotFile(str(path), {"a": FakeCache()}).restore() == 0
+
+
+def test_concurrent_saves_leave_a_readable_file(tmp_path):
+    path = str(tmp_path / 'snapshot.json.gz')
+    snapshot = warm_start.SnapshotFile(path, {"a": FakeCache(1, ['x' * 100] * 2000)})
+    threads = [threading.Thread(target=snapshot.save, kwargs={"force": True}) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert warm_start.SnapshotFile(path, {"a": FakeCache()}).restore() == 1
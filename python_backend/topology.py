@@ -0,0 +1,334 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from host_caller import exec_host_command, RelayBusyError
+import docker_index
+import shared_state
+import tracing
+
+# The container <-> network graph behind /api/docker/topology. One relay call inspects every network at once
+# (endpoints with their IPs and MACs, drivers, subnets) and, in the same shell, reads every container's network
+# aliases, which `docker network inspect` does not report. The result is held as an adjacency index in both
+# directions and patched in place when a container is re-read after a mutation (connect/disconnect, stop...)
+# or a network is created or removed, so the UI does not have to inspect networks and containers one by one.
+# IDs are shortened to 12 characters, like the `docker ps` / `docker network ls` records of docker_index.
+TOPOLOGY_TTL = float(os.environ.get('TOPOLOGY_TTL', 15))
+_SECTION_SEPARATOR = '---tailbrain-topology---'
+_SHORT_ID = 12
+
+
+class UnknownNodeError(LookupError):
+    """A requested network or container is not in the graph."""
+
+
+def _short(identifier):
+    return (identifier or '')[:_SHORT_ID]
+
+
+def _resolve(nodes, wanted):
+    """Finds a node by full or short ID, unambiguous ID prefix or name. Returns its key, or None."""
+    if _short(wanted) in nodes:
+        return _short(wanted)
+    matches = [node_id for node_id, node in nodes.items() if node_id.startswith(wanted) or node['name'] == wanted]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _endpoint(ipv4=None, ipv6=None, mac=None, aliases=None):
+    # docker network inspect reports addresses in CIDR notation; container inspect reports them bare.
+    return {
+        "ipv4": ipv4.split('/')[0] if ipv4 else None,
+        "ipv6": ipv6.split('/')[0] if ipv6 else None,
+        "mac": mac or None,
+        "aliases": aliases or [],
+    }
+
+
+class TopologyGraph:
+    """
+    One version of the graph: network and container nodes, and the endpoints joining them,
+    indexed by network (`endpoints`) and by container (`by_container`).
+    """
+
+    def __init__(self, networks, containers, endpoints, version, refreshed_at):
+        self.networks = networks # network id -> {id, name, driver, scope, internal, subnets}
+        self.containers = containers # container id -> {id, name}
+        self.endpoints = endpoints # network id -> {container id -> endpoint}
+        self.version = version
+        self.refreshed_at = refreshed_at
+        self.by_container = {}
+        for network_id, attached in endpoints.items():
+            for container_id in attached:
+                self.by_container.setdefault(container_id, set()).add(network_id)
+
+    def export(self):
+        return {"networks": self.networks, "containers": self.containers, "endpoints": self.endpoints,
+                "version": self.version}
+
+    def view(self, network=None, container=None):
+        """
+        The graph as {'networks', 'containers', 'edges', 'version', 'refreshedAt'}, or only the part around one
+        network (its containers) or one container (its networks and everything attached to them).
+        Raises:
+            UnknownNodeError: If the requested network or container is not in the graph.
+        """
+        network_ids = set(self.networks)
+        if container:
+            container_id = _resolve(self.containers, container)
+            if container_id is None:
+                raise UnknownNodeError(f"No container '{container}' in the topology")
+            network_ids = self.by_container.get(container_id, set())
+        if network:
+            network_id = _resolve(self.networks, network)
+            if network_id is None:
+                raise UnknownNodeError(f"No network '{network}' in the topology")
+            network_ids = network_ids & {network_id}
+        edges = [{"network": network_id, "container": container_id, **endpoint}
+                 for network_id in sorted(network_ids)
+                 for container_id, endpoint in sorted(self.endpoints.get(network_id, {}).items())]
+        container_ids = {edge['container'] for edge in edges}
+        return {
+            "networks": [self.networks[network_id] for network_id in sorted(network_ids)],
+            "containers": [self.containers[container_id] for container_id in sorted(container_ids)],
+            "edges": edges,
+            "version": self.version,
+            "refreshedAt": self.refreshed_at,
+        }
+
+
+def parse_topology(stdout):
+    """
+    Parses the output of the refresh command: a `docker network inspect` JSON array, the separator, then one
+    '<container id> <NetworkSettings.Networks JSON>' line per container.
+    Returns:
+        tuple: (networks, containers, endpoints) as held by TopologyGraph.
+    """
+    networks_output, _, containers_output = stdout.partition(_SECTION_SEPARATOR)
+    networks, containers, endpoints = {}, {}, {}
+    for network in json.loads(networks_output or '[]') or []:
+        network_id = _short(network.get('Id'))
+        networks[network_id] = {
+            "id": network_id,
+            "name": network.get('Name'),
+            "driver": network.get('Driver'),
+            "scope": network.get('Scope'),
+            "internal": bool(network.get('Internal')),
+            "subnets": [config.get('Subnet') for config in ((network.get('IPAM') or {}).get('Config') or []) if config.get('Subnet')],
+        }
+        attached = endpoints[network_id] = {}
+        for container_id, endpoint in (network.get('Containers') or {}).items():
+            if container_id.startswith('lb-'): # Swarm load-balancer endpoints, not containers
+                continue
+            container_id = _short(container_id)
+            containers[container_id] = {"id": container_id, "name": endpoint.get('Name')}
+            attached[container_id] = _endpoint(endpoint.get('IPv4Address'), endpoint.get('IPv6Address'), endpoint.get('MacAddress'))
+
+    for line in containers_output.splitlines():
+        container_id, _, settings = line.strip().partition(' ')
+        if not settings or settings == 'null':
+            continue
+        try:
+            attachments = json.loads(settings)
+        except json.JSONDecodeError as e:
+            logging.warning(f"Skipping unparseable network settings of container {container_id}: {e}")
+            continue
+        _attach(networks, containers, endpoints, _short(container_id), None, attachments)
+    return networks, containers, endpoints
+
+
+def _attach(networks, containers, endpoints, container_id, name, attachments):
+    """
+    Records a container's `.NetworkSettings.Networks` (network name -> settings). Endpoints already known from
+    the network inspect keep their addresses and gain the aliases; the others (stopped containers) are added.
+    """
+    for settings in (attachments or {}).values():
+        network_id = _short(settings.get('NetworkID'))
+        if network_id not in networks:
+            continue
+        known = endpoints.setdefault(network_id, {}).get(container_id)
+        if known is None:
+            endpoints[network_id][container_id] = _endpoint(settings.get('IPAddress'), settings.get('GlobalIPv6Address'),
+                                                            settings.get('MacAddress'), settings.get('Aliases'))
+        else:
+            known['aliases'] = settings.get('Aliases') or []
+        if container_id not in containers:
+            containers[container_id] = {"id": container_id, "name": name}
+    if name and container_id in containers:
+        containers[container_id]['name'] = name
+
+
+class TopologyIndex:
+    """
+    Caches the topology graph, re-built at most once per TOPOLOGY_TTL seconds and shared between workers
+    through shared_state like docker_index.ResourceIndex. Mutations patch it instead of waiting for the TTL.
+    """
+
+    def __init__(self, name='topology', ttl=TOPOLOGY_TTL):
+        self.name = name
+        self.ttl = ttl
+        self._graph = None
+        self._stale = False
+        self._invalidated_at = 0
+        self._lock = threading.Lock()
+
+    def graph(self, force_refresh=False):
+        """
+        Returns the current graph, rebuilding it first if it is older than the TTL (or if forced).
+        When the relay sheds the rebuild (RelayBusyError), the previous graph is returned instead.
+        """
+        shared_state.record_activity()
+        if not force_refresh and self._is_fresh():
+            return self._graph
+        with self._lock:
+            if not force_refresh and self._is_fresh():
+                return self._graph
+            try:
+                return self.refresh()
+            except RelayBusyError as e:
+                if force_refresh or self._graph is None:
+                    raise
+                logging.warning(f"Serving the previous {self.name} graph, relay is busy: {e}")
+                return self._graph
+
+    def _is_fresh(self):
+        if shared_state.store is not None:
+            refreshed_at = self._adopt_shared()
+            return refreshed_at is not None and time.time() - refreshed_at < self.ttl
+        current = self._graph
+        return current is not None and not self._stale and time.time() - current.refreshed_at < self.ttl
+
+    def _adopt_shared(self):
+        """
+        Adopts the graph last published by any worker, unless this worker invalidated it since.
+        Returns:
+            float: When that graph was built, or None if there is nothing to adopt.
+        """
+        payload, refreshed_at = shared_state.store.load(self.name)
+        if payload is None:
+            return None
+        if self._stale and refreshed_at <= self._invalidated_at:
+            return None # Invalidated here, and nobody has rebuilt it since
+        self._stale = False
+        if self._graph is None or self._graph.version != payload['version']:
+            self._graph = TopologyGraph(payload['networks'], payload['containers'], payload['endpoints'],
+                                        payload['version'], refreshed_at)
+        return refreshed_at
+
+    def refresh(self):
+        """Inspects every indexed network and container in a single relay call and replaces the graph."""
+        network_ids = list(docker_index.network_index.snapshot().by_id)
+        container_ids = list(docker_index.container_index.snapshot().by_id)
+        if not network_ids:
+            return self._replace({}, {}, {})
+        command = f"docker network inspect {' '.join(network_ids)} && echo {_SECTION_SEPARATOR}"
+        if container_ids:
+            # Only needed for the aliases: a container removed since the listing must not fail the whole refresh.
+            command += (f" && (docker container inspect --format \"{{{{.Id}}}} {{{{json .NetworkSettings.Networks}}}}\""
+                        f" {' '.join(container_ids)} || true)")
+        try:
+            result = exec_host_command(command)
+        except RelayBusyError:
+            raise
+        except ValueError:
+            # Most likely a network removed since it was listed; the next read lists again.
+            docker_index.network_index.invalidate()
+            raise
+        with tracing.span("parse", index=self.name):
+            try:
+                networks, containers, endpoints = parse_topology(result['stdout'])
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Failed to parse docker network inspect output: {e}") from e
+            indexed = docker_index.container_index.peek().by_id
+            for container_id, container in containers.items():
+                record = indexed.get(container_id)
+                if record is not None:
+                    container['name'] = record.get('Names') or container['name']
+            return self._replace(networks, containers, endpoints)
+
+    def _replace(self, networks, containers, endpoints, refreshed_at=None):
+        current = self._graph
+        version = current.version if current else 0
+        if shared_state.store is not None:
+            payload, _ = shared_state.store.load(self.name)
+            version = max(version, payload['version'] if payload else 0) # Monotonic across workers
+        if current is None or (current.networks, current.containers, current.endpoints) != (networks, containers, endpoints):
+            version += 1
+        self._graph = TopologyGraph(networks, containers, endpoints, version, refreshed_at or time.time())
+        if refreshed_at is None:
+            self._stale = False
+        if shared_state.store is not None:
+            shared_state.store.publish(self.name, self._graph.export(), self._graph.refreshed_at)
+        return self._graph
+
+    def _patch(self, change):
+        """
+        Applies change(networks, containers, endpoints) to copies of the current graph. Returns the new version.
+        The newest shared graph is adopted first, so a worker holding an older copy does not publish over it.
+        """
+        with self._lock:
+            if shared_state.store is not None:
+                self._adopt_shared()
+            current = self._graph
+            if current is None or self._stale:
+                return None # The next read builds everything anyway
+            networks = dict(current.networks)
+            containers = dict(current.containers)
+            endpoints = {network_id: dict(attached) for network_id, attached in current.endpoints.items()}
+            change(networks, containers, endpoints)
+            return self._replace(networks, containers, endpoints, refreshed_at=current.refreshed_at).version
+
+    def update_container(self, container_id, name, attachments):
+        """Replaces a container's edges with its freshly inspected `.NetworkSettings.Networks`."""
+        container_id = _short(container_id)
+
+        def change(networks, containers, endpoints):
+            for attached in endpoints.values():
+                attached.pop(container_id, None)
+            containers.pop(container_id, None)
+            _attach(networks, containers, endpoints, container_id, name, attachments)
+        version = self._patch(change)
+        current = self._graph
+        if current is not None and any(settings.get('NetworkID') and _short(settings['NetworkID']) not in current.networks
+                                       for settings in (attachments or {}).values()):
+            self.invalidate() # Attached to a network created outside of TailBrain
+        return version
+
+    def remove_container(self, container_id):
+        """Removes a container (full or short ID, unambiguous prefix or name) and its edges."""
+        def change(networks, containers, endpoints):
+            resolved = _resolve(containers, container_id)
+            containers.pop(resolved, None)
+            for attached in endpoints.values():
+                attached.pop(resolved, None)
+        return self._patch(change)
+
+    def add_network(self, record):
+        """Adds a network from its `docker network ls` record (e.g. right after it was created)."""
+        network_id = _short(record.get('ID'))
+
+        def change(networks, containers, endpoints):
+            networks[network_id] = {"id": network_id, "name": record.get('Name'), "driver": record.get('Driver'),
+                                    "scope": record.get('Scope'), "internal": record.get('Internal') == 'true',
+                                    "subnets": []}
+            endpoints.setdefault(network_id, {})
+        return self._patch(change)
+
+    def remove_network(self, network_id):
+        """Removes a network (full or short ID, unambiguous prefix or name) and its edges."""
+        def change(networks, containers, endpoints):
+            resolved = _resolve(networks, network_id)
+            networks.pop(resolved, None)
+            endpoints.pop(resolved, None)
+        return self._patch(change)
+
+    def invalidate(self):
+        """Forces the next read (in any worker) to rebuild the graph."""
+        self._stale = True
+        self._invalidated_at = time.time()
+        if shared_state.store is not None:
+            shared_state.store.invalidate(self.name)
+
+
+topology_index = TopologyIndex()
@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Request tracing. Every API request gets a trace ID, sent to the relay with each host command, and both sides
+# record timed spans (queueing for a relay slot, the HTTP hop, spawn, execution, reading and parsing output).
+# A trace is written as Chrome trace JSON (chrome://tracing, https://ui.perfetto.dev) when it is slow or asked for.
+# Shared by host_command_relay.py, which records its spans into the trace ID it receives and sends them back.
+TRACE_ID_HEADER = 'X-Trace-Id'
+TRACE_MAX_EVENTS = 5000 # Per trace; a bulk action over thousands of containers stops recording past this
+_TRACE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+_current = contextvars.ContextVar('tailbrain_trace', default=None)
+
+
+class Trace:
+    """The spans recorded for one request, in Chrome trace event format (complete 'X' events, microseconds)."""
+
+    def __init__(self, name, trace_id=None, process_name='backend'):
+        self.name = name
+        self.trace_id = trace_id if trace_id and _TRACE_ID_PATTERN.match(trace_id) else uuid.uuid4().hex[:16]
+        self.process_name = process_name
+        self.started_at = time.time()
+        self.events = []
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, start, duration, category, args=None):
+        thread = threading.current_thread()
+        event = {"name": name, "cat": category, "ph": "X", "ts": int(start * 1e6), "dur": int(duration * 1e6),
+                 "pid": os.getpid(), "tid": thread.ident}
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._threads[thread.ident] = thread.name
+            if len(self.events) < TRACE_MAX_EVENTS:
+                self.events.append(event)
+
+    def extend(self, events):
+        """Adds events recorded by another process (the relay), which come with their own metadata events."""
+        with self._lock:
+            self.events.extend(events[:max(0, TRACE_MAX_EVENTS - len(self.events))])
+
+    def export_events(self):
+        """The recorded events plus the metadata events naming this process and its threads."""
+        pid = os.getpid()
+        with self._lock:
+            metadata = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": self.process_name}}]
+            metadata += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": ident, "args": {"name": name}}
+                         for ident, name in self._threads.items()]
+            return metadata + list(self.events)
+
+    def to_chrome(self):
+        return {
+            "traceEvents": self.export_events(),
+            "displayTimeUnit": "ms",
+            "otherData": {"traceId": self.trace_id, "name": self.name, "startedAt": self.started_at},
+        }
+
+
+def start(name, trace_id=None, process_name='backend'):
+    """Starts a trace in the current context. Returns (trace, token); pass the token to finish()."""
+    trace = Trace(name, trace_id, process_name)
+    return trace, _current.set(trace)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def span(name, category='backend', **args):
+    """Times the enclosed block as a span of the current trace (a no-op outside of one)."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started, counter = time.time(), time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, started, time.perf_counter() - counter, category, args)
+
+
+def record(name, start, duration, category='backend', **args):
+    """Adds a span measured elsewhere (start: epoch seconds, duration: seconds) to the current trace."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, start, duration, category, args)
+
+
+def merge(events):
+    """Adds events recorded by the relay for the current trace."""
+    trace = _current.get()
+    if trace is not None and events:
+        trace.extend(events)
+
+
+def headers():
+    """Headers propagating the current trace to the relay."""
+    trace = _current.get()
+    return {TRACE_ID_HEADER: trace.trace_id} if trace is not None else {}
+
+
+class TraceStore:
+    """Saved traces, one Chrome trace JSON file per trace ID, keeping the most recent `keep` and, when `max_age`
+    (seconds) is set, only those saved within it."""
+
+    def __init__(self, directory, keep=200, max_age=None):
+        self.directory = directory
+        self.keep = keep
+        self.max_age = max_age
+
+    def _path(self, trace_id):
+        if not _TRACE_ID_PATTERN.match(trace_id):
+            raise KeyError(trace_id)
+        return os.path.join(self.directory, f"{trace_id}.json")
+
+    def save(self, trace):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(trace.trace_id)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(trace.to_chrome(), f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+            self._prune()
+        except OSError as e:
+            logging.error(f"Could not save trace {trace.trace_id}: {e}")
+
+    def _prune(self):
+        files = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')),
+                       key=lambda entry: entry.stat().st_mtime)
+        expired = 0
+        if self.max_age:
+            cutoff = time.time() - self.max_age
+            expired = sum(1 for entry in files if entry.stat().st_mtime < cutoff)
+        for entry in files[:max(expired, len(files) - self.keep)]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass # Pruned by another worker
+
+    def list(self):
+        """Returns [{traceId, name, durationMs, savedAt}], newest first."""
+        summaries = []
+        try:
+            entries = sorted(os.scandir(self.directory), key=lambda entry: entry.stat().st_mtime, reverse=True)
+        except FileNotFoundError:
+            return []
+        for entry in entries:
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    document = json.load(f)
+            except (OSError, ValueError):
+                continue
+            root = next((event for event in document['traceEvents'] if event.get('cat') == 'request'), None)
+            summaries.append({
+                "traceId": document['otherData']['traceId'],
+                "name": document['otherData']['name'],
+                "durationMs": round(root['dur'] / 1000, 1) if root else None,
+                "savedAt": entry.stat().st_mtime,
+            })
+        return summaries
+
+    def load(self, trace_id):
+        """
+        Returns the saved Chrome trace document.
+        Raises:
+            KeyError: If there is no saved trace with this ID.
+        """
+        try:
+            with open(self._path(trace_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(trace_id)
@@ -0,0 +1,79 @@
+import os
+import zlib
+import gzip
+import json
+import time
+import logging
+import threading
+
+# How often the leader persists the last known state (only written when something changed).
+SNAPSHOT_INTERVAL = float(os.environ.get('SNAPSHOT_INTERVAL', 60))
+SNAPSHOT_FORMAT = 1
+
+
+class SnapshotFile:
+    """
+    Persists the last known state of several caches (ResourceIndex / CachedCommand objects, anything with
+    export() and seed()) as one gzipped JSON document, and restores it on boot so the dashboard has data
+    to show before the first round of host commands has completed.
+    """
+
+    def __init__(self, path, sources):
+        self.path = path
+        self.sources = sources # {name: cache}
+        self._saved_versions = {}
+        self._save_lock = threading.Lock() # The leader task and the atexit hook may save at the same time
+
+    def restore(self):
+        """Seeds every source from the snapshot file. Returns the number of sections restored."""
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                document = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError, EOFError, zlib.error) as e: # Truncated or corrupt gzip data included
+            logging.warning(f"Ignoring unreadable state snapshot {self.path}: {e}")
+            return 0
+        if document.get('format') != SNAPSHOT_FORMAT:
+            logging.info(f"Ignoring state snapshot {self.path} written in an older format")
+            return 0
+
+        restored = 0
+        for name, section in document.get('sections', {}).items():
+            source = self.sources.get(name)
+            if source is None:
+                continue
+            source.seed(section['data'], section['version'], section['refreshedAt'])
+            self._saved_versions[name] = section['version']
+            restored += 1
+        age = time.time() - document.get('savedAt', 0)
+        logging.info(f"Restored {restored} cached sections from {self.path} (saved {age:.0f}s ago); serving them as stale until refreshed")
+        return restored
+
+    def save(self, force=False):
+        """Writes the snapshot if any source changed since the last save (or if forced). Returns whether it wrote."""
+        with self._save_lock:
+            return self._save(force)
+
+    def _save(self, force):
+        sections = {}
+        for name, source in self.sources.items():
+            exported = source.export()
+            if exported is not None:
+                sections[name] = exported
+        versions = {name: section['version'] for name, section in sections.items()}
+        if not sections or (versions == self._saved_versions and not force):
+            return False
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            # Compact separators and gzip: thousands of containers still make for a small file.
+            with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+                json.dump({"format": SNAPSHOT_FORMAT, "savedAt": time.time(), "sections": sections}, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Could not write state snapshot {self.path}: {e}")
+            return False
+        self._saved_versions = versions
+        logging.debug(f"Saved state snapshot to {self.path}")
+        return True
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+
+"""
+Relay Process Launcher
+
+Spawns the commands host_command_relay.py executes.
+subprocess.run(shell=True) forks the relay (a Flask process) and then execs /bin/sh, which in turn
+forks and execs the real command. For the short commands the backend sends (docker inspect, tailscale status)
+that overhead dominates. This launcher:
+  - uses posix_spawn, which glibc implements with vfork semantics, so the relay's address space is never copied;
+  - execs the command directly when it does not need the shell (no pipes, redirects, expansions, 'cd ... &&').
+It falls back to subprocess.run(shell=True) on platforms without posix_spawn (Windows).
+Output is captured into spooled files (memory up to RELAY_SPILL_THRESHOLD, then disk) and capped at
+RELAY_MAX_OUTPUT_BYTES per stream, so one huge inspect cannot balloon the relay's memory.
+
+Run it directly to benchmark spawn latency under concurrent load:
+    python relay_launcher.py --concurrency 8 --iterations 400
+"""
+
+import os
+import sys
+import time
+import shlex
+import logging
+import tempfile
+import selectors
+import subprocess
+
+HAS_POSIX_SPAWN = hasattr(os, 'posix_spawnp') and sys.platform != 'win32'
+SHELL_PATH = '/bin/sh'
+# Outside quotes, any of these means the command relies on the shell (operators, expansions, globbing).
+_SHELL_CHARS = set('|&;<>()$`\\*?[]{}~#\n')
+# Inside double quotes the shell still expands these.
+_DOUBLE_QUOTED_SHELL_CHARS = set('$`\\')
+_READ_SIZE = 65536
+# Per stream: output beyond the spill threshold goes to a temp file, output beyond the maximum is dropped.
+SPILL_THRESHOLD = int(os.environ.get('RELAY_SPILL_THRESHOLD', 1024 * 1024))
+MAX_OUTPUT_BYTES = int(os.environ.get('RELAY_MAX_OUTPUT_BYTES', 64 * 1024 * 1024))
+
+
+class _OutputSink:
+    """A spooled file that keeps the first `limit` bytes written to it and counts the rest."""
+
+    def __init__(self, limit):
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPILL_THRESHOLD)
+        self.limit = limit
+        self.total = 0
+
+    def write(self, data):
+        room = self.limit - self.total
+        if room > 0:
+            self.file.write(data[:room])
+        self.total += len(data)
+
+
+class CapturedOutput:
+    """
+    Result of run_captured(): the exit code plus stdout/stderr as binary file objects
+    (spooled to disk past SPILL_THRESHOLD). Call close() to release them.
+    timings maps 'spawn' and 'exec' to (start epoch seconds, duration seconds), for tracing.
+    """
+
+    def __init__(self, returncode, stdout_sink, stderr_sink, timings=None):
+        self.returncode = returncode
+        self.timings = timings or {}
+        self.stdout = stdout_sink.file
+        self.stderr = stderr_sink.file
+        self.stdout_total = stdout_sink.total # Bytes produced by the command
+        self.stderr_total = stderr_sink.total
+        self.stdout_size = min(stdout_sink.total, stdout_sink.limit) # Bytes kept
+        self.stderr_size = min(stderr_sink.total, stderr_sink.limit)
+        self.truncated = self.stdout_size < self.stdout_total or self.stderr_size < self.stderr_total
+
+    def replace(self, name, stream, size):
+        """Swaps 'stdout' or 'stderr' for a transformed copy (e.g. a projection of it), closing the original."""
+        getattr(self, name).close()
+        setattr(self, name, stream)
+        setattr(self, f"{name}_size", size)
+
+    def new_stream(self):
+        return tempfile.SpooledTemporaryFile(max_size=SPILL_THRESHOLD)
+
+    def read_text(self, stream):
+        stream.seek(0)
+        return _to_text(stream.read())
+
+    def close(self):
+        self.stdout.close()
+        self.stderr.close()
+
+
+def needs_shell(command):
+    """
+    Tells whether a command string has to be interpreted by /bin/sh, or can be split with shlex and executed directly.
+    Args:
+        command (str): The command line as received by the relay.
+    Returns:
+        bool: True if the command uses shell syntax outside single quotes.
+    """
+    quote = None
+    for char in command:
+        if quote == "'":
+            if char == "'":
+                quote = None
+        elif quote == '"':
+            if char == '"':
+                quote = None
+            elif char in _DOUBLE_QUOTED_SHELL_CHARS:
+                return True
+        elif char in ('"', "'"):
+            quote = char
+        elif char in _SHELL_CHARS:
+            return True
+    if quote is not None:
+        return True # Unbalanced quotes: let the shell report the error
+    first_word = command.split(None, 1)[0] if command.strip() else ''
+    return '=' in first_word # Leading VAR=value assignment
+
+
+def _to_text(data):
+    # Matches subprocess.run(text=True): universal newlines.
+    return data.decode('utf-8', errors='replace').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _collect_output(stdout_fd, stderr_fd, sinks, timeout):
+    sinks = {stdout_fd: sinks[0], stderr_fd: sinks[1]}
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with selectors.DefaultSelector() as selector:
+        selector.register(stdout_fd, selectors.EVENT_READ)
+        selector.register(stderr_fd, selectors.EVENT_READ)
+        while selector.get_map():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError
+            for key, _ in selector.select(remaining):
+                data = os.read(key.fd, _READ_SIZE)
+                if data:
+                    sinks[key.fd].write(data) # Past the limit this only counts: the pipe must still be drained
+                else:
+                    selector.unregister(key.fd)
+
+
+def _spawn_and_wait(argv, sinks, timeout, timings):
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+    file_actions = [
+        (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+        (os.POSIX_SPAWN_DUP2, stdout_w, 1),
+        (os.POSIX_SPAWN_DUP2, stderr_w, 2),
+    ]
+    try:
+        started, counter = time.time(), time.perf_counter()
+        try:
+            pid = os.posix_spawnp(argv[0], argv, os.environ, file_actions=file_actions)
+        finally:
+            os.close(stdout_w)
+            os.close(stderr_w)
+        spawned = time.perf_counter()
+        timings['spawn'] = (started, spawned - counter)
+        try:
+            _collect_output(stdout_r, stderr_r, sinks, timeout)
+        except TimeoutError:
+            os.kill(pid, 9)
+            os.waitpid(pid, 0)
+            raise subprocess.TimeoutExpired(argv, timeout)
+        _, status = os.waitpid(pid, 0)
+        timings['exec'] = (started + spawned - counter, time.perf_counter() - spawned)
+    finally:
+        os.close(stdout_r)
+        os.close(stderr_r)
+    return os.waitstatus_to_exitcode(status)
+
+
+def run_captured(command, timeout=None, max_output=MAX_OUTPUT_BYTES):
+    """
+    Runs a command line, capturing stdout/stderr as bytes into spooled files capped at max_output bytes each.
+    Args:
+        command (str): The command line to execute.
+        timeout (float, optional): Seconds to wait before killing the command.
+        max_output (int): Bytes kept per stream; the rest is counted but dropped.
+    Returns:
+        CapturedOutput: Exit code and output streams (the caller closes it).
+    Raises:
+        subprocess.TimeoutExpired: If the timeout elapsed.
+    """
+    sinks = (_OutputSink(max_output), _OutputSink(max_output))
+    timings = {}
+    if not HAS_POSIX_SPAWN:
+        started, counter = time.time(), time.perf_counter()
+        process = subprocess.run(command, shell=True, capture_output=True, check=False, timeout=timeout)
+        timings['exec'] = (started, time.perf_counter() - counter) # Spawn and execution, not told apart
+        sinks[0].write(process.stdout)
+        sinks[1].write(process.stderr)
+        return CapturedOutput(process.returncode, *sinks, timings)
+
+    argv = [SHELL_PATH, '-c', command] if needs_shell(command) else shlex.split(command)
+    if not argv:
+        return CapturedOutput(0, *sinks)
+    try:
+        returncode = _spawn_and_wait(argv, sinks, timeout, timings)
+    except FileNotFoundError:
+        # Same outcome the shell would have produced for an unknown command
+        returncode = 127
+        sinks[1].write(f"{argv[0]}: not found\n".encode('utf-8'))
+    except PermissionError:
+        returncode = 126
+        sinks[1].write(f"{argv[0]}: Permission denied\n".encode('utf-8'))
+    return CapturedOutput(returncode, *sinks, timings)
+
+
+def run(command, timeout=None):
+    """
+    Runs a command line and captures its output, like subprocess.run(command, shell=True, capture_output=True, text=True)
+    (output capped at MAX_OUTPUT_BYTES per stream).
+    Args:
+        command (str): The command line to execute.
+        timeout (float, optional): Seconds to wait before killing the command.
+    Returns:
+        subprocess.CompletedProcess: With returncode, stdout and stderr (str).
+    Raises:
+        subprocess.TimeoutExpired: If the timeout elapsed.
+    """
+    captured = run_captured(command, timeout)
+    try:
+        return subprocess.CompletedProcess(command, captured.returncode,
+                                           captured.read_text(captured.stdout), captured.read_text(captured.stderr))
+    finally:
+        captured.close()
+
+
+def _benchmark(runner, command, concurrency, iterations):
+    from concurrent.futures import ThreadPoolExecutor
+
+    def timed_call(_):
+        started = time.perf_counter()
+        runner(command)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(executor.map(timed_call, range(iterations)))
+    elapsed = time.perf_counter() - started
+    return {
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "max": latencies[-1] * 1000,
+        "throughput": iterations / elapsed,
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Benchmark command spawn latency: subprocess.run(shell=True) vs relay_launcher.run.")
+    parser.add_argument('--command', default='uname -s', help="Command line to spawn (default: 'uname -s').")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent spawning threads (default: 8).")
+    parser.add_argument('--iterations', type=int, default=400, help="Commands per run (default: 400).")
+    parser.add_argument('--ballast-mb', type=int, default=200,
+                        help="Memory to allocate first, standing in for a long-running relay's heap (default: 200).")
+    args = parser.parse_args()
+
+    import host_command_relay # noqa: F401 -- load Flask & co. like the real relay process
+    ballast = bytearray(args.ballast_mb * 1024 * 1024) # noqa: F841 -- touched pages make fork() expensive
+    for offset in range(0, len(ballast), 4096):
+        ballast[offset] = 1
+
+    runners = {
+        "subprocess.run(shell=True)": lambda c: subprocess.run(c, shell=True, capture_output=True, text=True, check=False),
+        "relay_launcher.run": run,
+    }
+    logging.info(f"command={args.command!r} concurrency={args.concurrency} iterations={args.iterations} ballast={args.ballast_mb}MB "
+                 f"posix_spawn={HAS_POSIX_SPAWN} direct_exec={not needs_shell(args.command)}")
+    for name, runner in runners.items():
+        _benchmark(runner, args.command, args.concurrency, min(args.iterations, 20)) # warm-up
+        result = _benchmark(runner, args.command, args.concurrency, args.iterations)
+        logging.info(f"{name:<28} p50 {result['p50']:7.2f}ms  p95 {result['p95']:7.2f}ms  max {result['max']:7.2f}ms  "
+                     f"{result['throughput']:8.1f} cmd/s")
@@ -8,6 +8,12 @@ import signal
 import webbrowser
 import shutil
 import platform
+import json
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 
 # --- Dependency Check ---
@@ -36,6 +42,15 @@ DOCKER_COMPOSE_CMD_NAME = "docker-compose" # Default, can be "docker compose"
 APP_URL = "http://localhost:7654"
 RELAY_HEALTH_URL = "http://localhost:7655/health"
 APP_HEALTH_URL = f"{APP_URL}/api/health"
+# Discovered tool paths are cached here between runs and re-validated (path + mtime) instead of re-probed.
+TOOL_CACHE_FILE = Path(__file__).resolve().parent / ".tailbrain-tools.json"
+# The image is labelled with a hash of everything that goes into it, so unchanged sources skip the rebuild.
+APP_IMAGE = "tailbrain:latest" # Must match `image:` in docker-compose.yml
+BUILD_HASH_LABEL = "tailbrain.build-hash"
+BUILD_INPUTS = ["Dockerfile", "docker-compose.yml", ".dockerignore", "frontend", "python_backend"]
+BUILD_INPUT_EXCLUDES = {"node_modules", "dist", "build", "__pycache__", ".vite"}
+RELAY_HEALTH_DEADLINE = 20 # seconds
+APP_HEALTH_DEADLINE = 60 # seconds
 
 processes = {
     "relay": None,
@@ -49,32 +64,76 @@ COMMAND_PATHS = {
     "python": sys.executable
 }
 
+PHASE_TIMINGS = [] # (name, started, finished), monotonic seconds
+# While ask_yes_no waits for input, output from other threads (the background relay health check) is held
+# here and printed once the answer is in, instead of landing in the middle of the prompt.
+_console_lock = threading.Lock()
+_prompt_thread = None
+_held_output = []
+
 # --- Helper Functions ---
+@contextmanager
+def timed_phase(name):
+    """Records how long a startup phase took, for the breakdown printed at the end."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        PHASE_TIMINGS.append((name, started, time.monotonic()))
+
+def print_phase_timings():
+    print_header("Startup Timing")
+    for name, started, finished in PHASE_TIMINGS:
+        print(f"  {name:<40} {finished - started:7.2f}s")
+    if PHASE_TIMINGS:
+        # Wall clock from the first phase to the last: background phases overlap the others, so no sum.
+        total = max(finished for _, _, finished in PHASE_TIMINGS) - min(started for _, started, _ in PHASE_TIMINGS)
+        print(f"  {'Total (wall clock)':<40} {total:7.2f}s")
+
+def emit(message=""):
+    """print() for anything that may run outside the main thread; held back while a prompt is waiting."""
+    with _console_lock:
+        if _prompt_thread is not None and _prompt_thread is not threading.current_thread():
+            _held_output.append(message)
+        else:
+            print(message)
+
 def print_header(message):
-    print("\n" + "=" * 60)
-    print(f"=== {message.upper()} ")
-    print("=" * 60)
+    emit("\n" + "=" * 60)
+    emit(f"=== {message.upper()} ")
+    emit("=" * 60)
 
 def print_success(message):
-    print(f"[SUCCESS] {message}")
+    emit(f"[SUCCESS] {message}")
 
 def print_warning(message):
-    print(f"[WARNING] {message}")
+    emit(f"[WARNING] {message}")
 
 def print_error(message):
-    print(f"[ERROR] {message}")
+    emit(f"[ERROR] {message}")
 
 def ask_yes_no(question, default_yes=True):
+    global _prompt_thread
     prompt = "(Y/n)" if default_yes else "(y/N)"
-    while True:
-        choice = input(f"{question} {prompt}: ").strip().lower()
-        if not choice:
-            return default_yes
-        if choice in ['y', 'yes']:
-            return True
-        if choice in ['n', 'no']:
-            return False
-        print_warning("Invalid input. Please enter 'y' or 'n'.")
+    with _console_lock:
+        _prompt_thread = threading.current_thread()
+    try:
+        while True:
+            choice = input(f"{question} {prompt}: ").strip().lower()
+            if not choice:
+                return default_yes
+            if choice in ['y', 'yes']:
+                return True
+            if choice in ['n', 'no']:
+                return False
+            print_warning("Invalid input. Please enter 'y' or 'n'.")
+    finally:
+        with _console_lock:
+            _prompt_thread = None
+            held = list(_held_output)
+            _held_output.clear()
+        for message in held:
+            print(message)
 
 def run_subprocess_command(command_parts, description, shell=False, check=True, capture_output=False, text=True, working_dir=None):
     cmd_str = ' '.join(command_parts) if isinstance(command_parts, list) else command_parts
@@ -149,25 +208,109 @@ def start_background_process(command_parts, name, log_file_name_base=None):
         print_error(f"Failed to start {name}: {e}")
         return None
 
-def check_service_health(url, service_name, retries=5, delay=3):
-    print(f"Checking {service_name} health at {url}...")
-    for i in range(retries):
+def check_service_health(url, service_name, deadline=APP_HEALTH_DEADLINE, process=None):
+    """
+    Polls url until it answers 200, backing off exponentially (0.1s doubling up to 2s) until the deadline.
+    Gives up early if `process` (the service's own Popen, when we started it) has already exited.
+    """
+    emit(f"Checking {service_name} health at {url} (up to {deadline}s)...")
+    started = time.monotonic()
+    delay = 0.1
+    attempts = 0
+    while True:
+        attempts += 1
+        remaining = deadline - (time.monotonic() - started)
         try:
-            response = requests.get(url, timeout=5)
+            response = requests.get(url, timeout=max(0.5, min(2, remaining)))
             if response.status_code == 200:
-                print_success(f"{service_name} is up and running!")
+                print_success(f"{service_name} is up and running! ({time.monotonic() - started:.1f}s, {attempts} attempts)")
                 return True
-        except requests.ConnectionError:
-            if i == 0: print_warning(f"Could not connect to {service_name} at {url}. Retrying...")
-        except requests.Timeout:
-            if i == 0: print_warning(f"Connection to {service_name} at {url} timed out. Retrying...")
-        
-        if i < retries - 1:
-            print(f"Retrying {service_name} health check ({i+1}/{retries})...")
-            time.sleep(delay)
-    print_error(f"{service_name} did not become healthy after {retries} retries.")
+        except (requests.ConnectionError, requests.Timeout):
+            pass
+        if process is not None and process.poll() is not None:
+            print_error(f"{service_name} exited with code {process.returncode} before becoming healthy.")
+            return False
+        remaining = deadline - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 2)
+    print_error(f"{service_name} did not become healthy within {deadline}s ({attempts} attempts).")
     return False
 
+def _load_tool_cache():
+    try:
+        with open(TOOL_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_tool_cache(cache):
+    try:
+        with open(TOOL_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        print_warning(f"Could not write tool path cache {TOOL_CACHE_FILE}: {e}")
+
+def _cached_tool(cache, name):
+    """Returns a cached probe result if the executable it points at is unchanged, else None."""
+    entry = cache.get(name)
+    if not entry or not entry.get("path"):
+        return None
+    try:
+        if os.path.getmtime(entry["path"]) != entry.get("mtime"):
+            return None
+    except OSError:
+        return None
+    return entry
+
+def _tool_entry(path, **extra):
+    return {"path": path, "mtime": os.path.getmtime(path), **extra} if path else None
+
+def probe_docker(cache):
+    """Locates docker and the compose flavour it supports. Returns a cache entry (or None if docker is missing)."""
+    cached = _cached_tool(cache, "docker")
+    # A cached standalone docker-compose must still exist; a cached "no compose" result is always re-probed.
+    if cached and cached.get("compose") and (isinstance(cached["compose"], list) or os.path.isfile(cached["compose"])):
+        return cached
+    docker_path = shutil.which("docker")
+    if not docker_path and platform.system() == "Windows":
+        for p in [Path(r"C:\Program Files\Docker\Docker\resources\bin\docker.exe")]:
+            if p.is_file(): docker_path = str(p); break
+    if not docker_path:
+        return None
+    try:
+        subprocess.run([docker_path, "compose", "version"], check=True, capture_output=True, text=True)
+        return _tool_entry(docker_path, compose=[docker_path, "compose"], compose_name="docker compose")
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        standalone = shutil.which("docker-compose")
+        if standalone:
+            return _tool_entry(docker_path, compose=standalone, compose_name="docker-compose")
+        return _tool_entry(docker_path, compose=None, compose_name=None)
+
+def probe_tailscale(cache):
+    cached = _cached_tool(cache, "tailscale")
+    if cached:
+        return cached
+    tailscale_path = shutil.which("tailscale")
+    if not tailscale_path and platform.system() == "Windows":
+        for p in [Path(r"C:\Program Files\Tailscale\tailscale.exe"), Path(r"C:\Program Files (x86)\Tailscale\tailscale.exe")]:
+            if p.is_file(): tailscale_path = str(p); break
+    return _tool_entry(tailscale_path)
+
+def probe_npm(cache):
+    return _cached_tool(cache, "npm") or _tool_entry(shutil.which("npm"))
+
+def discover_tools():
+    """Runs the prerequisite probes concurrently, reusing still-valid cached results. Returns {tool: entry}."""
+    cache = _load_tool_cache()
+    probes = {"docker": probe_docker, "tailscale": probe_tailscale, "npm": probe_npm}
+    with ThreadPoolExecutor(max_workers=len(probes)) as executor:
+        futures = {name: executor.submit(probe, cache) for name, probe in probes.items()}
+        found = {name: future.result() for name, future in futures.items()}
+    _save_tool_cache({name: entry for name, entry in found.items() if entry})
+    return found
+
 def cleanup_processes(sig=None, frame=None):
     print_header("Shutting down application")
     
@@ -202,7 +345,46 @@ def cleanup_processes(sig=None, frame=None):
     print_success("Cleanup finished. If Docker services were run with '-d', stop them with 'docker-compose down'.")
     sys.exit(0)
 
+def compute_build_hash():
+    """Hashes the path and content of every image build input (sources, lockfiles, Dockerfile, compose file)."""
+    root = Path(__file__).resolve().parent
+    digest = hashlib.sha256()
+    for entry in BUILD_INPUTS:
+        base = root / entry
+        if base.is_file():
+            files = [base]
+        elif base.is_dir():
+            files = []
+            for dirpath, dirnames, filenames in os.walk(base):
+                dirnames[:] = sorted(d for d in dirnames if d not in BUILD_INPUT_EXCLUDES)
+                files.extend(Path(dirpath) / f for f in sorted(filenames) if not f.endswith((".pyc", ".log")))
+        else:
+            continue
+        for path in files:
+            digest.update(path.relative_to(root).as_posix().encode("utf-8") + b"\0")
+            digest.update(path.read_bytes())
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+def get_image_build_hash():
+    """Returns the build hash label of the current image, or None if there is no image (or no label)."""
+    try:
+        result = subprocess.run(
+            [COMMAND_PATHS["docker"], "image", "inspect", APP_IMAGE, "--format", f'{{{{ index .Config.Labels "{BUILD_HASH_LABEL}" }}}}'],
+            capture_output=True, text=True, check=True
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError, TypeError):
+        return None
+    label = result.stdout.strip()
+    return label if label and label != "<no value>" else None
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Starts the TailBrain relay and application.")
+    parser.add_argument("--force-build", action="store_true", help="Rebuild the Docker images even if their build inputs are unchanged.")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     signal.signal(signal.SIGINT, cleanup_processes)
     signal.signal(signal.SIGTERM, cleanup_processes)
 
@@ -214,46 +396,36 @@ def main():
     COMMAND_PATHS["python"] = sys.executable
     print_success(f"Python found: {COMMAND_PATHS['python']}")
 
-    COMMAND_PATHS["docker"] = shutil.which("docker")
-    if not COMMAND_PATHS["docker"] and platform.system() == "Windows":
-        common_paths = [Path(r"C:\Program Files\Docker\Docker\resources\bin\docker.exe")]
-        for p in common_paths:
-            if p.is_file(): COMMAND_PATHS["docker"] = str(p); break
-    
+    with timed_phase("Prerequisite discovery"):
+        tools = discover_tools()
+
     DOCKER_COMPOSE_CMD_NAME_local = DOCKER_COMPOSE_CMD_NAME # Default to global
-    if COMMAND_PATHS["docker"]:
+    docker_entry = tools["docker"]
+    if docker_entry:
+        COMMAND_PATHS["docker"] = docker_entry["path"]
         print_success(f"Docker found: {COMMAND_PATHS['docker']}")
-        try:
-            # Corrected line: removed stderr=subprocess.PIPE
-            subprocess.run([COMMAND_PATHS["docker"], "compose", "version"], check=True, capture_output=True, text=True)
-            COMMAND_PATHS["docker-compose"] = [COMMAND_PATHS["docker"], "compose"]
-            DOCKER_COMPOSE_CMD_NAME_local = "docker compose" 
-            print_success(f"Docker Compose (plugin) found: {' '.join(COMMAND_PATHS['docker-compose'])}")
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            COMMAND_PATHS["docker-compose"] = shutil.which("docker-compose")
-            if COMMAND_PATHS["docker-compose"]:
-                DOCKER_COMPOSE_CMD_NAME_local = "docker-compose"
-                print_success(f"Docker Compose (standalone) found: {COMMAND_PATHS['docker-compose']}")
-            else:
-                print_error("Docker Compose not found. Please install it.")
-                prereqs_fully_met = False
+        COMMAND_PATHS["docker-compose"] = docker_entry.get("compose")
+        if COMMAND_PATHS["docker-compose"]:
+            DOCKER_COMPOSE_CMD_NAME_local = docker_entry["compose_name"]
+            shown = ' '.join(COMMAND_PATHS['docker-compose']) if isinstance(COMMAND_PATHS['docker-compose'], list) else COMMAND_PATHS['docker-compose']
+            kind = "plugin" if DOCKER_COMPOSE_CMD_NAME_local == "docker compose" else "standalone"
+            print_success(f"Docker Compose ({kind}) found: {shown}")
+        else:
+            print_error("Docker Compose not found. Please install it.")
+            prereqs_fully_met = False
     else:
         print_error("Docker command not found. Please install Docker Desktop or ensure 'docker' is in PATH.")
         prereqs_fully_met = False
 
-    COMMAND_PATHS["tailscale"] = shutil.which("tailscale")
-    if not COMMAND_PATHS["tailscale"] and platform.system() == "Windows":
-        common_paths = [Path(r"C:\Program Files\Tailscale\tailscale.exe"), Path(r"C:\Program Files (x86)\Tailscale\tailscale.exe")]
-        for p in common_paths:
-            if p.is_file(): COMMAND_PATHS["tailscale"] = str(p); break
-    if COMMAND_PATHS["tailscale"]:
+    if tools["tailscale"]:
+        COMMAND_PATHS["tailscale"] = tools["tailscale"]["path"]
         print_success(f"Tailscale found: {COMMAND_PATHS['tailscale']}")
     else:
         print_error("Tailscale command not found. Please install or ensure 'tailscale' is in PATH.")
         prereqs_fully_met = False
         
-    COMMAND_PATHS["npm"] = shutil.which("npm")
-    if COMMAND_PATHS["npm"]:
+    if tools["npm"]:
+        COMMAND_PATHS["npm"] = tools["npm"]["path"]
         print_success(f"npm found: {COMMAND_PATHS['npm']}")
     else:
         print_warning("npm (Node.js) not found. Needed for 'docker-compose build' (frontend).")
@@ -270,7 +442,8 @@ def main():
         print(f"Attempting to stop and remove any existing TailBrain Docker containers ({DOCKER_COMPOSE_CMD_NAME_local} down)...")
         cmd_parts_down = COMMAND_PATHS["docker-compose"] if isinstance(COMMAND_PATHS["docker-compose"], list) else [COMMAND_PATHS["docker-compose"]]
         try:
-            run_subprocess_command(cmd_parts_down + ["down"], f"{DOCKER_COMPOSE_CMD_NAME_local} down")
+            with timed_phase("Initial cleanup (compose down)"):
+                run_subprocess_command(cmd_parts_down + ["down"], f"{DOCKER_COMPOSE_CMD_NAME_local} down")
         except Exception:
             print_warning(f"'{DOCKER_COMPOSE_CMD_NAME_local} down' encountered an issue (this might be okay if no services were running).")
             if not ask_yes_no("Problem during cleanup. Continue with startup?", default_yes=True):
@@ -280,6 +453,8 @@ def main():
 
     print_header("Step 3: Start Host Command Relay")
     relay_start_cmd = [COMMAND_PATHS["python"], RELAY_COMMAND_SCRIPT]
+    relay_health_future = None
+    health_executor = ThreadPoolExecutor(max_workers=1)
     if processes["relay"] and processes["relay"].poll() is None:
         print_warning("Relay service seems to be already running or managed externally. Skipping start.")
     else:
@@ -290,27 +465,34 @@ def main():
             if not ask_yes_no("Continue without relay (application will likely not work)?", default_yes=False):
                 cleanup_processes()
         else:
-            print("Waiting for relay to initialize...")
-            time.sleep(3) 
-            if not check_service_health(RELAY_HEALTH_URL, "Relay Service"):
-                print_error("Relay service started but is not healthy.")
-                relay_proc_obj = processes.get("relay")
-                if relay_proc_obj:
-                    is_windows_start_cmd = (platform.system() == "Windows" and \
-                                            isinstance(relay_proc_obj.args, str) and \
-                                            relay_proc_obj.args.startswith("start "))
-                    if not is_windows_start_cmd:
-                        try: relay_proc_obj.terminate()
-                        except: pass 
-                if not ask_yes_no("Continue without a healthy relay (application will likely not work)?", default_yes=False):
-                    cleanup_processes()
+            # The image build does not need the relay, so its readiness is awaited in the background
+            # and only checked right before the application is started.
+            relay_proc_obj = processes["relay"]
+            is_windows_start_cmd = (platform.system() == "Windows" and \
+                                    isinstance(relay_proc_obj.args, str) and \
+                                    relay_proc_obj.args.startswith("start "))
+            relay_started_at = time.monotonic()
+            def wait_for_relay():
+                healthy = check_service_health(RELAY_HEALTH_URL, "Relay Service", deadline=RELAY_HEALTH_DEADLINE,
+                                               process=None if is_windows_start_cmd else relay_proc_obj)
+                PHASE_TIMINGS.append(("Relay readiness (in background)", relay_started_at, time.monotonic()))
+                return healthy
+            relay_health_future = health_executor.submit(wait_for_relay)
 
     print_header("Step 4: Build Docker Images")
     if COMMAND_PATHS["docker-compose"]:
-        if ask_yes_no(f"Build/rebuild Docker images ({DOCKER_COMPOSE_CMD_NAME_local} build)?", default_yes=True):
+        with timed_phase("Build input hashing"):
+            build_hash = compute_build_hash()
+            image_hash = get_image_build_hash()
+        # Passed to the build as a build arg (see docker-compose.yml), which ends up as the image label.
+        os.environ["TAILBRAIN_BUILD_HASH"] = build_hash
+        if not args.force_build and image_hash == build_hash:
+            print_success(f"Image {APP_IMAGE} is up to date (build inputs unchanged), skipping build. Use --force-build to rebuild anyway.")
+        elif args.force_build or ask_yes_no(f"Build/rebuild Docker images ({DOCKER_COMPOSE_CMD_NAME_local} build)?", default_yes=True):
             cmd_parts_build = COMMAND_PATHS["docker-compose"] if isinstance(COMMAND_PATHS["docker-compose"], list) else [COMMAND_PATHS["docker-compose"]]
             try:
-                run_subprocess_command(cmd_parts_build + ["build"], f"{DOCKER_COMPOSE_CMD_NAME_local} build")
+                with timed_phase("Image build"):
+                    run_subprocess_command(cmd_parts_build + ["build"], f"{DOCKER_COMPOSE_CMD_NAME_local} build")
             except Exception:
                 if not ask_yes_no("Failed to build Docker images. Continue with existing images (if any)?", default_yes=False):
                     cleanup_processes()
@@ -319,15 +501,30 @@ def main():
     else:
         print_warning("Docker Compose not found, skipping build.")
 
+    if relay_health_future is not None and not relay_health_future.result():
+        print_error("Relay service started but is not healthy.")
+        relay_proc_obj = processes.get("relay")
+        if relay_proc_obj:
+            is_windows_start_cmd = (platform.system() == "Windows" and \
+                                    isinstance(relay_proc_obj.args, str) and \
+                                    relay_proc_obj.args.startswith("start "))
+            if not is_windows_start_cmd:
+                try: relay_proc_obj.terminate()
+                except: pass 
+        if not ask_yes_no("Continue without a healthy relay (application will likely not work)?", default_yes=False):
+            cleanup_processes()
+    health_executor.shutdown(wait=False)
+
     print_header("Step 5: Start Main Application (Docker Compose)")
     if COMMAND_PATHS["docker-compose"]:
         print(f"Attempting to start TailBrain application services ({DOCKER_COMPOSE_CMD_NAME_local} up -d)...")
         cmd_parts_up = COMMAND_PATHS["docker-compose"] if isinstance(COMMAND_PATHS["docker-compose"], list) else [COMMAND_PATHS["docker-compose"]]
         try:
-            run_subprocess_command(cmd_parts_up + ["up", "-d"], f"{DOCKER_COMPOSE_CMD_NAME_local} up -d")
-            print("Waiting for application to initialize...")
-            time.sleep(5) 
-            if not check_service_health(APP_HEALTH_URL, "TailBrain Application"):
+            with timed_phase("Compose up"):
+                run_subprocess_command(cmd_parts_up + ["up", "-d"], f"{DOCKER_COMPOSE_CMD_NAME_local} up -d")
+            with timed_phase("Application readiness"):
+                app_healthy = check_service_health(APP_HEALTH_URL, "TailBrain Application", deadline=APP_HEALTH_DEADLINE)
+            if not app_healthy:
                 print_error(f"TailBrain application started but is not healthy. Check Docker logs: `{DOCKER_COMPOSE_CMD_NAME_local} logs`")
                 print_warning(f"You may need to manually open {APP_URL} once the issue is resolved.")
             else:
@@ -341,6 +538,8 @@ def main():
     else:
         print_warning("Docker Compose not found, skipping application start.")
 
+    print_phase_timings()
+
     print_header("Setup Steps Complete")
     print("The Python Host Relay (if started by this script and not on Windows via 'start') is a background child process.")
     print("On Windows, if relay was started with 'start', its window needs to be closed manually to stop it.")